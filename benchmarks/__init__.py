@@ -0,0 +1,15 @@
+"""
+Bộ benchmark hiệu năng cho pipeline xử lý tài liệu và chat.
+
+Mỗi module chạy được trực tiếp, ví dụ:
+
+    python -m benchmarks.ingestion --docs 50 --out ingestion.json
+"""
+import os
+
+
+def setup_django():
+    """Khởi tạo Django để benchmark dùng được ORM, storage và các task."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    import django
+    django.setup()
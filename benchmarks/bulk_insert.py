@@ -0,0 +1,93 @@
+"""
+So sánh tốc độ ghi chunk: ORM bulk_create (literal vector dạng text) và COPY BINARY
+từ buffer NumPy (documents.bulk_insert). Cần PostgreSQL + pgvector.
+
+    POSTGRES_HOST=localhost python -m benchmarks.bulk_insert --chunks 5000 --repeat 5 --out bulk_insert.json
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+from benchmarks.report import latency_summary, write_report
+
+BENCH_USERNAME = 'benchmark-bulk-insert'
+DIMENSIONS = 384
+
+
+def make_chunks(count, words_per_chunk, rng):
+    vocabulary = np.array(['tài', 'liệu', 'hợp', 'đồng', 'document', 'vector', 'search', 'chunk'])
+    chunks, offset = [], 0
+    for _ in range(count):
+        content = ' '.join(rng.choice(vocabulary, words_per_chunk))
+        chunks.append({'content': content, 'char_start': offset, 'char_end': offset + len(content)})
+        offset += len(content) + 1
+    embeddings = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return chunks, embeddings
+
+
+def insert_orm(document, chunks, embeddings):
+    from documents.models import DocumentChunk
+    DocumentChunk.objects.bulk_create([
+        DocumentChunk(
+            document=document, user_id=document.user_id, content=chunk['content'], embedding=embeddings[i],
+            chunk_index=i, char_start=chunk['char_start'], char_end=chunk['char_end'],
+        )
+        for i, chunk in enumerate(chunks)
+    ], batch_size=500)
+
+
+def insert_copy(document, chunks, embeddings):
+    from documents.bulk_insert import copy_chunks
+    copy_chunks(document, chunks, embeddings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--words-per-chunk', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from documents.models import Document, DocumentChunk
+
+    rng = np.random.default_rng(args.seed)
+    user, _ = get_user_model().objects.get_or_create(
+        username=BENCH_USERNAME, defaults={'email': f'{BENCH_USERNAME}@example.com'},
+    )
+    chunks, embeddings = make_chunks(args.chunks, args.words_per_chunk, rng)
+
+    results = {}
+    for name, insert in (('bulk_create', insert_orm), ('copy_binary', insert_copy)):
+        durations = []
+        for _ in range(args.repeat):
+            document = Document.objects.create(
+                user=user, file='bench/bulk.txt', file_name='bulk.txt', file_size=0,
+                mime_type='text/plain', status='completed',
+            )
+            start = time.perf_counter()
+            with transaction.atomic():
+                insert(document, chunks, embeddings)
+            durations.append(time.perf_counter() - start)
+            assert DocumentChunk.objects.filter(document=document).count() == args.chunks
+            document.delete()
+        summary = latency_summary(durations)
+        results[name] = {'seconds': summary, 'rows_per_second': args.chunks / summary['p50']}
+        print(f"{name}: {results[name]['rows_per_second']:.0f} rows/s (p50 {summary['p50']:.2f}s)")
+
+    results['speedup'] = results['copy_binary']['rows_per_second'] / results['bulk_create']['rows_per_second']
+    write_report({
+        'benchmark': 'bulk_insert',
+        'config': vars(args),
+        'results': results,
+    }, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Load generator cho /api/chat/ask/ với nhiều request đồng thời đã xác thực.
+
+Ví dụ so sánh WSGI và ASGI với cùng số worker (LLM trỏ tới benchmarks.mock_llm):
+
+    gunicorn core.wsgi:application -w 4 --bind 0.0.0.0:8000
+    python -m benchmarks.chat_load --url http://localhost:8000 --workers 4 --label wsgi \\
+        --concurrency 1,4,8,16,32 --requests 200 --out chat_wsgi.json
+
+    uvicorn core.asgi:application --workers 4 --port 8000
+    python -m benchmarks.chat_load --url http://localhost:8000 --workers 4 --label asgi ...
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.report import latency_summary, write_report
+
+DEFAULT_QUESTIONS = [
+    "Điều khoản thanh toán trong hợp đồng là gì?",
+    "Thời hạn bảo mật thông tin kéo dài bao lâu?",
+    "Tóm tắt các nghĩa vụ của nhân viên.",
+    "What is the notice period for termination?",
+]
+
+
+def _post_json(url, payload, token=None, timeout=300):
+    data = json.dumps(payload).encode('utf-8')
+    request = urllib.request.Request(url, data=data, method='POST')
+    request.add_header('Content-Type', 'application/json')
+    if token:
+        request.add_header('Authorization', f'Bearer {token}')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, json.loads(response.read() or b'{}')
+
+
+def obtain_token(base_url, username, password, register=False):
+    """Đăng nhập (và đăng ký nếu cần) để lấy JWT access token."""
+    if register:
+        try:
+            _post_json(f'{base_url}/api/users/register/', {
+                'username': username, 'email': f'{username}@example.com',
+                'password': password, 'password2': password,
+            })
+        except urllib.error.HTTPError as e:
+            if e.code != 400:  # 400 = user đã tồn tại
+                raise
+    _, body = _post_json(f'{base_url}/api/users/login/', {'username': username, 'password': password})
+    return body['access']
+
+
+class _InFlight:
+    """Đếm số request đang chờ phản hồi để ước lượng độ bão hoà phía server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+        return False
+
+
+def run_level(base_url, token, concurrency, total_requests, questions, timeout):
+    """Bắn total_requests request với đúng `concurrency` luồng đồng thời."""
+    url = f'{base_url}/api/chat/ask/'
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    in_flight = _InFlight()
+
+    def one_request(i):
+        question = questions[i % len(questions)]
+        start = time.perf_counter()
+        try:
+            with in_flight:
+                _post_json(url, {'question': question}, token=token, timeout=timeout)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        except urllib.error.HTTPError as e:
+            with lock:
+                errors[str(e.code)] = errors.get(str(e.code), 0) + 1
+        except Exception as e:
+            with lock:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(total_requests)))
+    wall = time.perf_counter() - start
+
+    failed = sum(errors.values())
+    return {
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'wall_seconds': wall,
+        'throughput_rps': len(latencies) / wall if wall else None,
+        'error_rate': failed / total_requests if total_requests else 0.0,
+        'errors': errors,
+        'latency': latency_summary(latencies),
+        'peak_in_flight': in_flight.peak,
+    }
+
+
+def add_saturation(levels, workers):
+    """
+    Ước lượng độ bão hoà worker theo định luật Little: số request server
+    thực sự phục vụ đồng thời = throughput * service time (đo ở mức tải thấp nhất).
+    """
+    baseline = next((lvl for lvl in levels if lvl['latency']['mean']), None)
+    if not baseline:
+        return
+    service_time = baseline['latency']['mean']
+    previous = None
+    for level in levels:
+        busy = (level['throughput_rps'] or 0) * service_time
+        level['busy_workers_estimate'] = busy
+        if workers:
+            level['worker_saturation'] = min(1.0, busy / workers)
+        mean = level['latency']['mean']
+        level['queueing_factor'] = mean / service_time if mean else None
+        if previous and previous['throughput_rps']:
+            gain = (level['throughput_rps'] or 0) / previous['throughput_rps'] - 1
+            level['throughput_gain'] = gain
+        previous = level
+    saturated = [lvl['concurrency'] for lvl in levels if lvl.get('throughput_gain', 1) < 0.1]
+    return saturated[0] if saturated else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--username', default='loadtest')
+    parser.add_argument('--password', default='LoadTest!2345')
+    parser.add_argument('--register', action='store_true', help='Tự đăng ký user nếu chưa có')
+    parser.add_argument('--concurrency', default='1,4,8,16')
+    parser.add_argument('--requests', type=int, default=100, help='Số request mỗi mức concurrency')
+    parser.add_argument('--workers', type=int, default=0, help='Số worker process của server (để tính saturation)')
+    parser.add_argument('--label', default='', help='Nhãn deployment, ví dụ wsgi/asgi')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--questions', help='File văn bản, mỗi dòng một câu hỏi')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+    random.Random(args.seed).shuffle(questions)
+
+    base_url = args.url.rstrip('/')
+    token = obtain_token(base_url, args.username, args.password, args.register)
+
+    levels = []
+    for concurrency in (int(c) for c in args.concurrency.split(',')):
+        level = run_level(base_url, token, concurrency, args.requests, questions, args.timeout)
+        levels.append(level)
+        print(f"c={concurrency}: p50={level['latency']['p50']} p95={level['latency']['p95']} "
+              f"err={level['error_rate']:.2%} rps={level['throughput_rps']}")
+    saturation_point = add_saturation(levels, args.workers)
+
+    write_report({
+        'benchmark': 'chat_load',
+        'label': args.label,
+        'config': vars(args),
+        'levels': levels,
+        'saturation_concurrency': saturation_point,
+    }, args.out)
+
+
+if __name__ == '__main__':
+    main()
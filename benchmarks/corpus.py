@@ -0,0 +1,69 @@
+import io
+import random
+
+MIME_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain',
+}
+
+_VOCABULARY = (
+    "hợp đồng điều khoản bên nhân viên công ty thời hạn thanh toán bảo mật "
+    "contract clause party employee company term payment confidential notice "
+    "report revenue quarter growth policy procedure section appendix table "
+    "data analysis result method system document process review approval"
+).split()
+
+
+def _paragraph(rng, words):
+    return " ".join(rng.choice(_VOCABULARY) for _ in range(words)) + "."
+
+
+def make_txt(rng, pages, words_per_page):
+    text = "\n\n".join(_paragraph(rng, words_per_page) for _ in range(pages))
+    return text.encode('utf-8')
+
+
+def make_pdf(rng, pages, words_per_page):
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        rect = fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50)
+        page.insert_textbox(rect, _paragraph(rng, words_per_page), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_docx(rng, pages, words_per_page, table_rows=0):
+    import docx
+    doc = docx.Document()
+    for page in range(pages):
+        doc.add_heading(f"Section {page + 1}", level=2)
+        # Mỗi "trang" gồm vài đoạn văn để giống tài liệu thật hơn
+        for _ in range(4):
+            doc.add_paragraph(_paragraph(rng, max(1, words_per_page // 4)))
+        if table_rows:
+            table = doc.add_table(rows=table_rows, cols=4)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = " ".join(rng.choice(_VOCABULARY) for _ in range(3))
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+_BUILDERS = {'pdf': make_pdf, 'docx': make_docx, 'txt': make_txt}
+
+
+def generate_corpus(count, formats=('pdf', 'docx', 'txt'), pages=5, words_per_page=400, seed=42):
+    """
+    Sinh tài liệu tổng hợp (xoay vòng theo formats).
+    Trả về iterator các tuple (file_name, mime_type, file_bytes).
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        fmt = formats[i % len(formats)]
+        data = _BUILDERS[fmt](rng, pages, words_per_page)
+        yield f"bench_{i:05d}.{fmt}", MIME_TYPES[fmt], data
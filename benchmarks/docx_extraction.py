@@ -0,0 +1,99 @@
+"""
+So sánh trích xuất DOCX: python-docx (chỉ doc.paragraphs, cách cũ) với đọc luồng
+word/document.xml bằng iterparse. Đo thời gian, peak RSS tăng thêm và lượng text lấy được
+(python-docx bỏ qua nội dung bảng). Mỗi lần đo chạy trong một process riêng để peak RSS
+không bị ảnh hưởng bởi lần đo trước.
+
+    python -m benchmarks.docx_extraction --pages 50 500 2000 --table-rows 20 --out docx_extraction.json
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.corpus import make_docx
+from benchmarks.report import peak_rss_mb, write_report
+
+METHODS = ('python-docx', 'stream')
+
+
+def extract_python_docx(data):
+    import io
+    import docx
+    text = ""
+    for para in docx.Document(io.BytesIO(data)).paragraphs:
+        text += para.text + "\n"
+    return text
+
+
+def extract_stream(data):
+    from documents.docx_extract import iter_docx_blocks
+    return "\n".join(block.render() for block in iter_docx_blocks(data)) + "\n"
+
+
+def _write_docx(path, seed, pages, words_per_page, table_rows):
+    with open(path, 'wb') as f:
+        f.write(make_docx(random.Random(seed), pages, words_per_page, table_rows))
+
+
+def _measure(method, path, repeat):
+    # Import thư viện trước khi lấy baseline để chỉ đo bộ nhớ của việc trích xuất
+    import docx  # noqa: F401
+    import documents.docx_extract  # noqa: F401
+    extract = extract_python_docx if method == 'python-docx' else extract_stream
+    with open(path, 'rb') as f:
+        data = f.read()
+    baseline = peak_rss_mb()
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract(data)
+        seconds.append(time.perf_counter() - start)
+    return {
+        'seconds': min(seconds),
+        'peak_rss_delta_mb': round(peak_rss_mb() - baseline, 1),
+        'chars': len(text),
+        'words': len(text.split()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 500, 2000])
+    parser.add_argument('--words-per-page', type=int, default=400)
+    parser.add_argument('--table-rows', type=int, default=20, help='Số dòng bảng (4 cột) mỗi trang')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+
+    # docx_extract không dùng Django, chỉ cần import được package documents
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f'{pages}.docx')
+            # Sinh file trong process riêng: Linux giữ peak RSS của process cha qua fork/exec
+            with context.Pool(1) as pool:
+                pool.apply(_write_docx, (path, args.seed, pages, args.words_per_page, args.table_rows))
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+
+            results[pages] = {'file_mb': round(size_mb, 2)}
+            for method in METHODS:
+                with context.Pool(1) as pool:
+                    result = pool.apply(_measure, (method, path, args.repeat))
+                results[pages][method] = result
+                print(f"{pages} pages ({size_mb:.1f}MB) {method}: {result['seconds']:.2f}s "
+                      f"+{result['peak_rss_delta_mb']}MB RSS, {result['words']} words")
+
+    write_report({
+        'benchmark': 'docx_extraction',
+        'config': vars(args),
+        'results': results,
+    }, args.out)
+
+
+if __name__ == '__main__':
+    main()
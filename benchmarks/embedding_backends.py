@@ -0,0 +1,87 @@
+"""
+So sánh các embedding backend: throughput encode chunk (chunks/sec) và latency encode câu hỏi.
+
+    python -m benchmarks.embedding_backends --backends sentence-transformers,onnx \\
+        --chunks 512 --queries 200 --threads 4 --out embedding_backends.json
+"""
+import argparse
+import random
+import time
+
+from benchmarks import setup_django
+from benchmarks.corpus import _VOCABULARY
+from benchmarks.report import latency_summary, peak_rss_mb, write_report
+
+
+def _chunks(rng, count, words):
+    return [" ".join(rng.choice(_VOCABULARY) for _ in range(words)) for _ in range(count)]
+
+
+def bench_backend(backend, chunks, queries, batch_size):
+    # Warm-up để không tính chi phí khởi tạo lần đầu
+    backend.encode(chunks[:batch_size])
+
+    start = time.perf_counter()
+    for i in range(0, len(chunks), batch_size):
+        backend.encode(chunks[i:i + batch_size])
+    seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        t = time.perf_counter()
+        backend.encode_query(query)
+        latencies.append(time.perf_counter() - t)
+
+    return {
+        'chunks': len(chunks),
+        'batch_size': batch_size,
+        'encode_seconds': seconds,
+        'chunks_per_sec': len(chunks) / seconds if seconds else None,
+        'query_latency': latency_summary(latencies),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default='sentence-transformers,onnx')
+    parser.add_argument('--model', help='Mặc định dùng settings.EMBEDDING_MODEL_NAME')
+    parser.add_argument('--chunks', type=int, default=512)
+    parser.add_argument('--chunk-words', type=int, default=400)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--threads', type=int, help='intra-op threads cho ONNX Runtime và torch')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.conf import settings
+    from documents.embeddings import BACKENDS, OnnxBackend
+
+    model_name = args.model or settings.EMBEDDING_MODEL_NAME
+    rng = random.Random(args.seed)
+    chunks = _chunks(rng, args.chunks, args.chunk_words)
+    queries = _chunks(rng, args.queries, 12)
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    results = {}
+    for name in (b.strip() for b in args.backends.split(',') if b.strip()):
+        start = time.perf_counter()
+        if name == OnnxBackend.name:
+            backend = OnnxBackend(model_name, intra_op_threads=args.threads)
+        else:
+            backend = BACKENDS[name](model_name)
+        load_seconds = time.perf_counter() - start
+        results[name] = dict(bench_backend(backend, chunks, queries, args.batch_size), load_seconds=load_seconds)
+        print(f"{name}: {results[name]['chunks_per_sec']:.1f} chunks/sec, "
+              f"query p50 {results[name]['query_latency']['p50'] * 1000:.1f} ms")
+
+    write_report({'benchmark': 'embedding_backends', 'model': model_name, 'config': vars(args), 'backends': results}, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark retrieval có filter (document_ids, tags, khoảng thời gian) trên Postgres+pgvector:
+latency, recall@k so với tìm chính xác, và tỉ lệ truy vấn trả về ít hơn k kết quả.
+
+    POSTGRES_HOST=localhost python -m benchmarks.filtered_retrieval \\
+        --documents 2000 --chunks-per-document 50 --queries 50 --out filtered_retrieval.json
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from benchmarks import setup_django
+from benchmarks.report import latency_summary, write_report
+
+BENCH_USERNAME = 'benchmark-retrieval'
+DIMENSIONS = 384
+
+
+def _unit_vectors(rng, n):
+    vectors = rng.standard_normal((n, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def seed_corpus(user, n_documents, chunks_per_document, rng, py_rng):
+    """Tạo tài liệu giả với tag 'rare' (~1%), 'common' (~50%) và ngày tạo trải đều trong 1 năm."""
+    from django.utils import timezone
+    from documents.models import Document, DocumentChunk
+
+    now = timezone.now()
+    documents = []
+    for i in range(n_documents):
+        tags = ['common'] if py_rng.random() < 0.5 else []
+        if py_rng.random() < 0.01:
+            tags.append('rare')
+        documents.append(Document(
+            user=user, file=f'bench/{i}.txt', file_name=f'bench_{i}.txt', file_size=0,
+            mime_type='text/plain', status='completed', tags=tags,
+        ))
+    Document.objects.bulk_create(documents, batch_size=1000)
+    # created_at là auto_now_add nên cập nhật sau để trải đều theo thời gian
+    for i, document in enumerate(documents):
+        document.created_at = now - timedelta(days=365 * i / max(1, n_documents))
+    Document.objects.bulk_update(documents, ['created_at'], batch_size=1000)
+
+    for start in range(0, n_documents, 200):
+        batch_docs = documents[start:start + 200]
+        vectors = _unit_vectors(rng, len(batch_docs) * chunks_per_document)
+        DocumentChunk.objects.bulk_create([
+            DocumentChunk(document=document, user=user, content=f'chunk {j}', embedding=vectors[d * chunks_per_document + j])
+            for d, document in enumerate(batch_docs)
+            for j in range(chunks_per_document)
+        ], batch_size=2000)
+    return documents
+
+
+def load_matrix(user):
+    """Nạp toàn bộ embedding của user vào RAM để tính ground truth chính xác bằng numpy."""
+    from documents.models import DocumentChunk
+    ids, doc_ids, vectors = [], [], []
+    for chunk_id, document_id, embedding in (
+        DocumentChunk.objects.filter(document__user=user)
+        .values_list('id', 'document_id', 'embedding').iterator(chunk_size=5000)
+    ):
+        ids.append(chunk_id)
+        doc_ids.append(document_id)
+        vectors.append(embedding)
+    return np.array(ids), np.array(doc_ids), np.asarray(vectors, dtype=np.float32)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--chunks-per-document', type=int, default=50)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--keep', action='store_true', help='Giữ lại dữ liệu benchmark (lần sau dùng --reuse)')
+    parser.add_argument('--reuse', action='store_true', help='Dùng lại dữ liệu đã seed')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from chatbot.retrieval import retrieve_chunks, scoped_documents
+    from documents.models import Document
+
+    rng = np.random.default_rng(args.seed)
+    py_rng = random.Random(args.seed)
+    user, _ = get_user_model().objects.get_or_create(
+        username=BENCH_USERNAME, defaults={'email': f'{BENCH_USERNAME}@example.com'},
+    )
+
+    if not args.reuse:
+        Document.objects.filter(user=user).delete()
+        start = time.perf_counter()
+        seed_corpus(user, args.documents, args.chunks_per_document, rng, py_rng)
+        print(f"Seeded {args.documents * args.chunks_per_document} chunks in {time.perf_counter() - start:.1f}s")
+
+    chunk_ids, chunk_doc_ids, matrix = load_matrix(user)
+    all_doc_ids = list(Document.objects.filter(user=user).values_list('id', flat=True))
+    now = timezone.now()
+
+    scenarios = {
+        'unfiltered': {},
+        'single_document': lambda: {'document_ids': [py_rng.choice(all_doc_ids)]},
+        'ten_documents': lambda: {'document_ids': py_rng.sample(all_doc_ids, min(10, len(all_doc_ids)))},
+        'rare_tag': {'tags': ['rare']},
+        'common_tag': {'tags': ['common']},
+        'last_30_days': {'created_after': now - timedelta(days=30)},
+        'last_180_days': {'created_after': now - timedelta(days=180)},
+    }
+
+    results = {}
+    queries = _unit_vectors(rng, args.queries)
+    for name, spec in scenarios.items():
+        latencies, recalls, short = [], [], 0
+        for query in queries:
+            filters = spec() if callable(spec) else spec
+            scope = set(scoped_documents(user, **filters).values_list('id', flat=True))
+            mask = np.fromiter((d in scope for d in chunk_doc_ids), dtype=bool, count=len(chunk_doc_ids))
+            expected_k = min(args.k, int(mask.sum()))
+            scores = matrix[mask] @ query
+            truth = set(chunk_ids[mask][np.argsort(-scores)[:expected_k]])
+
+            start = time.perf_counter()
+            chunks = retrieve_chunks(user, query, k=args.k, **filters)
+            latencies.append(time.perf_counter() - start)
+
+            if len(chunks) < expected_k:
+                short += 1
+            if expected_k:
+                recalls.append(len(truth & {c.id for c in chunks}) / expected_k)
+
+        results[name] = {
+            'latency': latency_summary(latencies),
+            'recall_at_k': float(np.mean(recalls)) if recalls else None,
+            'short_result_rate': short / len(queries),
+        }
+        print(f"{name}: p95={results[name]['latency']['p95'] * 1000:.1f}ms recall={results[name]['recall_at_k']}")
+
+    if not args.keep:
+        Document.objects.filter(user=user).delete()
+
+    write_report({
+        'benchmark': 'filtered_retrieval',
+        'config': vars(args),
+        'chunks': len(chunk_ids),
+        'scenarios': results,
+    }, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark throughput ingestion: extract -> chunk -> embed -> bulk_create.
+
+Chạy với Postgres+pgvector và MinIO local (docker compose up db minio):
+
+    POSTGRES_HOST=localhost AWS_S3_ENDPOINT_URL=http://localhost:9000 \\
+        python -m benchmarks.ingestion --docs 30 --out ingestion.json
+
+Dùng --storage filesystem để thay MinIO bằng thư mục tạm.
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks import setup_django
+from benchmarks.report import StageTimer, write_report
+
+BENCH_USERNAME = 'benchmark-ingestion'
+
+
+def _get_bench_user():
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    user, _ = User.objects.get_or_create(
+        username=BENCH_USERNAME,
+        defaults={'email': f'{BENCH_USERNAME}@example.com'},
+    )
+    return user
+
+
+def run_stages(corpus, user, timer):
+    """Đo từng stage riêng lẻ, gọi thẳng các hàm trong documents.tasks."""
+    from django.db import transaction
+    from documents import tasks
+    from documents.models import Document, DocumentChunk
+
+    total_chunks = 0
+    for file_name, mime_type, data in corpus:
+        with timer.measure(f'extract_{file_name.rsplit(".", 1)[-1]}'):
+            if mime_type == 'application/pdf':
+                text = tasks.extract_text_from_pdf(data)
+            elif mime_type == 'text/plain':
+                text = data.decode('utf-8')
+            else:
+                text = tasks.extract_text_from_docx(data)
+
+        with timer.measure('chunk'):
+            chunks = tasks.chunk_text(text)
+
+        with timer.measure('embed', items=len(chunks)):
+            embeddings, _ = tasks.embed_chunks(chunks)
+
+        document = Document.objects.create(
+            user=user, file=f'documents/{file_name}', file_name=file_name,
+            file_size=len(data), mime_type=mime_type, status='completed',
+        )
+        with timer.measure('bulk_create', items=len(chunks)), transaction.atomic():
+            DocumentChunk.objects.bulk_create(
+                [DocumentChunk(document=document, user=user, content=c, embedding=e) for c, e in zip(chunks, embeddings)],
+                batch_size=500,
+            )
+        total_chunks += len(chunks)
+    return total_chunks
+
+
+def run_end_to_end(corpus, user):
+    """Upload file vào storage rồi chạy toàn bộ pipeline đồng bộ cho từng tài liệu."""
+    from django.core.files.base import ContentFile
+    from documents.models import Document, DocumentChunk
+    from documents.tasks import process_document_inline
+
+    ids = []
+    upload_start = time.perf_counter()
+    for file_name, mime_type, data in corpus:
+        document = Document(user=user, file_name=file_name, file_size=len(data), mime_type=mime_type)
+        document.file.save(file_name, ContentFile(data), save=True)
+        ids.append(document.id)
+    upload_seconds = time.perf_counter() - upload_start
+
+    start = time.perf_counter()
+    for document_id in ids:
+        process_document_inline(document_id)
+    seconds = time.perf_counter() - start
+
+    completed = Document.objects.filter(id__in=ids, status='completed').count()
+    chunks = DocumentChunk.objects.filter(document_id__in=ids).count()
+    return {
+        'documents': len(ids),
+        'completed': completed,
+        'failed': len(ids) - completed,
+        'chunks': chunks,
+        'upload_seconds': upload_seconds,
+        'seconds': seconds,
+        'docs_per_min': completed / seconds * 60 if seconds else None,
+        'chunks_per_sec': chunks / seconds if seconds else None,
+    }
+
+
+def _cleanup(user):
+    from documents.models import Document
+    for document in Document.objects.filter(user=user).iterator():
+        try:
+            document.file.delete(save=False)
+        except Exception:
+            pass
+    Document.objects.filter(user=user).delete()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=30, help='Số tài liệu tổng hợp')
+    parser.add_argument('--formats', default='pdf,docx,txt')
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--words-per-page', type=int, default=400)
+    parser.add_argument('--mode', choices=['stages', 'e2e', 'both'], default='both')
+    parser.add_argument('--storage', choices=['s3', 'filesystem'], default='s3',
+                        help='s3 = storage đã cấu hình (MinIO local), filesystem = thư mục tạm')
+    parser.add_argument('--keep', action='store_true', help='Không xoá dữ liệu benchmark sau khi chạy')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='File JSON output (mặc định in ra stdout)')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.test.utils import override_settings
+    from benchmarks.corpus import generate_corpus
+
+    formats = tuple(f.strip() for f in args.formats.split(',') if f.strip())
+    corpus = list(generate_corpus(args.docs, formats, args.pages, args.words_per_page, args.seed))
+
+    storage_override = None
+    if args.storage == 'filesystem':
+        storage_override = override_settings(STORAGES={
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': tempfile.mkdtemp(prefix='bench-media-')},
+            },
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storage_override.enable()
+
+    report = {
+        'benchmark': 'ingestion',
+        'config': dict(vars(args), formats=formats),
+        'corpus_bytes': sum(len(d) for _, _, d in corpus),
+    }
+    user = _get_bench_user()
+    try:
+        if args.mode in ('stages', 'both'):
+            timer = StageTimer()
+            start = time.perf_counter()
+            chunks = run_stages(corpus, user, timer)
+            seconds = time.perf_counter() - start
+            report['stages'] = timer.as_dict()
+            report['stages_total'] = {
+                'documents': len(corpus),
+                'chunks': chunks,
+                'seconds': seconds,
+                'docs_per_min': len(corpus) / seconds * 60 if seconds else None,
+            }
+            _cleanup(user)
+        if args.mode in ('e2e', 'both'):
+            report['end_to_end'] = run_end_to_end(corpus, user)
+    finally:
+        if not args.keep:
+            _cleanup(user)
+        if storage_override is not None:
+            storage_override.disable()
+
+    write_report(report, args.out)
+
+
+if __name__ == '__main__':
+    main()
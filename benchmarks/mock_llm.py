@@ -0,0 +1,194 @@
+"""
+Mock server tương thích OpenAI (/v1/chat/completions) để load-test chat mà không cần Ollama.
+
+    python -m benchmarks.mock_llm --port 11500 --tokens-per-sec 40 \\
+        --latency lognormal --latency-mean 0.8 --latency-sigma 0.5
+
+Sau đó trỏ web tới mock: LLM_BACKEND=openai LLM_BASE_URL=http://localhost:11500/v1
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = "tài liệu cho biết điều khoản này áp dụng cho các bên trong hợp đồng theo quy định".split()
+
+
+class LatencyModel:
+    """Sinh độ trễ trước token đầu tiên theo phân phối cấu hình."""
+
+    def __init__(self, kind='fixed', mean=0.5, sigma=0.2, low=0.1, high=1.0, seed=None):
+        self.kind = kind
+        self.mean = mean
+        self.sigma = sigma
+        self.low = low
+        self.high = high
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            if self.kind == 'uniform':
+                return self._rng.uniform(self.low, self.high)
+            if self.kind == 'normal':
+                return max(0.0, self._rng.gauss(self.mean, self.sigma))
+            if self.kind == 'lognormal':
+                # Tham số hoá theo mean thực tế của phân phối
+                mu = math.log(self.mean) - self.sigma ** 2 / 2
+                return self._rng.lognormvariate(mu, self.sigma)
+            return self.mean
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency, tokens_per_sec, completion_tokens, error_rate, max_parallel):
+        super().__init__(address, MockLLMHandler)
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        # Giả lập số slot song song của server LLM thật (OLLAMA_NUM_PARALLEL)
+        self.slots = threading.BoundedSemaphore(max_parallel) if max_parallel else None
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/v1/models':
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'mock', 'object': 'model'}]})
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+
+        if server.error_rate and random.random() < server.error_rate:
+            self._send_json(500, {'error': {'message': 'Injected mock failure'}})
+            return
+
+        n_tokens = min(int(request.get('max_tokens') or server.completion_tokens), server.completion_tokens)
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in request.get('messages', []))
+
+        if server.slots:
+            server.slots.acquire()
+        try:
+            time.sleep(server.latency.sample())
+            if request.get('stream'):
+                self._stream(request, n_tokens, prompt_tokens)
+            else:
+                time.sleep(n_tokens / server.tokens_per_sec)
+                self._send_json(200, {
+                    'id': f'chatcmpl-{uuid.uuid4().hex}',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': request.get('model', 'mock'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': _text(n_tokens)},
+                        'finish_reason': 'stop',
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': n_tokens,
+                        'total_tokens': prompt_tokens + n_tokens,
+                    },
+                })
+        finally:
+            if server.slots:
+                server.slots.release()
+
+    def _stream(self, request, n_tokens, prompt_tokens):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        interval = 1.0 / self.server.tokens_per_sec
+        for i in range(n_tokens):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'model': request.get('model', 'mock'),
+                'choices': [{'index': 0, 'delta': {'content': _WORDS[i % len(_WORDS)] + ' '}, 'finish_reason': None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(interval)
+        if (request.get('stream_options') or {}).get('include_usage'):
+            # Như OpenAI: chunk cuối không có choices, chỉ mang usage
+            usage = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'model': request.get('model', 'mock'),
+                'choices': [],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': n_tokens,
+                    'total_tokens': prompt_tokens + n_tokens,
+                },
+            }
+            self.wfile.write(f"data: {json.dumps(usage)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+def _text(n_tokens):
+    return " ".join(_WORDS[i % len(_WORDS)] for i in range(n_tokens))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--tokens-per-sec', type=float, default=40.0)
+    parser.add_argument('--completion-tokens', type=int, default=120,
+                        help='Số token tối đa mỗi câu trả lời')
+    parser.add_argument('--latency', choices=['fixed', 'uniform', 'normal', 'lognormal'], default='fixed',
+                        help='Phân phối độ trễ trước token đầu tiên')
+    parser.add_argument('--latency-mean', type=float, default=0.5)
+    parser.add_argument('--latency-sigma', type=float, default=0.2)
+    parser.add_argument('--latency-low', type=float, default=0.1)
+    parser.add_argument('--latency-high', type=float, default=1.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-parallel', type=int, default=0,
+                        help='Giới hạn số request xử lý song song (0 = không giới hạn)')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    latency = LatencyModel(args.latency, args.latency_mean, args.latency_sigma,
+                           args.latency_low, args.latency_high, args.seed)
+    server = MockLLMServer((args.host, args.port), latency, args.tokens_per_sec,
+                           args.completion_tokens, args.error_rate, args.max_parallel)
+    print(f"Mock LLM server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
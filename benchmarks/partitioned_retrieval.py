@@ -0,0 +1,186 @@
+"""
+Benchmark retrieval theo tenant trên bảng chunk thường và bảng đã partition theo user
+(10M+ chunk): latency, recall@k so với tìm chính xác, kích thước bảng + index.
+Dữ liệu được sinh ngay trong Postgres (generate_series) nên seed 10M chunk không đi qua Python.
+Chỉ chạy trên database thử nghiệm: --partition sẽ partition bảng chunk thật sự.
+
+    POSTGRES_HOST=localhost python -m benchmarks.partitioned_retrieval \\
+        --tenants 100 --documents-per-tenant 20 --chunks-per-document 5000 \\
+        --queries 100 --partition --out partitioned_retrieval.json
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+from benchmarks.report import latency_summary, write_report
+
+BENCH_PREFIX = 'benchmark-tenant'
+DIMENSIONS = 384
+HNSW_INDEX = 'documentchunk_embedding_hnsw'
+
+
+def seed_tenants(n_tenants, documents_per_tenant, chunks_per_document):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from documents.models import Document
+
+    User = get_user_model()
+    users = User.objects.bulk_create([
+        User(username=f'{BENCH_PREFIX}-{i}', email=f'{BENCH_PREFIX}-{i}@example.com')
+        for i in range(n_tenants)
+    ])
+    Document.objects.bulk_create([
+        Document(user=user, file=f'bench/{user.pk}/{j}.txt', file_name=f'bench_{j}.txt',
+                 file_size=0, mime_type='text/plain', status='completed')
+        for user in users for j in range(documents_per_tenant)
+    ], batch_size=1000)
+
+    with connection.cursor() as cursor:
+        # Build HNSW một lần sau khi nạp dữ liệu nhanh hơn nhiều so với cập nhật index từng dòng
+        cursor.execute("SELECT pg_get_indexdef(%s::regclass)", [HNSW_INDEX])
+        hnsw_definition = cursor.fetchone()[0]
+        cursor.execute(f"DROP INDEX {HNSW_INDEX}")
+        for position, user in enumerate(users):
+            # Điều kiện g >= 0 buộc subquery random() chạy lại cho từng dòng
+            cursor.execute(f"""
+                INSERT INTO documents_documentchunk (id, document_id, user_id, content, embedding, chunk_index, created_at)
+                SELECT gen_random_uuid(), d.id, d.user_id, 'chunk ' || g,
+                       ARRAY(SELECT random() - 0.5 FROM generate_series(1, {DIMENSIONS}) WHERE g >= 0)::vector,
+                       g, now()
+                FROM documents_document d CROSS JOIN generate_series(0, %s - 1) g
+                WHERE d.user_id = %s
+            """, [chunks_per_document, user.pk])
+            if (position + 1) % 10 == 0:
+                print(f"Seeded {position + 1}/{len(users)} tenants")
+        cursor.execute("SET maintenance_work_mem = '2GB'")
+        start = time.perf_counter()
+        cursor.execute(hnsw_definition)
+        print(f"Built HNSW index in {time.perf_counter() - start:.1f}s")
+        cursor.execute("ANALYZE documents_documentchunk")
+    return users
+
+
+def drop_tenants():
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+
+    users = get_user_model().objects.filter(username__startswith=f'{BENCH_PREFIX}-')
+    with connection.cursor() as cursor:
+        # Xoá chunk bằng SQL: để ORM cascade 10M chunk sẽ nạp toàn bộ vào RAM
+        cursor.execute(
+            "DELETE FROM documents_documentchunk WHERE user_id = ANY(%s)",
+            [list(users.values_list('pk', flat=True))],
+        )
+    users.delete()
+
+
+def relation_sizes():
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT COALESCE(SUM(pg_table_size(c.oid)), 0), COALESCE(SUM(pg_indexes_size(c.oid)), 0)
+            FROM pg_class c
+            WHERE c.relkind = 'r' AND (c.relname = 'documents_documentchunk' OR c.relname LIKE %s)
+        """, ['documents_documentchunk\\_p%'])
+        table_bytes, index_bytes = cursor.fetchone()
+    return {'table_mb': table_bytes / 1024 / 1024, 'indexes_mb': index_bytes / 1024 / 1024}
+
+
+def exact_top_k(user, query, k):
+    """Ground truth: quét tuần tự toàn bộ chunk của tenant, bỏ qua HNSW index."""
+    from django.db import connection, transaction
+    from pgvector.django import CosineDistance
+    from documents.models import DocumentChunk
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_indexscan = off")
+        return set(
+            DocumentChunk.objects.filter(user=user)
+            .annotate(distance=CosineDistance('embedding', query))
+            .order_by('distance').values_list('id', flat=True)[:k]
+        )
+
+
+def measure(users, queries, k, seed):
+    from chatbot.retrieval import retrieve_chunks
+
+    # Cùng seed cho mọi lần đo để so sánh trên cùng chuỗi tenant
+    py_rng = random.Random(seed)
+    latencies, recalls, short = [], [], 0
+    for query in queries:
+        user = py_rng.choice(users)
+        truth = exact_top_k(user, query, k)
+        start = time.perf_counter()
+        chunks = retrieve_chunks(user, query, k=k)
+        latencies.append(time.perf_counter() - start)
+        if len(chunks) < len(truth):
+            short += 1
+        if truth:
+            recalls.append(len(truth & {c.id for c in chunks}) / len(truth))
+    return {
+        'latency': latency_summary(latencies),
+        'recall_at_k': float(np.mean(recalls)) if recalls else None,
+        'short_result_rate': short / len(queries),
+        **relation_sizes(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', type=int, default=100)
+    parser.add_argument('--documents-per-tenant', type=int, default=20)
+    parser.add_argument('--chunks-per-document', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--partitions', type=int, default=None)
+    parser.add_argument('--partition', action='store_true',
+                        help='Đo trên bảng hiện tại, partition bảng chunk rồi đo lại')
+    parser.add_argument('--reuse', action='store_true', help='Dùng lại tenant đã seed')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from documents.management.commands.partition_document_chunks import is_partitioned
+
+    rng = np.random.default_rng(args.seed)
+    User = get_user_model()
+
+    if not args.reuse:
+        drop_tenants()
+        start = time.perf_counter()
+        seed_tenants(args.tenants, args.documents_per_tenant, args.chunks_per_document)
+        total = args.tenants * args.documents_per_tenant * args.chunks_per_document
+        print(f"Seeded {total} chunks in {time.perf_counter() - start:.1f}s")
+    users = list(User.objects.filter(username__startswith=f'{BENCH_PREFIX}-'))
+
+    queries = rng.standard_normal((args.queries, DIMENSIONS)).astype(np.float32)
+    results = {}
+    label = 'partitioned' if is_partitioned() else 'unpartitioned'
+    results[label] = measure(users, queries, args.k, args.seed)
+    print(f"{label}: p95={results[label]['latency']['p95'] * 1000:.1f}ms recall={results[label]['recall_at_k']}")
+
+    if args.partition and label == 'unpartitioned':
+        start = time.perf_counter()
+        call_command('partition_document_chunks', partitions=args.partitions, drop_old=True)
+        results['partition_seconds'] = time.perf_counter() - start
+        results['partitioned'] = measure(users, queries, args.k, args.seed)
+        print(f"partitioned: p95={results['partitioned']['latency']['p95'] * 1000:.1f}ms "
+              f"recall={results['partitioned']['recall_at_k']}")
+
+    write_report({
+        'benchmark': 'partitioned_retrieval',
+        'config': vars(args),
+        'tenants': len(users),
+        'results': results,
+    }, args.out)
+
+
+if __name__ == '__main__':
+    main()
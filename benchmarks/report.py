@@ -0,0 +1,91 @@
+import json
+import time
+import resource
+import platform
+import statistics
+from datetime import datetime, timezone
+
+
+def peak_rss_mb():
+    """Peak RSS của process hiện tại (MB). Linux trả về KB, macOS trả về bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if platform.system() == 'Darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def percentile(values, pct):
+    """Percentile theo nội suy tuyến tính, trả về None nếu không có dữ liệu."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def latency_summary(values):
+    """Tóm tắt một danh sách latency (giây)."""
+    return {
+        'count': len(values),
+        'mean': statistics.fmean(values) if values else None,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else None,
+    }
+
+
+class StageTimer:
+    """Cộng dồn thời gian và số item đã xử lý cho từng stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def measure(self, name, items=1):
+        return _Measure(self, name, items)
+
+    def add(self, name, seconds, items):
+        entry = self.stages.setdefault(name, {'seconds': 0.0, 'items': 0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['items'] += items
+        entry['calls'] += 1
+        entry['peak_rss_mb'] = round(peak_rss_mb(), 1)
+
+    def as_dict(self):
+        result = {}
+        for name, entry in self.stages.items():
+            seconds = entry['seconds']
+            result[name] = dict(entry, items_per_sec=(entry['items'] / seconds) if seconds else None)
+        return result
+
+
+class _Measure:
+    def __init__(self, timer, name, items):
+        self.timer = timer
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.add(self.name, time.perf_counter() - self.start, self.items)
+        return False
+
+
+def write_report(report, path=None):
+    """Ghi report dạng JSON ra file (hoặc stdout nếu không có path)."""
+    report = dict(report)
+    report.setdefault('generated_at', datetime.now(timezone.utc).isoformat())
+    report.setdefault('python', platform.python_version())
+    report.setdefault('peak_rss_mb', round(peak_rss_mb(), 1))
+    data = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(data)
+    else:
+        print(data)
+    return report
@@ -0,0 +1,123 @@
+"""
+So sánh retrieval hai giai đoạn (chọn M tài liệu theo centroid rồi tìm chunk) với
+tìm phẳng trên toàn bộ chunk: latency và recall@k so với kết quả chính xác.
+Mỗi tài liệu giả có một chủ đề riêng (chunk = tâm chủ đề + nhiễu) để centroid có ý nghĩa.
+
+    POSTGRES_HOST=localhost python -m benchmarks.two_stage_retrieval \\
+        --documents 5000 --chunks-per-document 40 --candidates 0 5 10 20 50 100 --out two_stage.json
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks import setup_django
+from benchmarks.report import latency_summary, write_report
+
+BENCH_USERNAME = 'benchmark-two-stage'
+DIMENSIONS = 384
+
+
+def _normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def seed_corpus(user, n_documents, chunks_per_document, noise, rng):
+    from documents.models import Document, DocumentChunk
+    from documents.tasks import document_centroid
+
+    topics = _normalize(rng.standard_normal((n_documents, DIMENSIONS)).astype(np.float32))
+    for start in range(0, n_documents, 200):
+        batch_topics = topics[start:start + 200]
+        vectors = _normalize(
+            batch_topics[:, None, :] + noise * rng.standard_normal(
+                (len(batch_topics), chunks_per_document, DIMENSIONS)).astype(np.float32)
+        )
+        documents = Document.objects.bulk_create([
+            Document(
+                user=user, file=f'bench/{start + d}.txt', file_name=f'bench_{start + d}.txt', file_size=0,
+                mime_type='text/plain', status='completed', centroid=document_centroid(vectors[d]),
+            )
+            for d in range(len(batch_topics))
+        ])
+        DocumentChunk.objects.bulk_create([
+            DocumentChunk(document=document, user=user, content=f'chunk {j}', embedding=vectors[d, j], chunk_index=j)
+            for d, document in enumerate(documents)
+            for j in range(chunks_per_document)
+        ], batch_size=2000)
+    return topics
+
+
+def load_matrix(user):
+    from documents.models import DocumentChunk
+    ids, vectors = [], []
+    for chunk_id, embedding in (
+        DocumentChunk.objects.filter(user=user).values_list('id', 'embedding').iterator(chunk_size=5000)
+    ):
+        ids.append(chunk_id)
+        vectors.append(embedding)
+    return np.array(ids), np.asarray(vectors, dtype=np.float32)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=5000)
+    parser.add_argument('--chunks-per-document', type=int, default=40)
+    parser.add_argument('--noise', type=float, default=0.08, help='Độ lệch chuẩn nhiễu của chunk quanh tâm chủ đề')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--candidates', type=int, nargs='+', default=[0, 5, 10, 20, 50, 100],
+                        help='Các giá trị M cần đo (0 = tìm phẳng)')
+    parser.add_argument('--keep', action='store_true', help='Giữ lại dữ liệu benchmark (lần sau dùng --reuse)')
+    parser.add_argument('--reuse', action='store_true', help='Dùng lại dữ liệu đã seed')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from chatbot.retrieval import retrieve_chunks
+    from documents.models import Document
+
+    rng = np.random.default_rng(args.seed)
+    user, _ = get_user_model().objects.get_or_create(
+        username=BENCH_USERNAME, defaults={'email': f'{BENCH_USERNAME}@example.com'},
+    )
+    if not args.reuse:
+        Document.objects.filter(user=user).delete()
+        start = time.perf_counter()
+        seed_corpus(user, args.documents, args.chunks_per_document, args.noise, rng)
+        print(f"Seeded {args.documents * args.chunks_per_document} chunks in {time.perf_counter() - start:.1f}s")
+
+    chunk_ids, matrix = load_matrix(user)
+    # Câu hỏi gần một chunk ngẫu nhiên (giống câu hỏi thật nhắm vào một đoạn trong tài liệu)
+    anchors = matrix[rng.integers(0, len(matrix), args.queries)]
+    queries = _normalize(anchors + 0.05 * rng.standard_normal(anchors.shape).astype(np.float32))
+    truths = [set(chunk_ids[np.argsort(-(matrix @ q))[:args.k]]) for q in queries]
+
+    results = {}
+    for m in args.candidates:
+        latencies, recalls = [], []
+        for query, truth in zip(queries, truths):
+            start = time.perf_counter()
+            chunks = retrieve_chunks(user, query, k=args.k, document_candidates=m)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(truth & {c.id for c in chunks}) / args.k)
+        name = 'flat' if m == 0 else f'm={m}'
+        results[name] = {'latency': latency_summary(latencies), 'recall_at_k': float(np.mean(recalls))}
+        print(f"{name}: p50={results[name]['latency']['p50'] * 1000:.1f}ms "
+              f"p95={results[name]['latency']['p95'] * 1000:.1f}ms recall={results[name]['recall_at_k']:.3f}")
+
+    if not args.keep:
+        Document.objects.filter(user=user).delete()
+
+    write_report({
+        'benchmark': 'two_stage_retrieval',
+        'config': vars(args),
+        'chunks': len(chunk_ids),
+        'results': results,
+    }, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from core.metrics import record_llm_call, record_llm_first_token, record_llm_model_load
+
+logger = logging.getLogger(__name__)
+
+# Phần system giống hệt nhau ở mọi request và luôn đứng đầu prompt: server (llama.cpp trong
+# Ollama) giữ KV cache của prefix này trong slot, request sau chỉ phải xử lý phần context + câu hỏi.
+# Không đưa thông tin thay đổi theo request (ngày giờ, tên user...) vào đây.
+SYSTEM_PROMPT = (
+    "Bạn là trợ lý trả lời câu hỏi dựa trên tài liệu của người dùng. "
+    "Chỉ dùng thông tin trong phần Ngữ cảnh để trả lời. "
+    "Nếu ngữ cảnh không có thông tin cần thiết, hãy nói rằng tài liệu không đề cập. "
+    "Trả lời ngắn gọn, bằng ngôn ngữ của câu hỏi."
+)
+
+# load_duration lớn hơn ngưỡng này nghĩa là model vừa được nạp lại vào bộ nhớ
+MODEL_LOAD_THRESHOLD = 0.5  # giây
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+@dataclass
+class Generation:
+    text: str
+    completion_tokens: int = None
+    first_token_seconds: float = None
+    load_seconds: float = None
+
+
+def build_messages(question, context):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Ngữ cảnh:\n{context}\n\nCâu hỏi: {question}"},
+    ]
+
+
+class LLMBackend:
+    """
+    Backend sinh câu trả lời. Số request đồng thời của mỗi process bị giới hạn bằng số
+    slot song song của server (LLM_MAX_IN_FLIGHT = OLLAMA_NUM_PARALLEL): server gộp các slot
+    đang chạy thành một batch decode, request vượt quá chỉ nằm chờ trong hàng đợi của server.
+    """
+    name = None
+
+    def __init__(self, model, base_url, timeout, parallel):
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, parallel))
+
+    def generate(self, messages):
+        with self._slots:
+            start = time.perf_counter()
+            result = self._generate(messages)
+            seconds = time.perf_counter() - start
+
+        record_llm_call(self.model, seconds, result.completion_tokens)
+        if result.first_token_seconds is not None:
+            record_llm_first_token(self.model, result.first_token_seconds)
+        if result.load_seconds and result.load_seconds >= MODEL_LOAD_THRESHOLD:
+            record_llm_model_load(self.model, result.load_seconds, 'request')
+            logger.warning(f"LLM model {self.model} was loaded on demand ({result.load_seconds:.1f}s).")
+        logger.info(
+            f"LLM answered in {seconds:.2f}s (first token {result.first_token_seconds or 0:.2f}s, "
+            f"{result.completion_tokens or '?'} tokens)"
+        )
+        return result
+
+    def warm_up(self):
+        """Giữ model nằm trong bộ nhớ của server; trả về thời gian nạp model nếu server báo về."""
+        load_seconds = self._warm_up()
+        if load_seconds and load_seconds >= MODEL_LOAD_THRESHOLD:
+            record_llm_model_load(self.model, load_seconds, 'warmup')
+            logger.info(f"LLM model {self.model} loaded by warm-up ({load_seconds:.1f}s).")
+        return load_seconds
+
+    def _generate(self, messages):
+        raise NotImplementedError
+
+    def _warm_up(self):
+        raise NotImplementedError
+
+
+class OllamaBackend(LLMBackend):
+    """API native của Ollama: có keep_alive để model không bị unload giữa các đợt request."""
+    name = 'ollama'
+
+    def __init__(self, model, base_url, timeout, parallel):
+        # LLM_BASE_URL trỏ tới endpoint tương thích OpenAI (.../v1), API native nằm ở gốc
+        super().__init__(model, base_url.rstrip('/').removesuffix('/v1'), timeout, parallel)
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            f"{self.base_url}{path}", data=json.dumps(payload).encode('utf-8'), method='POST',
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, TimeoutError):
+                raise LLMTimeout(str(e))
+            raise LLMError(str(e))
+        except TimeoutError as e:
+            raise LLMTimeout(str(e))
+
+    def _generate(self, messages):
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'stream': True,
+            'keep_alive': settings.LLM_KEEP_ALIVE,
+            'options': {'temperature': settings.LLM_TEMPERATURE, 'num_predict': settings.LLM_MAX_TOKENS},
+        }
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        final = {}
+        try:
+            with self._post('/api/chat', payload) as response:
+                # Mỗi dòng là một JSON; dòng cuối có done=true kèm thống kê (load_duration, eval_count)
+                for line in response:
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if event.get('error'):
+                        raise LLMError(event['error'])
+                    content = event.get('message', {}).get('content')
+                    if content:
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        parts.append(content)
+                    if event.get('done'):
+                        final = event
+                        break
+        except TimeoutError as e:
+            raise LLMTimeout(str(e))
+        return Generation(
+            text=''.join(parts).strip(),
+            completion_tokens=final.get('eval_count'),
+            first_token_seconds=first_token,
+            load_seconds=final.get('load_duration', 0) / 1e9,
+        )
+
+    def _warm_up(self):
+        # Request không có prompt: Ollama chỉ nạp model (nếu cần) và gia hạn keep_alive
+        with self._post('/api/generate', {'model': self.model, 'keep_alive': settings.LLM_KEEP_ALIVE, 'stream': False}) as response:
+            return json.loads(response.read()).get('load_duration', 0) / 1e9
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Endpoint tương thích OpenAI (vLLM, benchmarks.mock_llm...); không có keep_alive/load_duration."""
+    name = 'openai'
+
+    def __init__(self, model, base_url, timeout, parallel):
+        super().__init__(model, base_url, timeout, parallel)
+        from openai import OpenAI
+        # Tắt retry để tránh double timeout
+        self.client = OpenAI(base_url=self.base_url, api_key=settings.LLM_API_KEY, timeout=timeout, max_retries=0)
+
+    def _generate(self, messages):
+        import openai
+        start = time.perf_counter()
+        first_token = None
+        parts = []
+        completion_tokens = None
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=settings.LLM_TEMPERATURE,
+                max_tokens=settings.LLM_MAX_TOKENS,
+                stream=True,
+                # Chunk cuối (không có choices) mang usage để đếm completion token
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                if chunk.usage:
+                    completion_tokens = chunk.usage.completion_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    parts.append(chunk.choices[0].delta.content)
+        except openai.APITimeoutError as e:
+            raise LLMTimeout(str(e))
+        except openai.OpenAIError as e:
+            raise LLMError(str(e))
+        return Generation(''.join(parts).strip(), completion_tokens, first_token)
+
+    def _warm_up(self):
+        self.client.chat.completions.create(
+            model=self.model, messages=[{"role": "system", "content": SYSTEM_PROMPT}], max_tokens=1,
+        )
+        return None
+
+
+BACKENDS = {
+    OllamaBackend.name: OllamaBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend():
+    """Backend LLM dùng chung trong process (chọn qua settings.LLM_BACKEND)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                try:
+                    backend_class = BACKENDS[settings.LLM_BACKEND]
+                except KeyError:
+                    raise ValueError(f"Unknown LLM backend: {settings.LLM_BACKEND}")
+                _backend = backend_class(
+                    settings.LLM_MODEL, settings.LLM_BASE_URL, settings.LLM_TIMEOUT, settings.LLM_MAX_IN_FLIGHT,
+                )
+    return _backend
@@ -27,4 +27,31 @@ class ChatMessage(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Message {self.id} in Conversation {self.conversation.id}"
\ No newline at end of file
+        return f"Message {self.id} in Conversation {self.conversation.id}"
+
+class ChatJob(models.Model):
+    """Câu hỏi được trả lời bất đồng bộ trên worker LLM; client poll trạng thái hoặc nhận webhook."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    conversation = models.ForeignKey(Conversation, related_name='jobs', on_delete=models.CASCADE)
+    user_message = models.ForeignKey(ChatMessage, related_name='+', on_delete=models.CASCADE)
+    assistant_message = models.ForeignKey(ChatMessage, related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    # Phạm vi tìm kiếm của câu hỏi (document_ids, tags, created_after/before) dạng JSON
+    filters = models.JSONField(default=dict, blank=True)
+    webhook_url = models.URLField(max_length=500, blank=True)
+    webhook_delivered_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"ChatJob {self.id} ({self.status})"
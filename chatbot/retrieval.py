@@ -0,0 +1,296 @@
+import logging
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Cast
+from pgvector.django import CosineDistance, VectorField
+
+from core.db_router import read_alias
+from core.metrics import stage
+from documents.models import Document, DocumentChunk, DocumentChunkEmbedding
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_ENDINGS = ('.', '!', '?', '…', ':', ';')
+
+_iterative_scan_supported = {}
+
+
+def iterative_scan_supported(alias='default'):
+    """hnsw.iterative_scan chỉ có từ pgvector 0.8.0."""
+    if alias not in _iterative_scan_supported:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+        version = tuple(int(p) for p in row[0].split('.')[:2]) if row else (0, 0)
+        _iterative_scan_supported[alias] = version >= (0, 8)
+    return _iterative_scan_supported[alias]
+
+
+def scoped_documents(user, document_ids=None, tags=None, created_after=None, created_before=None):
+    """Các tài liệu đã xử lý xong của user, thu hẹp theo filter của câu hỏi."""
+    documents = Document.objects.filter(user=user, status='completed')
+    if document_ids:
+        documents = documents.filter(id__in=document_ids)
+    if tags:
+        documents = documents.filter(tags__overlap=list(tags))
+    if created_after:
+        documents = documents.filter(created_at__gte=created_after)
+    if created_before:
+        documents = documents.filter(created_at__lte=created_before)
+    return documents
+
+
+def _exact_search(user, document_ids, query_embedding, k):
+    """
+    Ít tài liệu: quét chính xác các chunk của chúng (bitmap scan qua index document_id) rồi
+    sắp xếp theo khoảng cách, luôn đủ k kết quả. Index scan bị tắt trong transaction để
+    planner không chọn HNSW rồi lọc sau (có thể trả về ít hơn k dòng).
+    """
+    queryset = (
+        DocumentChunk.objects.filter(user=user, document_id__in=document_ids)
+        .annotate(distance=CosineDistance('embedding', query_embedding))
+        .order_by('distance')[:k]
+    )
+    alias = read_alias()
+    if connections[alias].vendor != 'postgresql':
+        return list(queryset)
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SET LOCAL enable_indexscan = off")
+        return list(queryset)
+
+
+def _with_iterative_scan(queryset):
+    """
+    Chạy truy vấn HNSW có filter với iterative scan để index tiếp tục quét khi
+    filter loại bớt ứng viên, tránh trả về ít hơn số kết quả yêu cầu.
+    """
+    # SET LOCAL phải chạy trên cùng kết nối (primary hoặc replica) với truy vấn
+    alias = read_alias()
+    if connections[alias].vendor != 'postgresql' or not iterative_scan_supported(alias):
+        return list(queryset)
+
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            # relaxed_order nhanh hơn strict_order; thứ tự được sắp lại bên dưới
+            cursor.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+            cursor.execute("SET LOCAL hnsw.ef_search = %s", [settings.RETRIEVAL_HNSW_EF_SEARCH])
+            cursor.execute("SET LOCAL hnsw.max_scan_tuples = %s", [settings.RETRIEVAL_HNSW_MAX_SCAN_TUPLES])
+        rows = list(queryset)
+    return sorted(rows, key=lambda row: row.distance)
+
+
+def _ann_search(user, documents, query_embedding, k):
+    """
+    Tìm ANN qua HNSW index của chunk với filter theo phạm vi tài liệu.
+    Filter theo chunk.user để Postgres chỉ quét partition (và HNSW index) của user
+    khi bảng chunk đã được partition (xem partition_document_chunks).
+    """
+    return _with_iterative_scan(
+        DocumentChunk.objects.filter(user=user, document__in=documents)
+        .annotate(distance=CosineDistance('embedding', query_embedding))
+        .order_by('distance')[:k]
+    )
+
+
+def _candidate_documents(documents, query_embedding, m):
+    """
+    Stage 1: M tài liệu có centroid gần câu hỏi nhất, cộng các tài liệu chưa có centroid
+    (xử lý trước khi có cột này) để không bỏ sót. Trả về None nếu user có không quá M
+    tài liệu, khi đó chọn trước tài liệu không giúp thu hẹp gì.
+    """
+    nearest = _with_iterative_scan(
+        documents.filter(centroid__isnull=False)
+        .annotate(distance=CosineDistance('centroid', query_embedding))
+        .only('id')
+        .order_by('distance')[:m]
+    )
+    if len(nearest) < m:
+        return None
+    legacy_ids = list(documents.filter(centroid__isnull=True).values_list('id', flat=True))
+    return [document.id for document in nearest] + legacy_ids
+
+
+def _search_within(user, document_ids, query_embedding, k):
+    if len(document_ids) <= settings.RETRIEVAL_EXACT_MAX_DOCUMENTS:
+        return _exact_search(user, document_ids, query_embedding, k)
+    return _ann_search(user, Document.objects.filter(id__in=document_ids), query_embedding, k)
+
+
+def _version_search(user, documents, version, query_embedding, k):
+    """
+    Tìm trên vector của một version embedding khác inline (bảng DocumentChunkEmbedding).
+    Biểu thức Cast khớp với HNSW index riêng của version (xem create_version_index).
+    """
+    vector = Cast('embedding', VectorField(dimensions=version.dimensions))
+    rows = _with_iterative_scan(
+        DocumentChunkEmbedding.objects.filter(version=version, user=user, document__in=documents)
+        .annotate(distance=CosineDistance(vector, query_embedding))
+        .only('chunk_id')
+        .order_by('distance')[:k]
+    )
+    chunks = DocumentChunk.objects.filter(user=user).in_bulk([row.chunk_id for row in rows])
+    results = []
+    for row in rows:
+        chunk = chunks.get(row.chunk_id)
+        if chunk is not None:
+            chunk.distance = row.distance
+            results.append(chunk)
+    return results
+
+
+def retrieve_chunks(user, query_embedding, k=None, document_ids=None, tags=None, created_after=None,
+                    created_before=None, document_candidates=None, version=None):
+    """
+    Trả về k chunk gần câu hỏi nhất trong phạm vi tài liệu được chọn.
+    Filter chọn lọc (ít tài liệu) dùng quét chính xác. Với nhiều tài liệu, chọn trước
+    document_candidates (M) tài liệu theo centroid rồi chỉ tìm chunk trong đó;
+    M = 0 thì tìm thẳng trên toàn bộ chunk bằng HNSW + iterative scan.
+    version là EmbeddingVersion của query_embedding; None hoặc inline dùng DocumentChunk.embedding.
+    """
+    k = k or settings.RETRIEVAL_TOP_K
+    if document_candidates is None:
+        document_candidates = settings.RETRIEVAL_DOCUMENT_CANDIDATES
+    documents = scoped_documents(user, document_ids, tags, created_after, created_before)
+
+    if version is not None and not version.inline:
+        # Centroid chỉ có trong không gian vector inline nên không chọn trước tài liệu
+        with stage('chat', 'retrieval'):
+            return _version_search(user, documents, version, query_embedding, k)
+
+    with stage('chat', 'retrieval'):
+        if document_ids or tags or created_after or created_before:
+            limit = settings.RETRIEVAL_EXACT_MAX_DOCUMENTS
+            candidate_ids = list(documents.values_list('id', flat=True)[:limit + 1])
+            if not candidate_ids:
+                return []
+            if len(candidate_ids) <= limit:
+                return _exact_search(user, candidate_ids, query_embedding, k)
+        if document_candidates:
+            candidate_ids = _candidate_documents(documents, query_embedding, document_candidates)
+            if candidate_ids is not None:
+                return _search_within(user, candidate_ids, query_embedding, k)
+        return _ann_search(user, documents, query_embedding, k)
+
+
+@dataclass
+class Passage:
+    """Một đoạn context liền mạch gồm các chunk hit và phần lân cận đã ghép lại."""
+    document_id: object
+    content: str
+    distance: float
+    hits: list = field(default_factory=list)
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def _overlap(previous_words, next_words, max_overlap=200):
+    """Số từ ở cuối chunk trước lặp lại ở đầu chunk sau (do chunk_overlap)."""
+    limit = min(len(previous_words), len(next_words), max_overlap)
+    for size in range(limit, 0, -1):
+        if previous_words[-size:] == next_words[:size]:
+            return size
+    return 0
+
+
+def _snap_start(words, start, earliest):
+    # Lùi về đầu câu gần nhất trong phạm vi cho phép để không cắt giữa câu
+    for i in range(earliest, start + 1):
+        if i == 0 or words[i - 1].endswith(SENTENCE_ENDINGS):
+            return i
+    return earliest
+
+
+def _snap_end(words, end, latest):
+    for i in range(latest, end - 1, -1):
+        if i == len(words) or words[i - 1].endswith(SENTENCE_ENDINGS):
+            return i
+    return latest
+
+
+def _build_passage(chunks, hits_by_id, budget_words):
+    words = []
+    hit_spans = []
+    for chunk in chunks:
+        chunk_words = chunk.content.split()
+        skip = _overlap(words, chunk_words) if words else 0
+        start = len(words) - skip
+        words.extend(chunk_words[skip:])
+        if chunk.id in hits_by_id:
+            hit_spans.append((start, len(words)))
+
+    first_hit = min(s for s, _ in hit_spans)
+    last_hit = max(e for _, e in hit_spans)
+    start = _snap_start(words, first_hit, max(0, first_hit - budget_words))
+    end = _snap_end(words, last_hit, min(len(words), last_hit + budget_words))
+    hits = [hits_by_id[c.id] for c in chunks if c.id in hits_by_id]
+    return Passage(
+        document_id=chunks[0].document_id,
+        content=" ".join(words[start:end]),
+        distance=min(h.distance for h in hits),
+        hits=hits,
+    )
+
+
+def expand_neighbours(hits, window=None, budget_words=None, user=None):
+    """
+    Ghép mỗi chunk hit với ±window chunk lân cận (một query cho tất cả hit),
+    gộp các cửa sổ chồng nhau trong cùng tài liệu, bỏ phần từ lặp do overlap,
+    và chỉ giữ tối đa budget_words từ lân cận mỗi phía (cắt theo ranh giới câu).
+    """
+    window = settings.RETRIEVAL_NEIGHBOUR_WINDOW if window is None else window
+    budget_words = settings.RETRIEVAL_NEIGHBOUR_WORDS if budget_words is None else budget_words
+
+    indexed = [h for h in hits if h.chunk_index is not None]
+    passages = [
+        Passage(document_id=h.document_id, content=h.content, distance=h.distance, hits=[h])
+        for h in hits if h.chunk_index is None
+    ]
+    if not indexed or window <= 0:
+        passages.extend(
+            Passage(document_id=h.document_id, content=h.content, distance=h.distance, hits=[h]) for h in indexed
+        )
+        return sorted(passages, key=lambda p: p.distance)
+
+    ranges_by_document = {}
+    for hit in indexed:
+        ranges_by_document.setdefault(hit.document_id, []).append(
+            (max(0, hit.chunk_index - window), hit.chunk_index + window)
+        )
+    windows = {doc_id: _merge_ranges(ranges) for doc_id, ranges in ranges_by_document.items()}
+
+    condition = Q()
+    for document_id, merged in windows.items():
+        for lo, hi in merged:
+            condition |= Q(document_id=document_id, chunk_index__range=(lo, hi))
+    queryset = DocumentChunk.objects.filter(condition)
+    if user is not None:
+        # Giới hạn vào partition của user khi bảng chunk được partition
+        queryset = queryset.filter(user=user)
+    with stage('chat', 'neighbour_expansion'):
+        neighbours = list(
+            queryset.only('id', 'document_id', 'chunk_index', 'content')
+            .order_by('document_id', 'chunk_index')
+        )
+
+    hits_by_id = {h.id: h for h in indexed}
+    for document_id, merged in windows.items():
+        for lo, hi in merged:
+            chunks = [
+                c for c in neighbours
+                if c.document_id == document_id and lo <= c.chunk_index <= hi
+            ]
+            if any(c.id in hits_by_id for c in chunks):
+                passages.append(_build_passage(chunks, hits_by_id, budget_words))
+    return sorted(passages, key=lambda p: p.distance)
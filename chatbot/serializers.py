@@ -1,9 +1,48 @@
 from rest_framework import serializers
-from .models import Conversation, ChatMessage, DocumentChunk
+from .models import Conversation, ChatMessage, ChatJob, DocumentChunk
+from .webhooks import WebhookRejected, resolve
 
-class AskQuestionSerializer(serializers.Serializer):
+class RetrievalFilterSerializer(serializers.Serializer):
+    # Giới hạn phạm vi tìm kiếm (không truyền = toàn bộ tài liệu của user)
+    document_ids = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=100)
+    tags = serializers.ListField(child=serializers.CharField(max_length=50), required=False, max_length=20)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        after, before = attrs.get('created_after'), attrs.get('created_before')
+        if after and before and after > before:
+            raise serializers.ValidationError({"created_after": "created_after phải trước created_before."})
+        return attrs
+
+
+class AskQuestionSerializer(RetrievalFilterSerializer):
     question = serializers.CharField(max_length=1000)
     conversation_id = serializers.UUIDField(required=False, allow_null=True)
+    # 'async': trả về job ngay, câu trả lời được sinh trên worker LLM
+    mode = serializers.ChoiceField(choices=['sync', 'async'], default='sync')
+    webhook_url = serializers.URLField(required=False, max_length=500)
+
+    def validate_webhook_url(self, value):
+        # Kiểm tra sớm để báo lỗi cho client; worker kiểm tra lại khi gửi (DNS có thể đổi)
+        try:
+            resolve(value)
+        except WebhookRejected as e:
+            raise serializers.ValidationError(f"Webhook URL không được phép: {e}")
+        return value
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs.get('webhook_url') and attrs['mode'] != 'async':
+            raise serializers.ValidationError({"webhook_url": "webhook_url chỉ dùng với mode 'async'."})
+        return attrs
+
+    def filters(self):
+        """Các filter đã validate, ở dạng JSON để lưu vào ChatJob."""
+        return {
+            key: value for key, value in self.data.items()
+            if key in RetrievalFilterSerializer._declared_fields and value is not None
+        }
     
     
 class DocumentChunkSourceSerializer(serializers.ModelSerializer):
@@ -25,4 +64,15 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 class ConversationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conversation
-        fields = ['id', 'user', 'title', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'user', 'title', 'created_at', 'updated_at']
+
+
+class ChatJobSerializer(serializers.ModelSerializer):
+    assistant_message = ChatMessageSerializer(read_only=True)
+
+    class Meta:
+        model = ChatJob
+        fields = [
+            'id', 'status', 'conversation', 'user_message', 'assistant_message', 'error',
+            'created_at', 'started_at', 'finished_at', 'webhook_delivered_at',
+        ]
@@ -0,0 +1,131 @@
+import logging
+import math
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+
+from core.db_router import read_replica
+from core.metrics import stage
+from documents.embedding_versions import backend_for, get_active_version
+from .llm import LLMTimeout, build_messages, get_llm_backend
+from .models import ChatMessage
+from .retrieval import expand_neighbours, retrieve_chunks
+
+logger = logging.getLogger(__name__)
+
+NO_CONTEXT_ANSWER = "Xin lỗi, tôi không tìm thấy thông tin liên quan trong tài liệu của bạn để trả lời câu hỏi này."
+# Ước lượng số token từ số ký tự (không có tokenizer của model trong app); tiếng Việt có dấu
+# tốn nhiều token hơn tiếng Anh nên chọn tỉ lệ thấp để không vượt num_ctx của model
+CHARS_PER_TOKEN = 3
+# Phần còn lại nhỏ hơn ngưỡng này thì không thêm đoạn cắt cụt vào context nữa
+MIN_PASSAGE_TOKENS = 32
+
+
+class EmbeddingUnavailable(Exception):
+    pass
+
+
+def retrieve_relevant_chunks(user, question, filters):
+    """Vector hoá câu hỏi và tìm các chunk liên quan nhất trong phạm vi tài liệu của user."""
+    # Câu hỏi phải được encode bằng đúng model của version đang active
+    version = get_active_version()
+    embedding_backend = backend_for(version)
+    if not embedding_backend:
+        raise EmbeddingUnavailable("Embedding model not available.")
+
+    with stage('chat', 'query_embedding'):
+        question_embedding = embedding_backend.encode_query(question)
+
+    # Chỉ tìm trong các tài liệu đã xử lý xong ('completed'), theo phạm vi user chọn
+    # Truy vấn vector chạy trên read replica (nếu có) để không tranh tài nguyên với ingestion
+    with read_replica(user):
+        return retrieve_chunks(
+            user,
+            question_embedding,
+            document_ids=filters.get('document_ids'),
+            tags=filters.get('tags'),
+            created_after=filters.get('created_after'),
+            created_before=filters.get('created_before'),
+            version=version,
+        )
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _truncate(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    # Cắt ở ranh giới từ gần nhất
+    head = text[:max_chars]
+    return head.rsplit(' ', 1)[0] if ' ' in head else head
+
+
+def build_context(passages, max_tokens=None):
+    """
+    Ghép các passage (gần nhất trước) trong ngân sách LLM_CONTEXT_TOKENS. Passage vượt
+    phần ngân sách còn lại được cắt bớt phần cuối thay vì bị bỏ qua.
+    """
+    remaining = settings.LLM_CONTEXT_TOKENS if max_tokens is None else max_tokens
+    context_parts = []
+    for passage in passages:
+        if remaining < MIN_PASSAGE_TOKENS:
+            break
+        content = _truncate(passage.content, remaining)
+        context_parts.append(content)
+        remaining -= estimate_tokens(content) + 1  # +1 cho dấu phân cách
+    return "\n\n".join(context_parts)
+
+
+def generate_answer(question, context):
+    """Gọi LLM sinh câu trả lời từ context; lỗi được đổi thành câu trả lời thông báo cho user."""
+    start_time = time.time()
+    try:
+        logger.info(f"Starting AI request for question: {question[:50]}...")
+        with stage('chat', 'generation'):
+            return get_llm_backend().generate(build_messages(question, context)).text
+    except LLMTimeout as e:
+        logger.error(f"LLM request timed out after {time.time() - start_time:.2f}s: {e}")
+        return "Xin lỗi, hệ thống AI hiện đang quá tải. Vui lòng thử lại sau ít phút."
+    except Exception as e:
+        logger.error(f"Error calling LLM after {time.time() - start_time:.2f}s: {e}", exc_info=True)
+        return "Xin lỗi, đã có lỗi xảy ra khi xử lý yêu cầu của bạn với mô hình AI."
+
+
+def answer_question(conversation, user, question, filters, admission=nullcontext):
+    """
+    RAG cho một câu hỏi: retrieval -> ghép context -> gọi LLM -> lưu tin nhắn assistant.
+    Dùng chung cho chế độ đồng bộ (ChatView) và bất đồng bộ (task generate_chat_answer).
+    admission (vd. llm_slot) chỉ bọc bước gọi LLM, không giữ slot trong lúc retrieval.
+    """
+    # --- BƯỚC 1: RETRIEVAL ---
+    relevant_chunks = retrieve_relevant_chunks(user, question, filters)
+
+    if not relevant_chunks:
+        return ChatMessage.objects.create(conversation=conversation, role='assistant', content=NO_CONTEXT_ANSWER)
+
+    # --- BƯỚC 2: AUGMENTATION ---
+    # Ghép chunk tìm được với các chunk lân cận để không mất câu bị cắt ở ranh giới chunk
+    with read_replica(user):
+        passages = expand_neighbours(relevant_chunks, user=user)
+
+    with stage('chat', 'prompt_assembly'):
+        context = build_context(passages)
+
+    # --- BƯỚC 3: GENERATION ---
+    with admission():
+        final_answer = generate_answer(question, context)
+
+    # Tạo và lưu tin nhắn của assistant
+    with stage('chat', 'persist'):
+        assistant_message = ChatMessage.objects.create(
+            conversation=conversation,
+            role='assistant',
+            content=final_answer
+        )
+        # Gắn các sources vào tin nhắn
+        assistant_message.sources.set(relevant_chunks)
+    return assistant_message
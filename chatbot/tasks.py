@@ -0,0 +1,115 @@
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from core.admission import ServiceOverloaded, llm_slot
+from .llm import get_llm_backend
+from .models import ChatJob
+from .serializers import ChatJobSerializer, RetrievalFilterSerializer
+from .services import answer_question
+from .webhooks import WebhookRejected, post
+
+logger = logging.getLogger(__name__)
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'assistant_message', 'finished_at'])
+    if job.webhook_url:
+        deliver_chat_webhook.delay(str(job.id))
+
+
+@shared_task(bind=True, name='chatbot.tasks.generate_chat_answer', acks_late=True, max_retries=30)
+def generate_chat_answer(self, job_id):
+    """
+    Sinh câu trả lời cho ChatJob trên queue 'llm'. Worker này chạy với concurrency bằng
+    số slot song song của Ollama; slot LLM dùng chung với chế độ đồng bộ nên khi hết slot
+    task được retry sau Retry-After thay vì gọi thêm vào model (retrieval sẽ chạy lại).
+    """
+    try:
+        job = ChatJob.objects.select_related('user', 'conversation', 'user_message').get(id=job_id)
+    except ChatJob.DoesNotExist:
+        logger.warning(f"Chat job {job_id} not found.")
+        return
+    if job.status in ('completed', 'failed'):
+        return
+
+    try:
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+
+        filters = RetrievalFilterSerializer(data=job.filters)
+        filters.is_valid(raise_exception=True)
+        # Slot LLM chỉ giữ trong lúc sinh câu trả lời, không giữ khi embed câu hỏi/retrieval
+        job.assistant_message = answer_question(
+            job.conversation, job.user, job.user_message.content, filters.validated_data, admission=llm_slot,
+        )
+        _finish(job, 'completed')
+    except ServiceOverloaded as e:
+        if self.request.retries >= self.max_retries:
+            _finish(job, 'failed', 'Mô hình AI quá tải, không thể trả lời câu hỏi.')
+            return
+        job.status = 'queued'
+        job.save(update_fields=['status'])
+        raise self.retry(countdown=e.wait)
+    except Exception as e:
+        logger.error(f"Chat job {job_id} failed: {e}", exc_info=True)
+        _finish(job, 'failed', str(e))
+
+
+def _sign(body):
+    secret = settings.CHAT_WEBHOOK_SECRET
+    if not secret:
+        return None
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+@shared_task(bind=True, name='chatbot.tasks.deliver_chat_webhook', max_retries=5)
+def deliver_chat_webhook(self, job_id):
+    """POST kết quả job tới webhook_url của client, ký HMAC-SHA256 nếu có CHAT_WEBHOOK_SECRET."""
+    job = ChatJob.objects.select_related('assistant_message').filter(id=job_id).first()
+    if not job or not job.webhook_url:
+        return
+
+    body = json.dumps(ChatJobSerializer(job).data, cls=DjangoJSONEncoder).encode('utf-8')
+    headers = {'Content-Type': 'application/json', 'X-Chat-Job-Id': str(job.id)}
+    signature = _sign(body)
+    if signature:
+        headers['X-Webhook-Signature'] = signature
+
+    try:
+        status = post(job.webhook_url, body, headers, settings.CHAT_WEBHOOK_TIMEOUT)
+    except WebhookRejected as e:
+        logger.warning(f"Webhook for chat job {job_id} not sent: {e}")
+        return
+    except (OSError, http.client.HTTPException) as e:
+        # Lỗi kết nối, timeout, TLS, response hỏng
+        raise self.retry(exc=e, countdown=2 ** self.request.retries * 10)
+    if status >= 500:
+        raise self.retry(exc=RuntimeError(f"HTTP {status}"), countdown=2 ** self.request.retries * 10)
+    if status >= 300:
+        # Redirect không được đi theo; lỗi phía client (4xx) thì gửi lại cũng vô ích
+        logger.warning(f"Webhook for chat job {job_id} rejected with HTTP {status}.")
+        return
+
+    job.webhook_delivered_at = timezone.now()
+    job.save(update_fields=['webhook_delivered_at'])
+
+
+@shared_task(name='chatbot.tasks.warm_up_llm', ignore_result=True)
+def warm_up_llm():
+    """Ping định kỳ (beat) để model LLM luôn nằm sẵn trong bộ nhớ của server."""
+    try:
+        get_llm_backend().warm_up()
+    except Exception as e:
+        logger.warning(f"LLM warm-up failed: {e}")
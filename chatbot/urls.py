@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import ChatView
+from .views import ChatView, ChatJobDetailView
 
 urlpatterns = [
     path('ask/', ChatView.as_view(), name='chat-ask'),
+    path('jobs/<uuid:pk>/', ChatJobDetailView.as_view(), name='chat-job-detail'),
 ]
\ No newline at end of file
@@ -1,136 +1,111 @@
+from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from pgvector.django import CosineDistance
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
 
-from .serializers import AskQuestionSerializer, ChatMessageSerializer
-from .models import Conversation, ChatMessage
-from documents.models import DocumentChunk
-from documents.tasks import embedding_model 
-from openai import OpenAI
+from .serializers import AskQuestionSerializer, ChatJobSerializer, ChatMessageSerializer
+from .models import Conversation, ChatMessage, ChatJob
+from .services import EmbeddingUnavailable, answer_question
+from .tasks import generate_chat_answer
+from core.admission import ServiceOverloaded, check_queue_capacity, llm_slot
+from core.throttling import ChatThrottle
 import logging
-import time
 
 logger = logging.getLogger(__name__)
 
     
 class ChatView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ChatThrottle]
     
     def post(self, request, *args, **kwargs):
         serializer = AskQuestionSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        question = serializer.validated_data['question']
-        conversation_id = serializer.validated_data.get('conversation_id')
-        user = request.user
+        if serializer.validated_data['mode'] == 'async':
+            # Queue LLM quá dài thì trả 503 ngay, không tạo job sẽ phải chờ rất lâu
+            check_queue_capacity('llm', settings.CHAT_MAX_QUEUE_DEPTH)
+            return self._enqueue(request, serializer)
 
-        # Lấy hoặc tạo mới cuộc trò chuyện
+        return self._answer(request.user, serializer.validated_data)
+
+    def _get_conversation(self, user, data):
+        """Lấy hoặc tạo mới cuộc trò chuyện; None nếu conversation_id không thuộc về user."""
+        conversation_id = data.get('conversation_id')
         if conversation_id:
-            try:
-                conversation = Conversation.objects.get(id=conversation_id, user=user)
-            except Conversation.DoesNotExist:
-                return Response({"error": "Conversation not found."}, status=status.HTTP_404_NOT_FOUND)
-        else:
-            conversation = Conversation.objects.create(user=user, title=question[:50])
+            return Conversation.objects.filter(id=conversation_id, user=user).first()
+        return Conversation.objects.create(user=user, title=data['question'][:50])
+
+    def _answer(self, user, data):
+        question = data['question']
+        is_new = not data.get('conversation_id')
+        conversation = self._get_conversation(user, data)
+        if conversation is None:
+            return Response({"error": "Conversation not found."}, status=status.HTTP_404_NOT_FOUND)
 
         # Lưu tin nhắn của người dùng
-        ChatMessage.objects.create(conversation=conversation, role='user', content=question)
-
-        # --- BƯỚC 1: RETRIEVAL ---
-        # Vector hóa câu hỏi
-        if not embedding_model:
-            return Response({"error": "Embedding model not available."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        question_embedding = embedding_model.encode(question)
-
-        # Tìm kiếm các chunks liên quan nhất trong tài liệu của user
-        # Chỉ tìm trong các tài liệu đã xử lý xong ('completed')
-        relevant_chunks = DocumentChunk.objects.filter(
-            document__user=user, 
-            document__status='completed'
-        ).annotate(
-            distance=CosineDistance('embedding', question_embedding)
-        ).order_by('distance')[:3] # Giảm xuống 3 chunks để giảm context length
-
-        if not relevant_chunks:
-            answer_content = "Xin lỗi, tôi không tìm thấy thông tin liên quan trong tài liệu của bạn để trả lời câu hỏi này."
-            assistant_message = ChatMessage.objects.create(
-                conversation=conversation, 
-                role='assistant', 
-                content=answer_content
-            )
-            return Response(ChatMessageSerializer(assistant_message).data, status=status.HTTP_200_OK)
-
-        # --- BƯỚC 2: AUGMENTATION ---
-        # Giới hạn độ dài context để tránh quá tải model
-        context_parts = []
-        total_length = 0
-        max_context_length = 2000  # Giới hạn context length
-        
-        for chunk in relevant_chunks:
-            if total_length + len(chunk.content) > max_context_length:
-                break
-            context_parts.append(chunk.content)
-            total_length += len(chunk.content)
-            
-        context = "\n\n".join(context_parts)
-
-        # --- BƯỚC 3: GENERATION ---
-        # Sử dụng prompt ngắn gọn ngay từ đầu để giảm thời gian xử lý
-        prompt = f"Trả lời ngắn gọn: {question}"
-        
-        final_answer = ""
-        start_time = time.time()
+        user_message = ChatMessage.objects.create(conversation=conversation, role='user', content=question)
+
         try:
-            logger.info(f"Starting AI request for question: {question[:50]}...")
-            
-            # Tăng timeout và config connection
-            client = OpenAI(
-                base_url='http://ollama:11434/v1', 
-                api_key='ollama',
-                timeout=180.0,  # Tăng timeout lên 180 giây (3 phút)
-                max_retries=0   # Tắt retry để tránh double timeout
-            )
-            
-            # Warm-up model nếu là request đầu tiên (tùy chọn)
-            logger.info("Sending request to phi3:mini model...")
-            
-            response = client.chat.completions.create(
-                model="phi3:mini", 
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,  # Giảm temperature để response nhanh hơn
-                max_tokens=300,   # Giảm response length
-                stream=False
-            )
-            final_answer = response.choices[0].message.content.strip()
-            
-            processing_time = time.time() - start_time
-            logger.info(f"AI response received in {processing_time:.2f} seconds")
-
-        except Exception as e:
-            processing_time = time.time() - start_time
-            logger.error(f"Error calling OpenAI API after {processing_time:.2f}s: {e}", exc_info=True)
-            
-            if "timeout" in str(e).lower():
-                final_answer = "Xin lỗi, hệ thống AI hiện đang quá tải. Vui lòng thử lại sau ít phút."
-            else:
-                final_answer = "Xin lỗi, đã có lỗi xảy ra khi xử lý yêu cầu của bạn với mô hình AI."
-        
-        # Tạo và lưu tin nhắn của assistant
-        assistant_message = ChatMessage.objects.create(
-            conversation=conversation,
-            role='assistant',
-            content=final_answer  
-        )
-        # Gắn các sources vào tin nhắn
-        assistant_message.sources.set(relevant_chunks)
+            # Slot LLM chỉ giữ trong lúc sinh câu trả lời; hết slot thì trả 503 + Retry-After
+            # ngay thay vì để request xếp hàng sau Ollama
+            assistant_message = answer_question(conversation, user, question, data, admission=llm_slot)
+        except EmbeddingUnavailable as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except ServiceOverloaded:
+            # Câu hỏi chưa được trả lời: bỏ tin nhắn để client gửi lại không bị trùng
+            user_message.delete()
+            if is_new:
+                conversation.delete()
+            raise
 
         response_serializer = ChatMessageSerializer(assistant_message)
         return Response(response_serializer.data, status=status.HTTP_200_OK)
 
-    
-    
\ No newline at end of file
+    def _enqueue(self, request, serializer):
+        data = serializer.validated_data
+        conversation = self._get_conversation(request.user, data)
+        if conversation is None:
+            return Response({"error": "Conversation not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            user_message = ChatMessage.objects.create(conversation=conversation, role='user', content=data['question'])
+            job = ChatJob.objects.create(
+                user=request.user,
+                conversation=conversation,
+                user_message=user_message,
+                filters=serializer.filters(),
+                webhook_url=data.get('webhook_url', ''),
+            )
+            # Chỉ đẩy task khi job đã được commit để worker chắc chắn đọc được
+            transaction.on_commit(lambda: generate_chat_answer.delay(str(job.id)))
+
+        status_url = request.build_absolute_uri(reverse('chat-job-detail', kwargs={'pk': job.id}))
+        return Response(
+            {
+                "job_id": job.id,
+                "status": job.status,
+                "conversation_id": conversation.id,
+                "user_message_id": user_message.id,
+                "status_url": status_url,
+            },
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': status_url},
+        )
+
+
+class ChatJobDetailView(generics.RetrieveAPIView):
+    """Trạng thái và kết quả của một câu hỏi async (client poll endpoint này)."""
+    serializer_class = ChatJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return (
+            ChatJob.objects.filter(user=self.request.user)
+            .select_related('assistant_message')
+            .prefetch_related('assistant_message__sources__document')
+        )
@@ -0,0 +1,97 @@
+import http.client
+import ipaddress
+import socket
+import ssl
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class WebhookRejected(Exception):
+    """URL webhook không được phép gọi (host ngoài danh sách, địa chỉ nội bộ...)."""
+
+
+def host_allowed(host):
+    """
+    Mặc định từ chối: chỉ host có trong CHAT_WEBHOOK_ALLOWED_HOSTS. Entry bắt đầu bằng '.'
+    cho phép cả domain đó và các subdomain (giống ALLOWED_HOSTS của Django).
+    """
+    host = (host or '').lower().rstrip('.')
+    for allowed in settings.CHAT_WEBHOOK_ALLOWED_HOSTS:
+        allowed = allowed.lower()
+        if host == allowed or (allowed.startswith('.') and (host.endswith(allowed) or host == allowed[1:])):
+            return True
+    return False
+
+
+def _is_public(address):
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def resolve(url):
+    """
+    Kiểm tra URL và phân giải host; trả về (parsed, port, address) với address là IP public
+    dùng để kết nối. Mọi địa chỉ của host phải public (không private, loopback, link-local,
+    reserved): host trỏ cả vào mạng nội bộ (minio, ollama, 169.254.169.254...) bị từ chối.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in DEFAULT_PORTS or not parsed.hostname:
+        raise WebhookRejected("Webhook URL must be http(s) with a host.")
+    if parsed.username or parsed.password:
+        raise WebhookRejected("Webhook URL must not contain credentials.")
+    if not host_allowed(parsed.hostname):
+        raise WebhookRejected(f"Webhook host {parsed.hostname} is not allowed.")
+    port = parsed.port or DEFAULT_PORTS[parsed.scheme]
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)}
+    except socket.gaierror as e:
+        raise WebhookRejected(f"Cannot resolve webhook host {parsed.hostname}: {e}")
+    if not addresses or not all(_is_public(address) for address in addresses):
+        raise WebhookRejected(f"Webhook host {parsed.hostname} resolves to a non-public address.")
+    return parsed, port, sorted(addresses)[0]
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    # Kết nối tới đúng IP đã kiểm tra, không phân giải lại (chống DNS rebinding)
+    def __init__(self, host, port, address, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, host, port, address, timeout):
+        super().__init__(host, port, timeout=timeout, context=ssl.create_default_context())
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        # SNI và kiểm tra chứng chỉ vẫn theo hostname gốc
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+def post(url, body, headers, timeout):
+    """
+    POST body tới webhook, trả về HTTP status. Không đi theo redirect (3xx được trả về như
+    kết quả) và không dùng proxy từ biến môi trường.
+    """
+    parsed, port, address = resolve(url)
+    connection_class = _PinnedHTTPSConnection if parsed.scheme == 'https' else _PinnedHTTPConnection
+    connection = connection_class(parsed.hostname, port, address, timeout)
+    path = parsed.path or '/'
+    if parsed.query:
+        path = f"{path}?{parsed.query}"
+    try:
+        connection.request('POST', path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read(65536)
+        return response.status
+    finally:
+        connection.close()
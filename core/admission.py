@@ -0,0 +1,101 @@
+import logging
+import math
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.metrics import record_admission_rejection
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceOverloaded(APIException):
+    """503 kèm Retry-After (DRF tự thêm header khi exception có thuộc tính wait)."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Hệ thống đang quá tải, vui lòng thử lại sau.'
+    default_code = 'service_overloaded'
+
+    def __init__(self, detail=None, wait=None):
+        super().__init__(detail)
+        self.wait = math.ceil(wait if wait is not None else settings.ADMISSION_RETRY_AFTER)
+
+
+def _slot_key(index):
+    return f"admission:llm-slot:{index}"
+
+
+def acquire_llm_slot():
+    """
+    Giữ một trong LLM_MAX_IN_FLIGHT slot gọi LLM dùng chung cho mọi process web/worker.
+    Mỗi slot là một key cache tạo bằng add() (nguyên tử) và tự hết hạn sau LLM_TIMEOUT,
+    nên process chết giữa chừng không làm mất slot vĩnh viễn. Hết slot thì báo quá tải ngay.
+    """
+    token = uuid.uuid4().hex
+    timeout = settings.LLM_TIMEOUT + 30
+    for index in range(settings.LLM_MAX_IN_FLIGHT):
+        try:
+            if cache.add(_slot_key(index), token, timeout=timeout):
+                return index, token
+        except Exception as e:
+            # Cache lỗi thì không chặn request
+            logger.warning(f"Admission cache unavailable, admitting LLM call: {e}")
+            return None
+    record_admission_rejection('llm_slots')
+    raise ServiceOverloaded('Mô hình AI đang bận trả lời các câu hỏi khác, vui lòng thử lại sau.')
+
+
+def release_llm_slot(slot):
+    if slot is None:
+        return
+    index, token = slot
+    try:
+        # Chỉ xoá nếu slot vẫn là của mình (có thể đã hết hạn và bị request khác giữ)
+        if cache.get(_slot_key(index)) == token:
+            cache.delete(_slot_key(index))
+    except Exception as e:
+        logger.warning(f"Could not release LLM slot {index}: {e}")
+
+
+@contextmanager
+def llm_slot():
+    slot = acquire_llm_slot()
+    try:
+        yield
+    finally:
+        release_llm_slot(slot)
+
+
+def llm_in_flight():
+    return sum(1 for index in range(settings.LLM_MAX_IN_FLIGHT) if cache.get(_slot_key(index)) is not None)
+
+
+def queue_depth(queue_name):
+    """Số message đang chờ trong queue Celery, cache vài giây để không hỏi broker mỗi request."""
+    key = f"admission:queue-depth:{queue_name}"
+    depth = cache.get(key)
+    if depth is not None:
+        return depth
+
+    from core.celery import app
+    try:
+        with app.connection_for_read() as connection:
+            depth = connection.default_channel.queue_declare(queue=queue_name, passive=True).message_count
+    except Exception as e:
+        logger.warning(f"Could not read depth of queue '{queue_name}': {e}")
+        depth = 0
+    cache.set(key, depth, timeout=settings.ADMISSION_QUEUE_CHECK_INTERVAL)
+    return depth
+
+
+def check_queue_capacity(queue_name, max_depth):
+    """Từ chối nhận thêm việc khi queue đã dài hơn max_depth."""
+    if max_depth and queue_depth(queue_name) >= max_depth:
+        record_admission_rejection(f'queue_{queue_name}')
+        raise ServiceOverloaded(
+            'Hàng đợi xử lý đang quá tải, vui lòng thử lại sau.',
+            wait=settings.ADMISSION_RETRY_AFTER * 3,
+        )
@@ -1,5 +1,7 @@
 import os
+import time
 from celery import Celery
+from celery.signals import beat_init, before_task_publish, task_prerun, worker_init, worker_process_shutdown
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
@@ -7,10 +9,44 @@ app = Celery("core")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
-app.conf.beat_schedule = {
-    'cleanup-daily-tasks': {
-        'task': 'documents.tasks.cleanup_old_failed_documents',
-        'schedule': 3600.0 * 24, 
-        'args': (30,),
-    },
-}
+
+# --- Metrics cho Celery worker ---
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    # Đánh dấu thời điểm đẩy task vào queue để đo queue wait ở worker
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+@task_prerun.connect
+def observe_queue_wait(task=None, **kwargs):
+    from core.metrics import record_queue_wait
+    enqueued_at = task.request.get('enqueued_at') if task else None
+    if enqueued_at:
+        record_queue_wait(task.name, time.time() - float(enqueued_at))
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    from core.metrics import start_worker_metrics_server
+    start_worker_metrics_server()
+
+
+@worker_init.connect
+def preload_worker(**kwargs):
+    # Load model/module trong process cha trước khi fork để các process con dùng chung bộ nhớ
+    from core.startup import preload
+    preload('worker')
+
+
+@beat_init.connect
+def preload_beat(**kwargs):
+    # Beat chỉ gửi task theo tên: mặc định không nạp gì thêm ngoài module task (không kéo theo stack ML)
+    from core.startup import preload
+    preload('beat')
+
+
+@worker_process_shutdown.connect
+def cleanup_process_metrics(pid=None, **kwargs):
+    from core.metrics import mark_process_dead
+    mark_process_dead(pid or os.getpid())
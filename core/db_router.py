@@ -0,0 +1,73 @@
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+
+# Chỉ các đoạn code được bọc trong read_replica() mới đọc từ replica (retrieval, danh sách tài liệu);
+# mọi truy vấn khác vẫn dùng primary nên không bị ảnh hưởng bởi độ trễ replication.
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _write_key(user_id):
+    return f"db:recent-write:{user_id}"
+
+
+def mark_recent_write(user_id):
+    """Ghi nhận user vừa ghi dữ liệu: các lần đọc kế tiếp của user dùng primary trong REPLICA_STICKY_SECONDS."""
+    if not replica_configured() or user_id is None:
+        return
+    try:
+        cache.set(_write_key(user_id), 1, timeout=settings.DATABASE_REPLICA_STICKY_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not record recent write for user {user_id}: {e}")
+
+
+def has_recent_write(user_id):
+    try:
+        return cache.get(_write_key(user_id)) is not None
+    except Exception:
+        # Không đọc được cache thì an toàn nhất là đọc từ primary
+        return True
+
+
+@contextmanager
+def read_replica(user=None):
+    """Định tuyến các truy vấn đọc trong khối này sang replica, trừ khi user vừa ghi (read-your-writes)."""
+    enabled = replica_configured() and not (user is not None and has_recent_write(user.pk))
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_alias():
+    """Alias database mà các truy vấn đọc hiện tại sẽ dùng."""
+    return REPLICA_ALIAS if _use_replica.get() else 'default'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica là bản sao của primary nên quan hệ giữa hai alias luôn hợp lệ
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
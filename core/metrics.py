@@ -0,0 +1,279 @@
+import os
+import time
+import logging
+import functools
+
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    prometheus_client = None
+
+_enabled = None
+
+
+def metrics_enabled():
+    """Metrics chỉ bật khi có prometheus_client và METRICS_ENABLED=True."""
+    global _enabled
+    if _enabled is None:
+        _enabled = prometheus_client is not None and getattr(settings, 'METRICS_ENABLED', False)
+    return _enabled
+
+
+if prometheus_client is not None:
+    STAGE_SECONDS = Histogram(
+        'pipeline_stage_seconds',
+        'Thời gian chạy của từng stage trong pipeline ingestion/chat.',
+        ['pipeline', 'stage'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+    )
+    DOCUMENTS_TOTAL = Counter(
+        'documents_processed_total',
+        'Số tài liệu đã xử lý, theo kết quả.',
+        ['status'],
+    )
+    CHUNKS_TOTAL = Counter(
+        'document_chunks_created_total',
+        'Số chunk đã được tạo và lưu vào DB.',
+    )
+    EMBED_BATCH_SECONDS = Histogram(
+        'embedding_batch_seconds',
+        'Thời gian encode một batch embedding.',
+        ['source'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+    EMBED_BATCH_SIZE = Histogram(
+        'embedding_batch_size',
+        'Số đoạn văn bản trong một batch embedding.',
+        ['source'],
+        buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+    )
+    LLM_SECONDS = Histogram(
+        'llm_generation_seconds',
+        'Thời gian gọi LLM sinh câu trả lời.',
+        ['model'],
+        buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 180),
+    )
+    LLM_TOKENS_TOTAL = Counter(
+        'llm_completion_tokens_total',
+        'Tổng số token LLM đã sinh ra.',
+        ['model'],
+    )
+    LLM_TTFT_SECONDS = Histogram(
+        'llm_time_to_first_token_seconds',
+        'Thời gian từ lúc gửi request tới token đầu tiên của LLM.',
+        ['model'],
+        buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+    )
+    LLM_MODEL_LOADS_TOTAL = Counter(
+        'llm_model_loads_total',
+        'Số lần server LLM phải nạp model vào bộ nhớ (request đầu tiên sau khi model bị unload).',
+        ['model', 'source'],
+    )
+    LLM_MODEL_LOAD_SECONDS = Histogram(
+        'llm_model_load_seconds',
+        'Thời gian nạp model do server LLM báo về (load_duration của Ollama).',
+        ['model'],
+        buckets=(0.5, 1, 2, 4, 8, 15, 30, 60, 120),
+    )
+    MAINTENANCE_DELETED_TOTAL = Counter(
+        'maintenance_deleted_total',
+        'Số đối tượng bị xoá bởi các task bảo trì, theo loại (document/file/orphan_file/checkpoint).',
+        ['kind'],
+    )
+    VECTOR_INDEX_RECALL = Gauge(
+        'vector_index_recall',
+        'Recall@k trung bình của ANN (HNSW) so với tìm chính xác, từ lần lấy mẫu gần nhất.',
+        ['index'],
+        multiprocess_mode='mostrecent',
+    )
+    EMBED_CACHE_LOOKUPS_TOTAL = Counter(
+        'embedding_cache_lookups_total',
+        'Số lần tra EmbeddingCache, theo kết quả hit/miss.',
+        ['result'],
+    )
+    EMBED_CACHE_HIT_RATIO = Histogram(
+        'embedding_cache_document_hit_ratio',
+        'Tỉ lệ cache hit embedding của mỗi tài liệu.',
+        buckets=(0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0),
+    )
+    QUEUE_WAIT_SECONDS = Histogram(
+        'celery_task_queue_wait_seconds',
+        'Thời gian task nằm trong hàng đợi trước khi worker nhận.',
+        ['task'],
+        buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600),
+    )
+    ADMISSION_REJECTIONS_TOTAL = Counter(
+        'admission_rejections_total',
+        'Số request bị từ chối (503) vì hệ thống quá tải, theo lý do.',
+        ['reason'],
+    )
+    OCR_PAGE_SECONDS = Histogram(
+        'ocr_page_seconds',
+        'Thời gian OCR một trang PDF không có text (không tính trang lấy từ cache).',
+        buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120),
+    )
+    OCR_PAGES_TOTAL = Counter(
+        'ocr_pages_total',
+        'Số trang PDF cần OCR, theo kết quả (ocr/cache_hit/failed).',
+        ['result'],
+    )
+
+
+def stage(pipeline, name):
+    """
+    Đo thời gian một stage. Dùng được như context manager hoặc decorator:
+
+        with stage('ingestion', 'extract'):
+            ...
+
+        @stage('chat', 'retrieval')
+        def retrieve(...):
+            ...
+    """
+    return _Span(pipeline, name)
+
+
+class _Span:
+    __slots__ = ('pipeline', 'name', 'start')
+
+    def __init__(self, pipeline, name):
+        self.pipeline = pipeline
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if metrics_enabled():
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            STAGE_SECONDS.labels(self.pipeline, self.name).observe(time.perf_counter() - self.start)
+            self.start = None
+        return False
+
+    def __call__(self, func):
+        pipeline, name = self.pipeline, self.name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics_enabled():
+                return func(*args, **kwargs)
+            with _Span(pipeline, name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def record_document(status):
+    if metrics_enabled():
+        DOCUMENTS_TOTAL.labels(status).inc()
+
+
+def record_chunks(count):
+    if metrics_enabled():
+        CHUNKS_TOTAL.inc(count)
+
+
+def record_embedding_batch(seconds, size, source='ingestion'):
+    if metrics_enabled():
+        EMBED_BATCH_SECONDS.labels(source).observe(seconds)
+        EMBED_BATCH_SIZE.labels(source).observe(size)
+
+
+def record_embedding_cache(hits, misses):
+    if metrics_enabled() and hits + misses:
+        EMBED_CACHE_LOOKUPS_TOTAL.labels('hit').inc(hits)
+        EMBED_CACHE_LOOKUPS_TOTAL.labels('miss').inc(misses)
+        EMBED_CACHE_HIT_RATIO.observe(hits / (hits + misses))
+
+
+def record_llm_call(model, seconds, completion_tokens=None):
+    if metrics_enabled():
+        LLM_SECONDS.labels(model).observe(seconds)
+        if completion_tokens:
+            LLM_TOKENS_TOTAL.labels(model).inc(completion_tokens)
+
+
+def record_llm_first_token(model, seconds):
+    if metrics_enabled():
+        LLM_TTFT_SECONDS.labels(model).observe(seconds)
+
+
+def record_llm_model_load(model, seconds, source):
+    """source: 'request' (request của user phải chờ nạp model) hoặc 'warmup'."""
+    if metrics_enabled():
+        LLM_MODEL_LOADS_TOTAL.labels(model, source).inc()
+        LLM_MODEL_LOAD_SECONDS.labels(model).observe(seconds)
+
+
+def record_queue_wait(task_name, seconds):
+    if metrics_enabled() and seconds >= 0:
+        QUEUE_WAIT_SECONDS.labels(task_name).observe(seconds)
+
+
+def record_admission_rejection(reason):
+    if metrics_enabled():
+        ADMISSION_REJECTIONS_TOTAL.labels(reason).inc()
+
+
+def record_ocr_page(result, seconds=None):
+    if metrics_enabled():
+        OCR_PAGES_TOTAL.labels(result).inc()
+        if seconds is not None:
+            OCR_PAGE_SECONDS.observe(seconds)
+
+
+def record_maintenance_deleted(kind, count):
+    if metrics_enabled() and count:
+        MAINTENANCE_DELETED_TOTAL.labels(kind).inc(count)
+
+
+def record_vector_recall(index, recall):
+    if metrics_enabled():
+        VECTOR_INDEX_RECALL.labels(index).set(recall)
+
+
+def _registry():
+    """
+    Khi chạy nhiều process (gunicorn workers, Celery prefork) thì phải gom
+    metrics qua PROMETHEUS_MULTIPROC_DIR, còn lại dùng registry mặc định.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def metrics_view(request):
+    """Endpoint /metrics cho Prometheus scrape."""
+    if not metrics_enabled():
+        return HttpResponse("Metrics are disabled.", status=404, content_type='text/plain')
+    data = prometheus_client.generate_latest(_registry())
+    return HttpResponse(data, content_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def start_worker_metrics_server():
+    """Mở HTTP server riêng để Prometheus scrape metrics từ Celery worker."""
+    if not metrics_enabled():
+        return
+    port = getattr(settings, 'METRICS_WORKER_PORT', 9808)
+    try:
+        prometheus_client.start_http_server(port, registry=_registry())
+        logger.info(f"Worker metrics server listening on :{port}")
+    except OSError as e:
+        logger.error(f"Could not start worker metrics server on :{port}: {e}")
+
+
+def mark_process_dead(pid):
+    """Dọn file metrics của process con đã thoát (multiprocess mode)."""
+    if prometheus_client is not None and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
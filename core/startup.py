@@ -0,0 +1,57 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def _urls():
+    # Import toàn bộ URLconf cùng view/serializer/service mà nó kéo theo
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+
+def _api_docs():
+    from core.urls import schema_view
+    schema_view()
+
+
+def _tasks():
+    from core.celery import app
+    app.loader.import_default_modules()
+
+
+def _embeddings():
+    from documents.embeddings import get_embedding_backend
+    get_embedding_backend()
+
+
+def _pdf():
+    import fitz  # noqa: F401
+
+
+PRELOADERS = {
+    'urls': _urls,
+    'api_docs': _api_docs,
+    'tasks': _tasks,
+    'embeddings': _embeddings,
+    'pdf': _pdf,
+}
+
+
+def preload(role):
+    """
+    Nạp trước các module process cần theo vai trò (settings.STARTUP_PRELOAD), trong process cha
+    trước khi fork (gunicorn --preload, Celery prefork) để các process con dùng chung bộ nhớ.
+    Kết nối DB mở trong lúc preload được đóng lại để không bị chia sẻ qua fork.
+    """
+    for name in settings.STARTUP_PRELOAD.get(role, ()):
+        if name not in PRELOADERS:
+            logger.error(f"Unknown preload '{name}' for {role}; choose from {', '.join(PRELOADERS)}.")
+            continue
+        start = time.perf_counter()
+        PRELOADERS[name]()
+        logger.info(f"Preloaded {name} for {role} in {time.perf_counter() - start:.2f}s")
+    connections.close_all()
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.redis import RedisCacheClient
+from rest_framework.throttling import SimpleRateThrottle
+
+# Đọc - nạp lại - trừ token trong một lệnh EVAL nên các process web không ghi đè lẫn nhau.
+# Dùng giờ của Redis để các máy lệch đồng hồ vẫn thấy cùng một bucket.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_per_second = tonumber(ARGV[2])
+local timeout = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * refill_per_second)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], timeout)
+return {allowed, tostring(tokens)}
+"""
+
+# Cache không phải Redis (LocMemCache khi chạy dev) chỉ dùng trong một process
+_local_lock = threading.Lock()
+
+
+def refill(tokens, updated_at, now, capacity, refill_per_second):
+    """Số token sau khi nạp lại từ updated_at tới now, không vượt quá capacity."""
+    return min(capacity, tokens + max(0.0, now - updated_at) * refill_per_second)
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token bucket theo user và scope: bucket chứa tối đa THROTTLE_BURST[scope] token,
+    được nạp lại đều theo rate trong DEFAULT_THROTTLE_RATES (vd. '20/min').
+    Cho phép burst ngắn nhưng giữ đúng tốc độ trung bình; trạng thái lưu trong cache dùng chung.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        refill_per_second = self.num_requests / self.duration
+        capacity = max(1, getattr(settings, 'THROTTLE_BURST', {}).get(self.scope, self.num_requests))
+        # Bucket đầy lại sau khoảng thời gian này nên không cần giữ key lâu hơn
+        timeout = int(capacity / refill_per_second) + 1
+
+        # self.cache là proxy tới cache 'default' nên kiểm tra client bên dưới
+        if isinstance(getattr(self.cache, '_cache', None), RedisCacheClient):
+            allowed, tokens = self._take_redis(capacity, refill_per_second, timeout)
+        else:
+            allowed, tokens = self._take_local(capacity, refill_per_second, timeout)
+        if allowed:
+            return True
+        self._wait = (1 - tokens) / refill_per_second
+        return False
+
+    def _take_redis(self, capacity, refill_per_second, timeout):
+        key = self.cache.make_and_validate_key(self.key)
+        client = self.cache._cache.get_client(key, write=True)
+        allowed, tokens = client.eval(TOKEN_BUCKET_SCRIPT, 1, key, capacity, refill_per_second, timeout)
+        return bool(allowed), float(tokens)
+
+    def _take_local(self, capacity, refill_per_second, timeout):
+        with _local_lock:
+            now = time.time()
+            tokens, updated_at = self.cache.get(self.key, (capacity, now))
+            tokens = refill(tokens, updated_at, now, capacity, refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.cache.set(self.key, (tokens, now), timeout)
+        return allowed, tokens
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class ChatThrottle(TokenBucketThrottle):
+    scope = 'chat'
+
+
+class UploadThrottle(TokenBucketThrottle):
+    scope = 'upload'
@@ -14,32 +14,51 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import functools
+
 from django.contrib import admin
 from django.urls import path, include
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
-from rest_framework_simplejwt.views import TokenRefreshView
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Python AI Document Processing API",
-        default_version="v1",
-        description="API docs for the Python AI Document Processing project",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="support@myapi.com"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from core.metrics import metrics_view
+
+
+@functools.cache
+def schema_view():
+    # drf_yasg (và cả cây inspector của nó) chỉ được import khi có request tới trang docs đầu tiên
+    from drf_yasg import openapi
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    return get_schema_view(
+        openapi.Info(
+            title="Python AI Document Processing API",
+            default_version="v1",
+            description="API docs for the Python AI Document Processing project",
+            terms_of_service="https://www.google.com/policies/terms/",
+            contact=openapi.Contact(email="support@myapi.com"),
+            license=openapi.License(name="MIT License"),
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def docs_view(renderer):
+    @functools.cache
+    def view():
+        return schema_view().with_ui(renderer, cache_timeout=0)
+
+    def lazy_view(request, *args, **kwargs):
+        return view()(request, *args, **kwargs)
+    return lazy_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/users/", include("users.urls")),
     path("api/documents/", include("documents.urls")),
     path("api/chat/", include("chatbot.urls")),
+    path("metrics", metrics_view, name="metrics"),
     
-    path("swagger/", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
-    path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
+    path("swagger/", docs_view("swagger"), name="schema-swagger-ui"),
+    path("redoc/", docs_view("redoc"), name="schema-redoc"),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Với gunicorn --preload, phần này chạy một lần trong master trước khi fork worker
+from core.startup import preload  # noqa: E402
+
+preload('web')
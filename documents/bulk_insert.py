@@ -0,0 +1,166 @@
+import io
+import logging
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.db import connection
+from django.utils import timezone
+
+from .models import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+# Header của định dạng COPY BINARY: chữ ký, flags, độ dài phần mở rộng
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00'
+COPY_TRAILER = b'\xff\xff'
+POSTGRES_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+# Cột cố định độ dài đứng trước, content (độ dài thay đổi) đứng cuối để phần đầu
+# mỗi dòng có thể dựng cho cả tài liệu bằng một mảng NumPy có cấu trúc.
+COPY_COLUMNS = ('id', 'document_id', 'user_id', 'embedding', 'chunk_index', 'char_start', 'char_end', 'created_at', 'content')
+
+ROWS_PER_WRITE = 2000
+# Cột số nguyên có thể NULL (chunk tạo trước migration 0006 không có vị trí)
+NULLABLE_INT_COLUMNS = ('chunk_index', 'char_start', 'char_end')
+NULL_FIELD = struct.pack('>i', -1)
+
+
+def _row_prefix_dtype(dimensions, user_id_format):
+    return np.dtype([
+        ('fields', '>i2'),
+        ('id_len', '>i4'), ('id', 'V16'),
+        ('document_len', '>i4'), ('document', 'V16'),
+        ('user_len', '>i4'), ('user', user_id_format),
+        # pgvector binary: int16 số chiều, int16 dự phòng, float4 big-endian
+        ('embedding_len', '>i4'), ('dimensions', '>i2'), ('unused', '>i2'), ('embedding', '>f4', (dimensions,)),
+        ('chunk_index_len', '>i4'), ('chunk_index', '>i4'),
+        ('char_start_len', '>i4'), ('char_start', '>i4'),
+        ('char_end_len', '>i4'), ('char_end', '>i4'),
+        # timestamptz: số micro giây tính từ 2000-01-01 UTC
+        ('created_at_len', '>i4'), ('created_at', '>i8'),
+        ('content_len', '>i4'),
+    ])
+
+
+def _user_id_format():
+    target = DocumentChunk._meta.get_field('user').target_field
+    return '>i8' if target.get_internal_type() in ('BigAutoField', 'BigIntegerField') else '>i4'
+
+
+def _int_field(value):
+    # Trường NULL trong COPY BINARY chỉ có độ dài -1, không có dữ liệu
+    return NULL_FIELD if value is None else struct.pack('>ii', 4, value)
+
+
+def chunk_positions(chunks):
+    """(chunk_index, char_start, char_end) của từng chunk; chunk_index mặc định theo thứ tự."""
+    return [
+        (chunk.get('chunk_index', i), chunk.get('char_start'), chunk.get('char_end'))
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def encode_copy_rows(document, chunks, embeddings, created_at=None, ids=None):
+    """
+    Mã hoá các dòng chunk theo định dạng COPY BINARY, trả về list các khối bytes
+    (mỗi khối ROWS_PER_WRITE dòng). Toàn bộ phần cố định (UUID, vector, vị trí...) được
+    dựng một lần trong mảng NumPy từ buffer embedding, không tạo model hay literal cho từng dòng.
+    Dòng có vị trí NULL (chunk cũ khôi phục từ snapshot) được ghép lại phần vị trí bằng struct.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    count, dimensions = embeddings.shape
+    contents = [chunk['content'].encode('utf-8') for chunk in chunks]
+    positions = chunk_positions(chunks)
+    created_at = created_at or timezone.now()
+
+    prefix = np.zeros(count, dtype=_row_prefix_dtype(dimensions, _user_id_format()))
+    prefix['fields'] = len(COPY_COLUMNS)
+    prefix['id_len'] = 16
+    ids = ids or [uuid.uuid4() for _ in range(count)]
+    prefix['id'] = np.frombuffer(b''.join(chunk_id.bytes for chunk_id in ids), dtype='V16')
+    prefix['document_len'] = 16
+    prefix['document'] = np.frombuffer(document.id.bytes, dtype='V16')[0]
+    prefix['user_len'] = prefix.dtype['user'].itemsize
+    prefix['user'] = document.user_id
+    prefix['embedding_len'] = 4 + 4 * dimensions
+    prefix['dimensions'] = dimensions
+    prefix['embedding'] = embeddings
+    for column_index, name in enumerate(NULLABLE_INT_COLUMNS):
+        prefix[f'{name}_len'] = 4
+        prefix[name] = [0 if position[column_index] is None else position[column_index] for position in positions]
+    prefix['created_at_len'] = 8
+    prefix['created_at'] = (created_at - POSTGRES_EPOCH) // timedelta(microseconds=1)
+    prefix['content_len'] = [len(content) for content in contents]
+
+    row_prefixes = prefix.tobytes()
+    size = prefix.dtype.itemsize
+    positions_start = prefix.dtype.fields['chunk_index_len'][1]
+    positions_end = prefix.dtype.fields['created_at_len'][1]
+    blocks = []
+    for start in range(0, count, ROWS_PER_WRITE):
+        parts = []
+        for i in range(start, min(start + ROWS_PER_WRITE, count)):
+            row = row_prefixes[i * size:(i + 1) * size]
+            if None in positions[i]:
+                row = row[:positions_start] + b''.join(map(_int_field, positions[i])) + row[positions_end:]
+            parts.append(row)
+            parts.append(contents[i])
+        blocks.append(b''.join(parts))
+    return blocks
+
+
+def _copy_sql():
+    columns = ', '.join(COPY_COLUMNS)
+    return f"COPY {DocumentChunk._meta.db_table} ({columns}) FROM STDIN WITH (FORMAT binary)"
+
+
+def copy_chunks(document, chunks, embeddings, ids=None, created_at=None):
+    """Ghi chunk bằng COPY BINARY (psycopg2 copy_expert hoặc psycopg 3 cursor.copy)."""
+    blocks = encode_copy_rows(document, chunks, embeddings, created_at=created_at, ids=ids)
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            stream = io.BytesIO()
+            stream.write(COPY_HEADER)
+            for block in blocks:
+                stream.write(block)
+            stream.write(COPY_TRAILER)
+            stream.seek(0)
+            raw.copy_expert(_copy_sql(), stream)
+        else:
+            with raw.copy(_copy_sql()) as copy:
+                copy.write(COPY_HEADER)
+                for block in blocks:
+                    copy.write(block)
+                copy.write(COPY_TRAILER)
+    return len(chunks)
+
+
+def bulk_insert_chunks(document, chunks, embeddings, batch_size=500, ids=None, created_at=None):
+    """
+    Ghi chunk của tài liệu: COPY trên PostgreSQL, bulk_create trên các backend khác.
+    Trả về list id chunk theo thứ tự chunk_index (để ghi vector của các version khác).
+    ids/created_at dùng khi khôi phục chunk từ snapshot (import_corpus).
+    """
+    if not chunks:
+        return []
+    ids = ids or [uuid.uuid4() for _ in chunks]
+    if connection.vendor == 'postgresql':
+        copy_chunks(document, chunks, embeddings, ids=ids, created_at=created_at)
+        return ids
+    DocumentChunk.objects.bulk_create([
+        DocumentChunk(
+            id=ids[i],
+            document=document,
+            user_id=document.user_id,
+            content=chunk['content'],
+            embedding=embeddings[i],
+            chunk_index=chunk_index,
+            char_start=char_start,
+            char_end=char_end,
+        )
+        for i, (chunk, (chunk_index, char_start, char_end)) in enumerate(zip(chunks, chunk_positions(chunks)))
+    ], batch_size=batch_size)
+    return ids
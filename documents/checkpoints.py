@@ -0,0 +1,114 @@
+import io
+import json
+import logging
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+# Kết quả trung gian của pipeline được lưu vào object storage (MinIO) để retry
+# có thể tiếp tục từ stage cuối cùng đã xong thay vì làm lại từ đầu.
+CHECKPOINT_PREFIX = 'checkpoints'
+
+
+def _path(document_id, name):
+    return f"{CHECKPOINT_PREFIX}/{document_id}/{name}"
+
+
+def _write(path, data):
+    # Ghi đè checkpoint cũ (storage mặc định không cho phép overwrite)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(data))
+
+
+def _read(path):
+    with default_storage.open(path, 'rb') as f:
+        return f.read()
+
+
+def has_text(document_id):
+    return default_storage.exists(_path(document_id, 'text.txt'))
+
+
+def save_text(document_id, text):
+    _write(_path(document_id, 'text.txt'), text.encode('utf-8'))
+
+
+def load_text(document_id):
+    return _read(_path(document_id, 'text.txt')).decode('utf-8')
+
+
+def has_chunks(document_id):
+    return default_storage.exists(_path(document_id, 'chunks/manifest.json'))
+
+
+def save_chunks(document_id, chunks, batch_size):
+    """Lưu chunks theo từng batch embedding để mỗi task embed chỉ phải đọc phần của nó."""
+    batches = 0
+    for batch_index, start in enumerate(range(0, len(chunks), batch_size)):
+        batch = chunks[start:start + batch_size]
+        _write(_path(document_id, f'chunks/{batch_index:05d}.json'), json.dumps(batch, ensure_ascii=False).encode('utf-8'))
+        batches += 1
+    # Manifest ghi sau cùng: có manifest nghĩa là stage chunk đã xong trọn vẹn
+    manifest = {'count': len(chunks), 'batches': batches, 'batch_size': batch_size}
+    _write(_path(document_id, 'chunks/manifest.json'), json.dumps(manifest).encode('utf-8'))
+    return manifest
+
+
+def load_chunk_manifest(document_id):
+    return json.loads(_read(_path(document_id, 'chunks/manifest.json')))
+
+
+def load_chunk_batch(document_id, batch_index):
+    return json.loads(_read(_path(document_id, f'chunks/{batch_index:05d}.json')))
+
+
+def load_chunks(document_id):
+    manifest = load_chunk_manifest(document_id)
+    chunks = []
+    for batch_index in range(manifest['batches']):
+        chunks.extend(load_chunk_batch(document_id, batch_index))
+    return chunks
+
+
+def _embedding_path(document_id, batch_index, version=None):
+    # Vector của version phụ (dual-write khi đang migrate model) nằm trong thư mục riêng
+    folder = f'embeddings/v{version}' if version else 'embeddings'
+    return _path(document_id, f'{folder}/{batch_index:05d}.npy')
+
+
+def has_embedding_batch(document_id, batch_index, version=None):
+    return default_storage.exists(_embedding_path(document_id, batch_index, version))
+
+
+def save_embedding_batch(document_id, batch_index, embeddings, version=None):
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(embeddings, dtype=np.float32), allow_pickle=False)
+    _write(_embedding_path(document_id, batch_index, version), buffer.getvalue())
+
+
+def load_embedding_batch(document_id, batch_index, version=None):
+    return np.load(io.BytesIO(_read(_embedding_path(document_id, batch_index, version))), allow_pickle=False)
+
+
+def clear(document_id):
+    """Xoá toàn bộ checkpoint của tài liệu (sau khi xử lý xong hoặc khi xoá tài liệu)."""
+    root = f"{CHECKPOINT_PREFIX}/{document_id}"
+    try:
+        _delete_tree(root)
+    except Exception as e:
+        logger.warning(f"Could not clear checkpoints for document {document_id}: {e}")
+
+
+def _delete_tree(root):
+    try:
+        directories, files = default_storage.listdir(root)
+    except FileNotFoundError:
+        return
+    for name in files:
+        default_storage.delete(f"{root}/{name}")
+    for name in directories:
+        _delete_tree(f"{root}/{name}")
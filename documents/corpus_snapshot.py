@@ -0,0 +1,205 @@
+"""
+Snapshot chunk + embedding của corpus để dựng lại môi trường staging/DR mà không phải
+xử lý lại file. Mỗi user một thư mục:
+
+    manifest.json
+    user=<id>/documents.jsonl   metadata tài liệu, dòng i <-> centroids.npy[i]
+    user=<id>/centroids.npy     float32 (documents, dimensions), NaN = chưa có centroid
+    user=<id>/chunks.jsonl      metadata + nội dung chunk, dòng i <-> embeddings.npy[i]
+    user=<id>/embeddings.npy    float32 (chunks, dimensions), đọc lại bằng mmap
+
+dimensions là số chiều của không gian vector inline, ghi trong manifest.json.
+
+Chunk được ghi theo đúng thứ tự tài liệu trong documents.jsonl (và chunk_index trong
+tài liệu) để import đọc tuần tự hai file cùng lúc, bộ nhớ chỉ phụ thuộc kích thước batch.
+"""
+import itertools
+import json
+import logging
+import uuid
+from pathlib import Path
+
+import numpy as np
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .bulk_insert import bulk_insert_chunks
+from .models import Document, DocumentChunk, EmbeddingVersion
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+DOCUMENT_FIELDS = ('id', 'file', 'file_name', 'file_size', 'mime_type', 'status', 'processing_stage', 'tags',
+                   'created_at', 'updated_at')
+CHUNK_FIELDS = ('id', 'document_id', 'chunk_index', 'char_start', 'char_end', 'created_at', 'content')
+
+
+def inline_dimensions():
+    """Số chiều của vector inline (cột DocumentChunk.embedding và Document.centroid)."""
+    dimensions = EmbeddingVersion.objects.filter(inline=True).values_list('dimensions', flat=True).first()
+    return dimensions or DocumentChunk._meta.get_field('embedding').dimensions
+
+
+def user_directory(root, user_id):
+    return Path(root) / f'user={user_id}'
+
+
+def exported_documents(user, since=None):
+    # Chỉ tài liệu đã xử lý xong; tài liệu được xử lý lại có updated_at mới nên vào bản incremental
+    documents = Document.objects.filter(user=user, status='completed')
+    if since is not None:
+        documents = documents.filter(updated_at__gte=since)
+    return documents
+
+
+def _document_batches(documents, batch_size):
+    # Keyset pagination theo id, không cần server-side cursor (pgbouncer transaction mode)
+    last_id = None
+    while True:
+        queryset = documents.order_by('id')
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+        batch = list(queryset.only(*DOCUMENT_FIELDS, 'centroid')[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1].id
+        yield batch
+
+
+def _jsonl(record):
+    return json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_user(user, root, dimensions, since=None, batch_size=100):
+    """Ghi snapshot tài liệu của một user; trả về entry cho manifest (None nếu không có gì)."""
+    documents = exported_documents(user, since)
+    chunks = DocumentChunk.objects.filter(user=user, document__in=documents, embedding__isnull=False)
+    document_count = documents.count()
+    if not document_count:
+        return None
+    chunk_count = chunks.count()
+
+    directory = user_directory(root, user.pk)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Ghi thẳng vào file .npy qua memmap: kích thước biết trước nhờ đếm trong cùng snapshot
+    centroids = np.lib.format.open_memmap(
+        directory / 'centroids.npy', mode='w+', dtype=np.float32, shape=(document_count, dimensions))
+    embeddings = np.lib.format.open_memmap(
+        directory / 'embeddings.npy', mode='w+', dtype=np.float32, shape=(chunk_count, dimensions))
+
+    document_row = chunk_row = 0
+    with open(directory / 'documents.jsonl', 'w', encoding='utf-8') as document_file, \
+            open(directory / 'chunks.jsonl', 'w', encoding='utf-8') as chunk_file:
+        for batch in _document_batches(documents, batch_size):
+            for document in batch:
+                record = {name: getattr(document, name) for name in DOCUMENT_FIELDS}
+                record['file'] = document.file.name
+                document_file.write(_jsonl(record))
+                centroids[document_row] = document.centroid if document.centroid is not None else np.nan
+                document_row += 1
+
+            rows = (
+                chunks.filter(document_id__in=[document.id for document in batch])
+                .order_by('document_id', 'chunk_index')
+                .values_list(*CHUNK_FIELDS, 'embedding')
+            )
+            for *values, embedding in rows:
+                chunk_file.write(_jsonl(dict(zip(CHUNK_FIELDS, values))))
+                embeddings[chunk_row] = embedding
+                chunk_row += 1
+            embeddings.flush()
+    centroids.flush()
+
+    if (document_row, chunk_row) != (document_count, chunk_count):
+        raise RuntimeError(f"Snapshot of user {user.pk} changed during export; run it inside a snapshot transaction.")
+    return {
+        'username': user.get_username(),
+        'email': getattr(user, 'email', ''),
+        'path': directory.name,
+        'documents': document_count,
+        'chunks': chunk_count,
+    }
+
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _restore_documents(user, records, centroids):
+    documents = []
+    for record, centroid in zip(records, centroids):
+        document = Document(user=user, **{name: record[name] for name in DOCUMENT_FIELDS})
+        document.id = uuid.UUID(record['id'])
+        document.centroid = None if np.isnan(centroid[0]) else np.array(centroid)
+        documents.append(document)
+    timestamps = [(document.created_at, document.updated_at) for document in documents]
+
+    update_fields = [name for name in DOCUMENT_FIELDS if name not in ('id', 'created_at')] + ['user', 'centroid']
+    Document.objects.bulk_create(documents, update_conflicts=True, unique_fields=['id'], update_fields=update_fields)
+    # bulk_create ghi đè created_at/updated_at (auto_now); bulk_update không chạy pre_save nên giữ được giá trị gốc
+    for document, (created_at, updated_at) in zip(documents, timestamps):
+        document.created_at = parse_datetime(created_at)
+        document.updated_at = parse_datetime(updated_at)
+    Document.objects.bulk_update(documents, ['created_at', 'updated_at'])
+    return documents
+
+
+def import_user(user, directory, batch_size=100):
+    """
+    Nạp snapshot của một user: upsert tài liệu, thay toàn bộ chunk của các tài liệu đó
+    bằng COPY. Mỗi batch tài liệu là một transaction nên chạy lại sau lỗi là an toàn.
+    """
+    directory = Path(directory)
+    centroids = np.load(directory / 'centroids.npy', mmap_mode='r')
+    embeddings = np.load(directory / 'embeddings.npy', mmap_mode='r')
+    dimensions = inline_dimensions()
+    for name, array in (('centroids', centroids), ('embeddings', embeddings)):
+        if array.ndim != 2 or (len(array) and array.shape[1] != dimensions):
+            raise ValueError(f"{directory / name}.npy has shape {array.shape}, expected (*, {dimensions}).")
+    document_records = _read_jsonl(directory / 'documents.jsonl')
+    chunk_records = _read_jsonl(directory / 'chunks.jsonl')
+    pending_chunk = next(chunk_records, None)
+
+    document_row = chunk_row = 0
+    while True:
+        records = list(itertools.islice(document_records, batch_size))
+        if not records:
+            break
+        with transaction.atomic():
+            documents = _restore_documents(user, records, centroids[document_row:document_row + len(records)])
+            document_row += len(records)
+            DocumentChunk.objects.filter(user=user, document__in=documents).delete()
+
+            for document in documents:
+                chunks = []
+                while pending_chunk is not None and pending_chunk['document_id'] == str(document.id):
+                    chunks.append(pending_chunk)
+                    pending_chunk = next(chunk_records, None)
+                if not chunks:
+                    continue
+                bulk_insert_chunks(
+                    document,
+                    chunks,
+                    embeddings[chunk_row:chunk_row + len(chunks)],
+                    ids=[uuid.UUID(chunk['id']) for chunk in chunks],
+                    created_at=parse_datetime(chunks[0]['created_at']),
+                )
+                chunk_row += len(chunks)
+        logger.info(f"Imported {document_row} documents / {chunk_row} chunks for user {user.pk}.")
+    return document_row, chunk_row
+
+
+def write_manifest(root, manifest):
+    with open(Path(root) / 'manifest.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2)
+
+
+def read_manifest(root):
+    with open(Path(root) / 'manifest.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format')}")
+    return manifest
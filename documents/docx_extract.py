@@ -0,0 +1,170 @@
+import io
+import re
+import zipfile
+from dataclasses import dataclass
+from xml.etree import ElementTree
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+HEADING_NAME_RE = re.compile(r'^heading\s*(\d)$', re.IGNORECASE)
+HEADER_PART_RE = re.compile(r'^word/(header|footer)\d*\.xml$')
+
+# Ký tự đặc biệt trong run được đổi sang text tương ứng
+RUN_CHARACTERS = {f'{W}tab': '\t', f'{W}br': '\n', f'{W}cr': '\n', f'{W}noBreakHyphen': '-'}
+
+
+@dataclass
+class DocxBlock:
+    """Một khối nội dung theo thứ tự trong tài liệu: heading, paragraph, list_item, table_row, header, footer."""
+    kind: str
+    text: str
+    level: int = 0
+
+    def render(self):
+        # Nhãn cấu trúc dạng markdown nhẹ để chunk (và LLM) giữ được ngữ cảnh heading/bảng
+        if self.kind == 'heading':
+            return f"{'#' * max(self.level, 1)} {self.text}"
+        if self.kind == 'list_item':
+            return f"- {self.text}"
+        if self.kind == 'table_row':
+            return f"| {self.text} |"
+        if self.kind in ('header', 'footer'):
+            return f"[{self.kind.capitalize()}] {self.text}"
+        return self.text
+
+
+def paragraph_styles(archive):
+    """
+    styleId -> (kind, level) cho các style heading (outlineLvl, tên 'heading N' / 'Title')
+    và style list (có numPr), đọc từ word/styles.xml.
+    """
+    try:
+        root = ElementTree.fromstring(archive.read('word/styles.xml'))
+    except KeyError:
+        return {}
+    styles = {}
+    for style in root.iter(f'{W}style'):
+        style_id = style.get(f'{W}styleId')
+        name = style.find(f'{W}name')
+        name = name.get(f'{W}val', '') if name is not None else ''
+        level = _outline_level(style.find(f'{W}pPr'))
+        match = HEADING_NAME_RE.match(name)
+        if level:
+            styles[style_id] = ('heading', level)
+        elif match:
+            styles[style_id] = ('heading', int(match.group(1)))
+        elif name.lower() == 'title':
+            styles[style_id] = ('heading', 1)
+        elif style.find(f'{W}pPr/{W}numPr') is not None:
+            styles[style_id] = ('list_item', 0)
+    return styles
+
+
+def _outline_level(properties):
+    # outlineLvl 0-8 là cấp heading 1-9; 9 nghĩa là văn bản thường
+    outline = properties.find(f'{W}outlineLvl') if properties is not None else None
+    value = outline.get(f'{W}val', '') if outline is not None else ''
+    return int(value) + 1 if value.isdigit() and int(value) < 9 else 0
+
+
+def _paragraph_text(paragraph):
+    parts = []
+    for element in paragraph.iter():
+        if element.tag == f'{W}t':
+            parts.append(element.text or '')
+        elif element.tag in RUN_CHARACTERS:
+            parts.append(RUN_CHARACTERS[element.tag])
+    return ''.join(parts).strip()
+
+
+def _paragraph_kind(paragraph, styles):
+    properties = paragraph.find(f'{W}pPr')
+    if properties is None:
+        return 'paragraph', 0
+    level = _outline_level(properties)
+    if level:
+        return 'heading', level
+    style = properties.find(f'{W}pStyle')
+    if style is not None and style.get(f'{W}val') in styles:
+        return styles[style.get(f'{W}val')]
+    if properties.find(f'{W}numPr') is not None:
+        return 'list_item', 0
+    return 'paragraph', 0
+
+
+def iter_part_blocks(stream, styles, kind=None):
+    """
+    Đọc một part XML (document/header/footer) bằng iterparse, trả về DocxBlock theo thứ tự.
+    Mỗi paragraph/bảng bị clear ngay sau khi xử lý nên bộ nhớ không tăng theo kích thước tài liệu.
+    Ô bảng được nối bằng ' | ' thành một dòng; bảng lồng nhau được gộp vào ô chứa nó.
+    """
+    body = None
+    cells = []   # stack theo độ sâu bảng: các ô của dòng đang đọc
+    cell = []    # stack: các paragraph của ô đang đọc
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            if body is None and tag in (f'{W}body', f'{W}hdr', f'{W}ftr'):
+                body = element
+            elif tag == f'{W}tr':
+                cells.append([])
+            elif tag == f'{W}tc':
+                cell.append([])
+            continue
+
+        if tag == f'{W}p':
+            text = _paragraph_text(element)
+            paragraph_kind, level = _paragraph_kind(element, styles) if kind is None else (kind, 0)
+            element.clear()
+            if cell:
+                if text:
+                    cell[-1].append(text)
+            elif text:
+                yield DocxBlock(paragraph_kind, text, level)
+        elif tag == f'{W}tc':
+            cells[-1].append(' '.join(cell.pop()))
+        elif tag == f'{W}tr':
+            text = ' | '.join(cells.pop())
+            element.clear()
+            if text.strip(' |') and cell:
+                # Dòng của bảng lồng: thuộc về ô của bảng bên ngoài
+                cell[-1].append(text)
+            elif text.strip(' |'):
+                yield DocxBlock(kind or 'table_row', text)
+        else:
+            continue
+
+        # Phần tử cấp cao nhất đã xử lý xong: bỏ khỏi cây để giải phóng bộ nhớ
+        if body is not None and not cells:
+            body.clear()
+
+
+def iter_docx_blocks(file_bytes):
+    """Các khối nội dung của file DOCX: header, thân tài liệu, footer."""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(file_bytes))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Invalid DOCX file: {e}")
+    with archive:
+        names = archive.namelist()
+        if 'word/document.xml' not in names:
+            raise ValueError("Invalid DOCX file: word/document.xml is missing.")
+        styles = paragraph_styles(archive)
+        parts = sorted((HEADER_PART_RE.match(name).group(1), name) for name in names if HEADER_PART_RE.match(name))
+
+        yield from _iter_margin_blocks(archive, parts, 'header')
+        with archive.open('word/document.xml') as stream:
+            yield from iter_part_blocks(stream, styles)
+        yield from _iter_margin_blocks(archive, parts, 'footer')
+
+
+def _iter_margin_blocks(archive, parts, kind):
+    # Header/footer trang đầu, trang chẵn, mặc định thường trùng nội dung: chỉ lấy một lần
+    seen = set()
+    for part_kind, name in parts:
+        if part_kind != kind:
+            continue
+        with archive.open(name) as stream:
+            for block in iter_part_blocks(stream, {}, kind=kind):
+                if block.text not in seen:
+                    seen.add(block.text)
+                    yield block
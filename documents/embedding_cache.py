@@ -0,0 +1,101 @@
+import hashlib
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Chuẩn hoá khoảng trắng để các chunk chỉ khác nhau về định dạng vẫn trùng key."""
+    return " ".join(text.split())
+
+
+def text_hash(text):
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class CacheStats:
+    """Thống kê hit/miss của cache trong một lần xử lý tài liệu."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def total(self):
+        return self.hits + self.misses
+
+    @property
+    def hit_ratio(self):
+        return self.hits / self.total if self.total else 0.0
+
+
+def cache_enabled():
+    return getattr(settings, 'EMBEDDING_CACHE_ENABLED', True)
+
+
+def encode_with_cache(texts, encode_fn, model_name, stats=None):
+    """
+    Encode một batch `texts`: tra cache một lần cho cả batch, chỉ chạy
+    `encode_fn` trên các đoạn chưa có, rồi ghi kết quả mới vào cache.
+    """
+    if stats is None:
+        stats = CacheStats()
+    if not texts:
+        return encode_fn(texts), stats
+
+    hashes = [text_hash(t) for t in texts]
+    cached = dict(
+        EmbeddingCache.objects.filter(model_name=model_name, text_hash__in=set(hashes))
+        .values_list('text_hash', 'embedding')
+    )
+
+    # Các đoạn trùng nhau trong cùng batch chỉ encode một lần
+    miss_texts = {}
+    for h, t in zip(hashes, texts):
+        if h not in cached and h not in miss_texts:
+            miss_texts[h] = t
+
+    if miss_texts:
+        miss_hashes = list(miss_texts)
+        new_vectors = encode_fn([miss_texts[h] for h in miss_hashes])
+        EmbeddingCache.objects.bulk_create(
+            [EmbeddingCache(model_name=model_name, text_hash=h, embedding=v) for h, v in zip(miss_hashes, new_vectors)],
+            ignore_conflicts=True,
+        )
+        cached.update(zip(miss_hashes, new_vectors))
+
+    hit_hashes = [h for h in set(hashes) if h not in miss_texts]
+    if hit_hashes:
+        # Cập nhật last_used_at cho LRU eviction
+        EmbeddingCache.objects.filter(model_name=model_name, text_hash__in=hit_hashes).update(last_used_at=timezone.now())
+
+    hits = sum(1 for h in hashes if h not in miss_texts)
+    stats.hits += hits
+    stats.misses += len(hashes) - hits
+
+    return np.asarray([cached[h] for h in hashes], dtype=np.float32), stats
+
+
+def prune_cache(max_entries, batch_size=10000):
+    """Xoá các entry ít được dùng gần đây nhất cho tới khi còn tối đa max_entries (LRU)."""
+    total = EmbeddingCache.objects.count()
+    excess = total - max_entries
+    deleted = 0
+    while excess > 0:
+        ids = list(
+            EmbeddingCache.objects.order_by('last_used_at').values_list('id', flat=True)[:min(batch_size, excess)]
+        )
+        if not ids:
+            break
+        count, _ = EmbeddingCache.objects.filter(id__in=ids).delete()
+        deleted += count
+        excess -= count
+    if deleted:
+        logger.info(f"Pruned {deleted} embedding cache entries (limit {max_entries}).")
+    return deleted
@@ -0,0 +1,173 @@
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from core.metrics import record_embedding_batch
+
+logger = logging.getLogger(__name__)
+
+
+def validate_texts(texts):
+    """Danh sách văn bản hợp lệ để encode: list các str."""
+    if not isinstance(texts, (list, tuple)) or not all(isinstance(text, str) for text in texts):
+        raise ValueError('"texts" must be a list of strings.')
+    return list(texts)
+
+
+class MicroBatcher:
+    """
+    Gom các request encode đồng thời thành micro-batch: batch được chạy khi đủ
+    max_batch đoạn văn bản hoặc khi request đầu tiên đã chờ quá max_wait giây.
+    Chỉ có một thread gọi model nên mỗi node chỉ giữ một bản model.
+    """
+
+    def __init__(self, backend, max_batch=64, max_wait=0.01):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        future = Future()
+        try:
+            texts = validate_texts(texts)
+        except ValueError as e:
+            # Request lỗi không được vào batch chung với request khác
+            future.set_exception(e)
+            return future
+        self._queue.put((texts, future))
+        return future
+
+    def encode(self, texts, timeout=None):
+        return self.submit(texts).result(timeout=timeout)
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _encode(self, texts):
+        if not texts:
+            return np.empty((0, self.backend.dimensions), dtype=np.float32)
+        start = time.perf_counter()
+        vectors = self.backend.encode(texts)
+        record_embedding_batch(time.perf_counter() - start, len(texts), source='server')
+        return vectors
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            texts = [t for batch_texts, _ in pending for t in batch_texts]
+            try:
+                vectors = self._encode(texts)
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} texts failed: {e}", exc_info=True)
+                if len(pending) > 1:
+                    self._encode_each(pending)
+                else:
+                    pending[0][1].set_exception(e)
+                continue
+            offset = 0
+            for batch_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(batch_texts)])
+                offset += len(batch_texts)
+
+    def _encode_each(self, pending):
+        # Batch lỗi: encode lại từng request để chỉ request gây lỗi nhận exception
+        for batch_texts, future in pending:
+            try:
+                future.set_result(self._encode(batch_texts))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class EmbeddingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, batcher, request_timeout=60):
+        super().__init__(address, EmbeddingRequestHandler)
+        self.batcher = batcher
+        self.request_timeout = request_timeout
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode('utf-8'))
+
+    def do_GET(self):
+        backend = self.server.batcher.backend
+        if self.path == '/info':
+            self._send_json(200, {
+                'model': backend.model_name,
+                'backend': backend.name,
+                'cache_key': backend.cache_key,
+                'dimensions': backend.dimensions,
+            })
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/encode':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length))
+            texts = validate_texts(payload['texts'])
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {'error': 'Body must be JSON with a "texts" list of strings.'})
+            return
+
+        backend = self.server.batcher.backend
+        model = payload.get('model')
+        if model and model != backend.model_name:
+            self._send_json(409, {'error': f"Server serves '{backend.model_name}', not '{model}'."})
+            return
+
+        try:
+            vectors = self.server.batcher.encode(texts, timeout=self.server.request_timeout)
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        # Trả về buffer float32 thô để tránh chi phí serialize JSON cho vector
+        self._send(
+            200,
+            np.ascontiguousarray(vectors, dtype=np.float32).tobytes(),
+            content_type='application/octet-stream',
+            headers={'X-Embedding-Dimensions': str(vectors.shape[1] if vectors.ndim == 2 else backend.dimensions)},
+        )
@@ -0,0 +1,100 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from .embeddings import get_embedding_backend, load_backend
+from .models import DocumentChunk, DocumentChunkEmbedding, EmbeddingVersion
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_VERSION_CACHE_KEY = 'embedding-version:active'
+# Các version không phải inline vẫn nhận vector cho chunk mới (dual-write)
+WRITE_STATUSES = ('backfilling', 'ready', 'active')
+
+_version_backends = {}
+_version_backends_lock = threading.Lock()
+
+
+def get_active_version():
+    """Version đang dùng cho retrieval; cache dùng chung để cutover có hiệu lực ở mọi process."""
+    version = cache.get(ACTIVE_VERSION_CACHE_KEY)
+    if version is None:
+        version = EmbeddingVersion.objects.filter(status='active').first()
+        if version is not None:
+            cache.set(ACTIVE_VERSION_CACHE_KEY, version, timeout=settings.EMBEDDING_VERSION_CACHE_SECONDS)
+    return version
+
+
+def invalidate_active_version():
+    cache.delete(ACTIVE_VERSION_CACHE_KEY)
+
+
+def write_versions():
+    """Các version ngoài inline cần được ghi vector khi ingest chunk mới."""
+    return list(EmbeddingVersion.objects.filter(inline=False, status__in=WRITE_STATUSES).order_by('id'))
+
+
+def backend_for(version):
+    """Backend embedding của version; inline (hoặc chưa có version) dùng backend theo settings."""
+    if version is None or version.inline:
+        return get_embedding_backend()
+    backend = _version_backends.get(version.pk)
+    if backend is None:
+        with _version_backends_lock:
+            backend = _version_backends.get(version.pk)
+            if backend is None:
+                backend = load_backend(version.backend or settings.EMBEDDING_BACKEND, version.model_name)
+                _version_backends[version.pk] = backend
+    return backend
+
+
+def index_name(version):
+    return f"documentchunkembedding_v{version.pk}_hnsw"
+
+
+def create_version_index(version):
+    """
+    HNSW index riêng cho một version: cột embedding không cố định số chiều nên index
+    trên biểu thức ép kiểu vector(dimensions), giới hạn bằng WHERE version_id.
+    Retrieval phải dùng đúng biểu thức này (Cast) để planner chọn index.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    table = DocumentChunkEmbedding._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(version)} ON {table} "
+            f"USING hnsw ((embedding::vector({int(version.dimensions)})) vector_cosine_ops) "
+            f"WITH (m = 16, ef_construction = 64) WHERE version_id = {int(version.pk)}"
+        )
+
+
+def missing_chunks(version):
+    """Chunk chưa có vector của version (dùng để backfill tiếp và kiểm tra trước cutover)."""
+    return DocumentChunk.objects.filter(embedding__isnull=False).exclude(
+        Exists(DocumentChunkEmbedding.objects.filter(version=version, chunk_id=OuterRef('pk')))
+    )
+
+
+def reembed_chunk_batch(version, chunk_ids):
+    """Encode lại một batch chunk từ nội dung đã lưu (không trích xuất lại file), bỏ qua chunk đã có."""
+    from .tasks import embed_chunks
+
+    chunks = list(
+        missing_chunks(version).filter(id__in=chunk_ids)
+        .values_list('id', 'document_id', 'user_id', 'content')
+    )
+    if not chunks:
+        return 0
+    embeddings, _ = embed_chunks([content for _, _, _, content in chunks], backend=backend_for(version))
+    DocumentChunkEmbedding.objects.bulk_create([
+        DocumentChunkEmbedding(
+            chunk_id=chunk_id, document_id=document_id, user_id=user_id, version=version, embedding=embeddings[i],
+        )
+        for i, (chunk_id, document_id, user_id, _) in enumerate(chunks)
+    ], batch_size=500, ignore_conflicts=True)
+    return len(chunks)
@@ -0,0 +1,267 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend:
+    """
+    Interface chung cho các backend tạo embedding.
+    `encode` trả về mảng float32 (n, dimensions) đã chuẩn hoá L2.
+    """
+    name = None
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    @classmethod
+    def cache_key_for(cls, model_name):
+        """Key model dùng cho EmbeddingCache (backend khác nhau cho vector hơi khác nhau)."""
+        return model_name
+
+    @property
+    def cache_key(self):
+        return self.cache_key_for(self.model_name)
+
+    @property
+    def dimensions(self):
+        raise NotImplementedError
+
+    def encode(self, texts):
+        raise NotImplementedError
+
+    def encode_query(self, text):
+        return self.encode([text])[0]
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """PyTorch fp32 qua sentence-transformers."""
+    name = 'sentence-transformers'
+
+    def __init__(self, model_name):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    @property
+    def dimensions(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        return np.asarray(
+            self.model.encode(list(texts), show_progress_bar=False, normalize_embeddings=True),
+            dtype=np.float32,
+        )
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime trên CPU với model được quantize int8 (dynamic quantization).
+    Lần đầu chạy sẽ export model HuggingFace sang ONNX và quantize vào EMBEDDING_ONNX_DIR.
+    """
+    name = 'onnx'
+    max_length = 256
+
+    def __init__(self, model_name, model_dir=None, intra_op_threads=None, quantize=True):
+        super().__init__(model_name)
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.hf_model_id = model_name if '/' in model_name else f'sentence-transformers/{model_name}'
+        self.quantize = quantize
+        self.model_dir = Path(model_dir or settings.EMBEDDING_ONNX_DIR) / self.hf_model_id.replace('/', '__')
+        model_path = self._ensure_model()
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.hf_model_id)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = intra_op_threads if intra_op_threads is not None else settings.EMBEDDING_ONNX_THREADS
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(model_path), options, providers=['CPUExecutionProvider'])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    @classmethod
+    def cache_key_for(cls, model_name):
+        return f"{model_name}@onnx-int8"
+
+    @property
+    def cache_key(self):
+        return self.cache_key_for(self.model_name) if self.quantize else f"{self.model_name}@onnx"
+
+    @property
+    def dimensions(self):
+        return self.session.get_outputs()[0].shape[-1]
+
+    def _ensure_model(self):
+        fp32_path = self.model_dir / 'model.onnx'
+        int8_path = self.model_dir / 'model_int8.onnx'
+        target = int8_path if self.quantize else fp32_path
+        if target.exists():
+            return target
+
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        if not fp32_path.exists():
+            self._export(fp32_path)
+        if self.quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            logger.info(f"Quantizing {fp32_path} to int8...")
+            quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+        return target
+
+    def _export(self, path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"Exporting {self.hf_model_id} to ONNX at {path}...")
+        tokenizer = AutoTokenizer.from_pretrained(self.hf_model_id)
+        model = AutoModel.from_pretrained(self.hf_model_id).eval()
+        sample = tokenizer(["export sample"], return_tensors='pt')
+        names = [n for n in ('input_ids', 'attention_mask', 'token_type_ids') if n in sample]
+
+        class _Wrapper(torch.nn.Module):
+            # Gọi model bằng keyword để không phụ thuộc thứ tự tham số forward() giữa các bản transformers
+            def __init__(self, inner):
+                super().__init__()
+                self.inner = inner
+
+            def forward(self, *tensors):
+                return self.inner(**dict(zip(names, tensors))).last_hidden_state
+
+        dynamic = {n: {0: 'batch', 1: 'sequence'} for n in names}
+        dynamic['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+        with torch.no_grad():
+            torch.onnx.export(
+                _Wrapper(model), tuple(sample[n] for n in names), str(path),
+                input_names=names,
+                output_names=['last_hidden_state'],
+                dynamic_axes=dynamic,
+                opset_version=17,
+                dynamo=False,
+            )
+
+    def encode(self, texts):
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        tokens = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np',
+        )
+        feeds = {k: v.astype(np.int64) for k, v in tokens.items() if k in self._input_names}
+        hidden = self.session.run(None, feeds)[0]
+        # Mean pooling theo attention mask rồi chuẩn hoá L2 (giống pipeline của sentence-transformers)
+        mask = tokens['attention_mask'][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """
+    Client của embedding server (manage.py run_embedding_server). Nếu server
+    không phản hồi thì tạm chuyển sang model local trong process.
+    """
+    name = 'remote'
+
+    def __init__(self, model_name, url=None, timeout=None, local_backend=None):
+        super().__init__(model_name)
+        self.url = (url or settings.EMBEDDING_SERVER_URL).rstrip('/')
+        self.timeout = timeout if timeout is not None else settings.EMBEDDING_SERVER_TIMEOUT
+        # Server và fallback local phải dùng cùng một loại backend để vector (và cache key) khớp nhau
+        self.local_backend_name = local_backend or settings.EMBEDDING_SERVER_BACKEND
+        self._local = None
+        self._local_lock = threading.Lock()
+        self._down_until = 0.0
+        self._dimensions = None
+
+    @property
+    def cache_key(self):
+        return BACKENDS[self.local_backend_name].cache_key_for(self.model_name)
+
+    @property
+    def dimensions(self):
+        if self._dimensions is None:
+            try:
+                self._dimensions = self._request('GET', '/info')['dimensions']
+            except Exception:
+                self._dimensions = self._fallback().dimensions
+        return self._dimensions
+
+    def _request(self, method, path, payload=None):
+        import json
+        import urllib.request
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        request = urllib.request.Request(f"{self.url}{path}", data=data, method=method)
+        request.add_header('Content-Type', 'application/json')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.headers.get('Content-Type') == 'application/octet-stream':
+                dims = int(response.headers['X-Embedding-Dimensions'])
+                return np.frombuffer(response.read(), dtype=np.float32).reshape(-1, dims)
+            return json.loads(response.read())
+
+    def _fallback(self):
+        if self._local is None:
+            with self._local_lock:
+                if self._local is None:
+                    logger.warning(f"Loading local '{self.local_backend_name}' embedding fallback in pid {os.getpid()}.")
+                    self._local = load_backend(self.local_backend_name, self.model_name)
+        return self._local
+
+    def encode(self, texts):
+        texts = list(texts)
+        if time.monotonic() >= self._down_until:
+            try:
+                return self._request('POST', '/encode', {'texts': texts, 'model': self.model_name})
+            except Exception as e:
+                # Tạm ngắt server một khoảng để các request sau không phải chờ timeout
+                self._down_until = time.monotonic() + settings.EMBEDDING_SERVER_RETRY_AFTER
+                logger.error(f"Embedding server {self.url} unavailable, using local fallback: {e}")
+        return self._fallback().encode(texts)
+
+
+BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    OnnxBackend.name: OnnxBackend,
+    RemoteEmbeddingBackend.name: RemoteEmbeddingBackend,
+}
+
+_backend = None
+_backend_failed = False
+_backend_lock = threading.Lock()
+
+
+def load_backend(name, model_name):
+    """Khởi tạo backend theo tên, ném lỗi nếu không load được."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    return backend_class(model_name)
+
+
+def get_embedding_backend():
+    """
+    Trả về backend embedding của process (chọn qua settings.EMBEDDING_BACKEND),
+    hoặc None nếu model không load được.
+    """
+    global _backend, _backend_failed
+    if _backend is None and not _backend_failed:
+        with _backend_lock:
+            if _backend is None and not _backend_failed:
+                name = settings.EMBEDDING_BACKEND
+                try:
+                    _backend = load_backend(name, settings.EMBEDDING_MODEL_NAME)
+                    logger.info(f"Embedding backend '{name}' loaded model '{settings.EMBEDDING_MODEL_NAME}' (pid {os.getpid()}).")
+                except Exception as e:
+                    # Không thử load lại ở mỗi request, giống hành vi load một lần lúc import trước đây
+                    logger.error(f"Failed to load embedding backend '{name}': {e}")
+                    _backend_failed = True
+    return _backend
@@ -0,0 +1,379 @@
+import logging
+import re
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.functions import Cast
+from django.utils import timezone
+from pgvector.django import CosineDistance, VectorField
+
+from core.metrics import record_maintenance_deleted, record_vector_recall
+from .checkpoints import CHECKPOINT_PREFIX
+from .models import Document, DocumentChunk, DocumentChunkEmbedding
+
+logger = logging.getLogger(__name__)
+
+# DeleteObjects của S3 nhận tối đa 1000 key mỗi request
+S3_DELETE_BATCH = 1000
+# Bảng chunk hoặc các partition của nó (xem partition_document_chunks)
+CHUNK_TABLE_RE = r'^documents_documentchunk(_p\d+)?$'
+# Nhãn recall/cờ reindex cho HNSW index của chunk (mọi partition dùng chung một nhãn)
+CHUNK_INDEX = 'documentchunk_embedding_hnsw'
+REINDEX_FLAG_PREFIX = 'maintenance:reindex:'
+
+
+# --- Xoá tài liệu theo tập ---
+
+def _storage_bucket():
+    # Chỉ S3Storage (MinIO) có bucket; storage khác thì xoá từng file qua API của Django
+    return getattr(default_storage, 'bucket', None)
+
+
+def _object_key(name):
+    # Tên trong FileField -> key trong bucket (thêm AWS_LOCATION nếu có)
+    return default_storage._normalize_name(name)
+
+
+def _storage_name(key):
+    location = getattr(default_storage, 'location', '')
+    return key[len(location) + 1:] if location and key.startswith(f"{location}/") else key
+
+
+def delete_objects(keys):
+    """Xoá các key khỏi bucket bằng DeleteObjects (1000 key/request). Trả về số key đã xoá."""
+    bucket = _storage_bucket()
+    if bucket is None:
+        deleted = 0
+        for key in keys:
+            try:
+                default_storage.delete(_storage_name(key))
+                deleted += 1
+            except Exception as e:
+                logger.error(f"Could not delete {key} from storage: {e}")
+        return deleted
+
+    deleted = 0
+    for start in range(0, len(keys), S3_DELETE_BATCH):
+        batch = keys[start:start + S3_DELETE_BATCH]
+        response = bucket.delete_objects(Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+        errors = response.get('Errors', [])
+        for error in errors[:10]:
+            logger.error(f"Could not delete {error.get('Key')} from storage: {error.get('Message')}")
+        deleted += len(batch) - len(errors)
+    return deleted
+
+
+def delete_checkpoint_prefixes(document_ids):
+    """Xoá checkpoint của nhiều tài liệu: mỗi tài liệu một lần list theo prefix, xoá theo batch."""
+    bucket = _storage_bucket()
+    if bucket is None:
+        from . import checkpoints
+        for document_id in document_ids:
+            checkpoints.clear(document_id)
+        return 0
+    keys = []
+    for document_id in document_ids:
+        prefix = _object_key(f"{CHECKPOINT_PREFIX}/{document_id}/")
+        keys.extend(obj.key for obj in bucket.objects.filter(Prefix=prefix))
+    return delete_objects(keys)
+
+
+def _delete_document_rows(cursor, document_ids, user_ids):
+    # Xoá theo thứ tự phụ thuộc, mỗi bảng một câu lệnh thay vì cascade từng object của ORM.
+    # Điều kiện user_id giúp Postgres chỉ quét các partition liên quan của bảng chunk.
+    chunks = DocumentChunk._meta.db_table
+    sources = DocumentChunk.chat_messages.through
+    sources_chunk = sources._meta.get_field('documentchunk').column
+    cursor.execute(
+        f"DELETE FROM {DocumentChunkEmbedding._meta.db_table} WHERE document_id = ANY(%s)", [document_ids]
+    )
+    cursor.execute(
+        f"DELETE FROM {sources._meta.db_table} s USING {chunks} c "
+        f"WHERE s.{sources_chunk} = c.id AND c.document_id = ANY(%s) AND c.user_id = ANY(%s)",
+        [document_ids, user_ids],
+    )
+    cursor.execute(f"DELETE FROM {chunks} WHERE document_id = ANY(%s) AND user_id = ANY(%s)", [document_ids, user_ids])
+    chunk_count = cursor.rowcount
+    cursor.execute(f"DELETE FROM {Document._meta.db_table} WHERE id = ANY(%s)", [document_ids])
+    return chunk_count
+
+
+def purge_documents(queryset, batch_size=None):
+    """
+    Xoá các tài liệu của queryset theo batch (keyset theo id): mỗi batch khoá các dòng còn khớp
+    điều kiện (bỏ qua dòng đang bị khoá, vd. tài liệu đang được retry), xoá DB bằng vài câu
+    DELETE theo tập trong một transaction, rồi xoá file và checkpoint bằng DeleteObjects.
+    File bị xoá sau khi commit: lỗi storage chỉ để lại object mồ côi cho reconcile_storage_orphans.
+    """
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    documents = chunks = files = 0
+    last_id = None
+    while True:
+        batch = queryset.order_by('id')
+        if last_id is not None:
+            batch = batch.filter(id__gt=last_id)
+        with transaction.atomic():
+            rows = list(batch.select_for_update(skip_locked=True).values_list('id', 'user_id', 'file')[:batch_size])
+            if not rows:
+                break
+            document_ids = [row[0] for row in rows]
+            with connection.cursor() as cursor:
+                chunks += _delete_document_rows(cursor, document_ids, sorted({row[1] for row in rows}))
+        last_id = document_ids[-1]
+        documents += len(rows)
+
+        files += delete_objects([_object_key(row[2]) for row in rows if row[2]])
+        delete_checkpoint_prefixes(document_ids)
+        logger.info(f"Purged {documents} documents so far ({chunks} chunks, {files} files).")
+
+    record_maintenance_deleted('document', documents)
+    record_maintenance_deleted('file', files)
+    return documents, chunks, files
+
+
+# --- Đối soát bucket với Document.file ---
+
+def _list_pages(prefix, delimiter=None):
+    client = _storage_bucket().meta.client
+    params = {'Bucket': default_storage.bucket_name, 'Prefix': _object_key(prefix)}
+    if delimiter:
+        params['Delimiter'] = delimiter
+    yield from client.get_paginator('list_objects_v2').paginate(**params)
+
+
+def reconcile_storage_orphans(grace_hours=None, dry_run=False):
+    """
+    Xoá object trong bucket không còn Document nào trỏ tới (file dưới documents/) và checkpoint
+    của tài liệu đã bị xoá. Mỗi trang list (1000 key) được đối chiếu bằng một query file__in.
+    Chỉ xét object cũ hơn grace_hours vì file được upload trước khi dòng Document được commit.
+    """
+    if _storage_bucket() is None:
+        logger.warning("Storage reconciliation requires S3 storage; skipping.")
+        return 0, 0
+    grace_hours = settings.MAINTENANCE_ORPHAN_GRACE_HOURS if grace_hours is None else grace_hours
+    cutoff = timezone.now() - timedelta(hours=grace_hours)
+    upload_to = Document._meta.get_field('file').upload_to
+
+    orphan_files = 0
+    for page in _list_pages(upload_to):
+        names = {
+            _storage_name(obj['Key']): obj['Key']
+            for obj in page.get('Contents', []) if obj['LastModified'] < cutoff
+        }
+        if not names:
+            continue
+        known = set(Document.objects.filter(file__in=list(names)).values_list('file', flat=True))
+        orphans = [key for name, key in names.items() if name not in known]
+        if orphans:
+            logger.info(f"Found {len(orphans)} orphaned files, e.g. {orphans[0]}")
+            orphan_files += len(orphans) if dry_run else delete_objects(orphans)
+
+    orphan_checkpoints = []
+    for page in _list_pages(f"{CHECKPOINT_PREFIX}/", delimiter='/'):
+        document_ids = [common['Prefix'].rstrip('/').rsplit('/', 1)[-1] for common in page.get('CommonPrefixes', [])]
+        document_ids = [document_id for document_id in document_ids if re.fullmatch(r'[0-9a-f-]{36}', document_id)]
+        existing = {str(pk) for pk in Document.objects.filter(id__in=document_ids).values_list('id', flat=True)}
+        orphan_checkpoints.extend(document_id for document_id in document_ids if document_id not in existing)
+    if orphan_checkpoints and not dry_run:
+        delete_checkpoint_prefixes(orphan_checkpoints)
+
+    if not dry_run:
+        record_maintenance_deleted('orphan_file', orphan_files)
+        record_maintenance_deleted('checkpoint', len(orphan_checkpoints))
+    logger.info(
+        f"Storage reconciliation {'(dry run) ' if dry_run else ''}found {orphan_files} orphaned files "
+        f"and {len(orphan_checkpoints)} orphaned checkpoint prefixes."
+    )
+    return orphan_files, len(orphan_checkpoints)
+
+
+# --- VACUUM / REINDEX cho bảng chunk và HNSW index ---
+
+def _vector_tables():
+    return [Document._meta.db_table, DocumentChunkEmbedding._meta.db_table]
+
+
+def vacuum_vector_tables(min_dead_ratio=None, min_dead_rows=None):
+    """
+    VACUUM (ANALYZE) các bảng chứa vector có tỉ lệ dead tuple vượt ngưỡng sau nhiều lần xoá/xử lý lại.
+    VACUUM cũng dọn tuple đã xoá khỏi HNSW index nên giữ cho graph không bị phình.
+    Phải chạy ngoài transaction (autocommit).
+    """
+    min_dead_ratio = settings.MAINTENANCE_VACUUM_DEAD_RATIO if min_dead_ratio is None else min_dead_ratio
+    min_dead_rows = settings.MAINTENANCE_VACUUM_MIN_DEAD_ROWS if min_dead_rows is None else min_dead_rows
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT relname, n_live_tup, n_dead_tup FROM pg_stat_user_tables
+            WHERE relname ~ %s OR relname = ANY(%s)
+        """, [CHUNK_TABLE_RE, _vector_tables()])
+        stats = cursor.fetchall()
+
+        vacuumed = []
+        cursor.execute("SET maintenance_work_mem = %s", [settings.MAINTENANCE_WORK_MEM])
+        try:
+            for table, live, dead in stats:
+                if dead < min_dead_rows or dead / max(live + dead, 1) < min_dead_ratio:
+                    continue
+                logger.info(f"Vacuuming {table} ({dead} dead / {live} live tuples).")
+                cursor.execute(f"VACUUM (ANALYZE) {connection.ops.quote_name(table)}")
+                vacuumed.append(table)
+        finally:
+            cursor.execute("RESET maintenance_work_mem")
+    return vacuumed
+
+
+def _hnsw_indexes(cursor):
+    # Chỉ lấy index lá (relkind 'i'): với bảng partition, reindex từng partition một
+    cursor.execute("""
+        SELECT i.relname, t.relname, x.indisvalid
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_am a ON a.oid = i.relam
+        WHERE a.amname = 'hnsw' AND i.relkind = 'i' AND (t.relname ~ %s OR t.relname = ANY(%s))
+        ORDER BY i.relname
+    """, [CHUNK_TABLE_RE, _vector_tables()])
+    return cursor.fetchall()
+
+
+def _recall_label(index, table):
+    return CHUNK_INDEX if re.match(CHUNK_TABLE_RE, table) else index
+
+
+def flag_for_reindex(label):
+    cache.set(f"{REINDEX_FLAG_PREFIX}{label}", timezone.now().isoformat(), timeout=None)
+
+
+def reindex_vector_indexes(force=False):
+    """
+    REINDEX INDEX CONCURRENTLY các HNSW index đã bị recall sampling đánh dấu (hoặc tất cả nếu force).
+    Build lại graph loại bỏ các node đã xoá và khôi phục độ kết nối sau nhiều lần churn,
+    không khoá ghi bảng. Index *_ccnew còn sót từ lần reindex bị ngắt được xoá trước.
+    """
+    reindexed = []
+    with connection.cursor() as cursor:
+        indexes = _hnsw_indexes(cursor)
+        for index, table, valid in indexes:
+            if not valid and '_ccnew' in index:
+                logger.warning(f"Dropping invalid index {index} left by an interrupted reindex.")
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {connection.ops.quote_name(index)}")
+
+        targets = [
+            (index, table) for index, table, valid in indexes
+            if '_ccnew' not in index
+            and (force or cache.get(f"{REINDEX_FLAG_PREFIX}{_recall_label(index, table)}"))
+        ]
+        if not targets:
+            return reindexed
+
+        cursor.execute("SET maintenance_work_mem = %s", [settings.MAINTENANCE_WORK_MEM])
+        try:
+            for index, table in targets:
+                logger.info(f"Rebuilding HNSW index {index} on {table}.")
+                cursor.execute(f"REINDEX INDEX CONCURRENTLY {connection.ops.quote_name(index)}")
+                reindexed.append(index)
+        finally:
+            cursor.execute("RESET maintenance_work_mem")
+
+    for label in {_recall_label(index, table) for index, table in targets}:
+        cache.delete(f"{REINDEX_FLAG_PREFIX}{label}")
+    return reindexed
+
+
+# --- Lấy mẫu recall của ANN ---
+
+def _sample_chunk_ids(size):
+    """Lấy mẫu ngẫu nhiên chunk có embedding; TABLESAMPLE tránh ORDER BY random() trên cả bảng."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(reltuples), 0) FROM pg_class WHERE relkind = 'r' AND relname ~ %s",
+            [CHUNK_TABLE_RE],
+        )
+        estimated = cursor.fetchone()[0]
+        if estimated > size * 20:
+            # Lấy dư vài lần vì SYSTEM chọn theo page và một phần chunk chưa có embedding
+            percent = min(100.0, size * 400.0 / estimated)
+            cursor.execute(
+                f"SELECT id FROM {DocumentChunk._meta.db_table} TABLESAMPLE SYSTEM (%s) "
+                f"WHERE embedding IS NOT NULL LIMIT %s",
+                [percent, size],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if len(ids) >= size // 2:
+                return ids
+    return list(
+        DocumentChunk.objects.filter(embedding__isnull=False).order_by('?').values_list('id', flat=True)[:size]
+    )
+
+
+def _top_ids(queryset, k, exact):
+    # ANN: cấu hình HNSW giống retrieval. Exact: tắt index scan để Postgres quét và sắp xếp toàn bộ.
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if exact:
+                cursor.execute("SET LOCAL enable_indexscan = off")
+            else:
+                cursor.execute("SET LOCAL hnsw.ef_search = %s", [settings.RETRIEVAL_HNSW_EF_SEARCH])
+        return set(queryset.values_list('pk', flat=True)[:k])
+
+
+def _recall(build_queryset, queries, k):
+    recalls = []
+    for query in queries:
+        queryset = build_queryset(query)
+        exact = _top_ids(queryset, k, exact=True)
+        if exact:
+            recalls.append(len(_top_ids(queryset, k, exact=False) & exact) / len(exact))
+    return float(np.mean(recalls)) if recalls else None
+
+
+def sample_vector_recall(sample_size=None, k=None, threshold=None):
+    """
+    Đo recall@k của HNSW index so với tìm chính xác, dùng chính các chunk được lấy mẫu làm câu hỏi.
+    Với bảng chunk đã partition, truy vấn lọc theo user để mỗi câu hỏi chạy trên index của partition đó.
+    Recall dưới ngưỡng: log lỗi và đánh dấu index để reindex_vector_indexes build lại.
+    """
+    from .embedding_versions import get_active_version, index_name
+    from .management.commands.partition_document_chunks import is_partitioned
+
+    sample_size = sample_size or settings.MAINTENANCE_RECALL_SAMPLE_SIZE
+    k = k or settings.MAINTENANCE_RECALL_K
+    threshold = settings.MAINTENANCE_RECALL_THRESHOLD if threshold is None else threshold
+
+    chunk_ids = _sample_chunk_ids(sample_size)
+    queries = list(DocumentChunk.objects.filter(id__in=chunk_ids).values_list('user_id', 'embedding'))
+    partitioned = is_partitioned()
+
+    def chunk_queryset(query):
+        user_id, embedding = query
+        queryset = DocumentChunk.objects.filter(user_id=user_id) if partitioned else DocumentChunk.objects.all()
+        return queryset.order_by(CosineDistance('embedding', embedding))
+
+    results = {CHUNK_INDEX: _recall(chunk_queryset, queries, k)}
+
+    version = get_active_version()
+    if version is not None and not version.inline:
+        vector = Cast('embedding', VectorField(dimensions=version.dimensions))
+        version_queries = list(
+            DocumentChunkEmbedding.objects.filter(version=version, chunk_id__in=chunk_ids).values_list('embedding', flat=True)
+        )
+        results[index_name(version)] = _recall(
+            lambda embedding: DocumentChunkEmbedding.objects.filter(version=version)
+            .order_by(CosineDistance(vector, embedding)),
+            version_queries, k,
+        )
+
+    for label, recall in results.items():
+        if recall is None:
+            continue
+        record_vector_recall(label, recall)
+        if recall < threshold:
+            logger.error(f"ANN recall@{k} of {label} dropped to {recall:.3f} (threshold {threshold}); flagged for reindex.")
+            flag_for_reindex(label)
+        else:
+            logger.info(f"ANN recall@{k} of {label}: {recall:.3f}")
+    return results
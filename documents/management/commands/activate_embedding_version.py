@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from documents.embedding_versions import invalidate_active_version, missing_chunks
+from documents.models import EmbeddingVersion
+
+
+class Command(BaseCommand):
+    help = (
+        "Chuyển retrieval sang một version embedding (cutover nguyên tử). Version cũ về 'ready' "
+        "nên có thể chuyển ngược lại bằng chính lệnh này."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name')
+        parser.add_argument('--force', action='store_true', help='Cho phép kích hoạt khi còn chunk thiếu vector')
+        parser.add_argument('--retire-previous', action='store_true',
+                            help="Đánh dấu version cũ 'retired' (ngừng dual-write) thay vì 'ready'")
+
+    def handle(self, *args, **options):
+        try:
+            version = EmbeddingVersion.objects.get(name=options['name'])
+        except EmbeddingVersion.DoesNotExist:
+            raise CommandError(f"Embedding version {options['name']} does not exist.")
+        if version.status == 'active':
+            self.stdout.write(f"Version {version.name} is already active.")
+            return
+
+        if not version.inline:
+            missing = missing_chunks(version).count()
+            if missing and not options['force']:
+                raise CommandError(
+                    f"{missing} chunks have no vector for {version.name}; finish reembed_corpus or use --force."
+                )
+
+        with transaction.atomic():
+            previous = EmbeddingVersion.objects.select_for_update().filter(status='active').first()
+            if previous is not None:
+                # Version inline luôn được ghi cùng chunk nên không retire được
+                previous.status = 'retired' if options['retire_previous'] and not previous.inline else 'ready'
+                previous.save(update_fields=['status'])
+            version.status = 'active'
+            version.activated_at = timezone.now()
+            version.save(update_fields=['status', 'activated_at'])
+            transaction.on_commit(invalidate_active_version)
+
+        previous_name = previous.name if previous else 'none'
+        self.stdout.write(self.style.SUCCESS(f"Retrieval switched from {previous_name} to {version.name}."))
@@ -0,0 +1,40 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from documents.models import Document, DocumentChunk
+from documents.tasks import document_centroid
+
+
+class Command(BaseCommand):
+    help = "Tính centroid cho các tài liệu đã xử lý xong trước khi có cột centroid (chạy lại được nhiều lần)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = Document.objects.filter(status='completed', centroid__isnull=True)
+        self.stdout.write(f"{pending.count()} documents without centroid.")
+
+        updated = 0
+        batch = []
+        for document in pending.only('id', 'user_id').iterator(chunk_size=batch_size):
+            embeddings = list(
+                DocumentChunk.objects.filter(user_id=document.user_id, document_id=document.id, embedding__isnull=False)
+                .values_list('embedding', flat=True)
+            )
+            centroid = document_centroid(np.asarray(embeddings, dtype=np.float32)) if embeddings else None
+            if centroid is None:
+                continue
+            document.centroid = centroid
+            batch.append(document)
+            if len(batch) >= batch_size:
+                Document.objects.bulk_update(batch, ['centroid'])
+                updated += len(batch)
+                batch = []
+                self.stdout.write(f"Updated {updated} documents...")
+        if batch:
+            Document.objects.bulk_update(batch, ['centroid'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Computed centroids for {updated} documents."))
@@ -0,0 +1,75 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from documents.corpus_snapshot import SNAPSHOT_FORMAT, export_user, inline_dimensions, read_manifest, write_manifest
+from documents.models import Document
+
+
+class Command(BaseCommand):
+    help = (
+        "Xuất tài liệu đã xử lý xong cùng chunk và embedding (inline) ra snapshot theo từng user "
+        "(JSONL + .npy mmap). --since chỉ xuất tài liệu thay đổi từ mốc đó; tài liệu bị xoá "
+        "không có trong bản incremental. Vector của các version embedding khác không được xuất."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Thư mục snapshot (phải trống)')
+        parser.add_argument('--since',
+                            help="Mốc ISO 8601, hoặc đường dẫn snapshot trước đó (dùng mốc 'until' của nó)")
+        parser.add_argument('--user', action='append', dest='usernames', help='Chỉ xuất các user này')
+        parser.add_argument('--batch-size', type=int, default=100, help='Số tài liệu mỗi lần truy vấn')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'])
+        if output.exists() and any(output.iterdir()):
+            raise CommandError(f"{output} is not empty.")
+        output.mkdir(parents=True, exist_ok=True)
+        since = self._parse_since(options['since'])
+
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Mọi truy vấn (đếm + đọc từng batch) thấy cùng một snapshot của DB
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            until = timezone.now()
+            dimensions = inline_dimensions()
+            users = get_user_model().objects.filter(
+                pk__in=Document.objects.filter(status='completed').values('user_id')
+            ).order_by('pk')
+            if options['usernames']:
+                users = users.filter(username__in=options['usernames'])
+
+            entries = {}
+            for user in users:
+                entry = export_user(user, output, dimensions, since=since, batch_size=options['batch_size'])
+                if entry is None:
+                    continue
+                entries[str(user.pk)] = entry
+                self.stdout.write(f"User {user.get_username()}: {entry['documents']} documents, {entry['chunks']} chunks.")
+
+        write_manifest(output, {
+            'format': SNAPSHOT_FORMAT,
+            'dimensions': dimensions,
+            'since': since,
+            'until': until,
+            'users': entries,
+        })
+        total = sum(entry['chunks'] for entry in entries.values())
+        self.stdout.write(self.style.SUCCESS(f"Exported {total} chunks for {len(entries)} users to {output}."))
+
+    def _parse_since(self, value):
+        if not value:
+            return None
+        if Path(value).is_dir():
+            return parse_datetime(read_manifest(value)['until'])
+        since = parse_datetime(value)
+        if since is None:
+            raise CommandError(f"Invalid --since value: {value}")
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.corpus_snapshot import import_user, inline_dimensions, read_manifest
+
+
+class Command(BaseCommand):
+    help = (
+        "Nạp snapshot của export_corpus: upsert tài liệu và thay chunk của chúng bằng COPY. "
+        "Áp dụng bản full trước rồi các bản incremental theo thứ tự. User được khớp theo username. "
+        "File gốc trong object storage không nằm trong snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', help='Thư mục snapshot')
+        parser.add_argument('--user', action='append', dest='usernames', help='Chỉ nạp các user này')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Tạo user chưa có (không có mật khẩu, cần đặt lại mật khẩu để đăng nhập)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Số tài liệu mỗi transaction')
+
+    def handle(self, *args, **options):
+        root = Path(options['snapshot'])
+        try:
+            manifest = read_manifest(root)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read snapshot {root}: {e}")
+        dimensions = inline_dimensions()
+        if manifest['dimensions'] != dimensions:
+            raise CommandError(f"Snapshot has {manifest['dimensions']}-d embeddings, expected {dimensions}.")
+
+        User = get_user_model()
+        documents = chunks = 0
+        for entry in manifest['users'].values():
+            if options['usernames'] and entry['username'] not in options['usernames']:
+                continue
+            user = User.objects.filter(username=entry['username']).first()
+            if user is None:
+                if not options['create_users']:
+                    self.stderr.write(f"Skipping {entry['username']}: user does not exist (use --create-users).")
+                    continue
+                user = User.objects.create_user(username=entry['username'], email=entry['email'], password=None)
+
+            imported = import_user(user, root / entry['path'], batch_size=options['batch_size'])
+            documents += imported[0]
+            chunks += imported[1]
+            self.stdout.write(f"User {entry['username']}: {imported[0]} documents, {imported[1]} chunks.")
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {documents} documents and {chunks} chunks."))
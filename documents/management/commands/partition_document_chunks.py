@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+TABLE = 'documents_documentchunk'
+NEW_TABLE = 'documents_documentchunk_partitioned'
+OLD_TABLE = 'documents_documentchunk_unpartitioned'
+
+
+def is_partitioned(table=TABLE):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def _fetch(cursor, sql, params):
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+class Command(BaseCommand):
+    help = (
+        "Chuyển bảng chunk sang partition theo hash(user_id), mỗi partition có HNSW index riêng. "
+        "Chạy trong cửa sổ bảo trì: bảng bị khoá ghi trong lúc copy và build index. "
+        "Sau khi partition, migration không thể dùng AddIndexConcurrently trên bảng chunk nữa. "
+        "Đánh đổi: primary key thành (id, user_id) trong khi model Django vẫn coi id là pk, và FK "
+        "từ bảng khác (chatbot_chatmessage_sources) bị xoá. id vẫn unique trong từng partition "
+        "(UUID4 sinh phía app nên trùng giữa các partition là không thực tế); dòng tham chiếu chunk "
+        "được dọn bởi ORM (cascade khi xoá) và maintenance.purge_documents, không còn do Postgres đảm bảo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', type=int, default=None,
+                            help="Số partition (mặc định: settings.DOCUMENT_CHUNK_PARTITIONS)")
+        parser.add_argument('--maintenance-work-mem', default='1GB',
+                            help="maintenance_work_mem khi build HNSW index")
+        parser.add_argument('--drop-old', action='store_true',
+                            help=f"Xoá bảng cũ thay vì giữ lại dưới tên {OLD_TABLE} để rollback")
+        parser.add_argument('--dry-run', action='store_true', help="Chỉ in ra các câu lệnh SQL")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning requires PostgreSQL.")
+        if is_partitioned():
+            self.stdout.write(f"{TABLE} is already partitioned.")
+            return
+        partitions = options['partitions'] or settings.DOCUMENT_CHUNK_PARTITIONS
+        if partitions < 2:
+            raise CommandError("--partitions must be at least 2.")
+
+        with connection.cursor() as cursor:
+            if _fetch(cursor, "SELECT 1 FROM pg_class WHERE relname = %s", [OLD_TABLE]):
+                raise CommandError(f"{OLD_TABLE} already exists; drop it before partitioning again.")
+            # Index (trừ primary key) và FK của bảng hiện tại được tạo lại y hệt trên bảng mới
+            indexes = _fetch(cursor, """
+                SELECT i.relname, pg_get_indexdef(i.oid)
+                FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+                WHERE x.indrelid = %s::regclass AND NOT x.indisprimary
+            """, [TABLE])
+            primary_key = _fetch(cursor, """
+                SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'
+            """, [TABLE])[0][0]
+            foreign_keys = _fetch(cursor, """
+                SELECT conname, pg_get_constraintdef(oid)
+                FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'
+            """, [TABLE])
+            # FK trỏ vào chunk (vd. bảng M2M sources của chat) không thể giữ được vì khoá
+            # chính của bảng partition phải chứa user_id; xoá cascade vẫn do ORM đảm nhiệm.
+            referencing = _fetch(cursor, """
+                SELECT conrelid::regclass::text, conname
+                FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'
+            """, [TABLE])
+
+        statements = [
+            f"LOCK TABLE {TABLE} IN EXCLUSIVE MODE",
+            f"SET LOCAL maintenance_work_mem = '{options['maintenance_work_mem']}'",
+            f"CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS) PARTITION BY HASH (user_id)",
+        ]
+        statements += [
+            f"CREATE TABLE {TABLE}_p{i:02d} PARTITION OF {NEW_TABLE} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+            for i in range(partitions)
+        ]
+        statements.append(f"INSERT INTO {NEW_TABLE} SELECT * FROM {TABLE}")
+        statements += [f'ALTER TABLE {table} DROP CONSTRAINT "{name}"' for table, name in referencing]
+
+        # Đổi tên bảng và index cũ để bảng mới dùng lại đúng tên Django đang biết
+        statements.append(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+        statements.append(f'ALTER INDEX "{primary_key}" RENAME TO "{OLD_TABLE}_pkey"')
+        for position, (name, _) in enumerate(indexes):
+            statements.append(f'ALTER INDEX "{name}" RENAME TO "{OLD_TABLE}_idx{position}"')
+        statements.append(f"ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}")
+
+        # Primary key phải chứa khoá partition
+        statements.append(f'ALTER TABLE {TABLE} ADD CONSTRAINT "{primary_key}" PRIMARY KEY (id, user_id)')
+        # Unique index trên bảng partition phải chứa khoá partition, nên id chỉ giữ unique được
+        # trong từng partition; cũng là index cho truy vấn theo pk không kèm user_id
+        statements += [
+            f"CREATE UNIQUE INDEX {TABLE}_p{i:02d}_id_uniq ON {TABLE}_p{i:02d} (id)"
+            for i in range(partitions)
+        ]
+        # Index tạo trên bảng cha được tạo riêng cho từng partition, kể cả HNSW
+        statements += [definition for _, definition in indexes]
+        statements += [f'ALTER TABLE {TABLE} ADD CONSTRAINT "{name}" {definition}' for name, definition in foreign_keys]
+        if options['drop_old']:
+            statements.append(f"DROP TABLE {OLD_TABLE}")
+
+        if options['dry_run']:
+            for statement in statements:
+                self.stdout.write(f"{statement};")
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in statements:
+                self.stdout.write(f"{statement[:100]}...")
+                cursor.execute(statement)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {TABLE}")
+
+        for table, name in referencing:
+            self.stdout.write(self.style.WARNING(
+                f"Dropped foreign key {name} on {table} (references {TABLE}); "
+                f"rows referencing deleted chunks are now removed by the application only."
+            ))
+        self.stdout.write(self.style.SUCCESS(f"{TABLE} is now hash-partitioned by user_id into {partitions} partitions."))
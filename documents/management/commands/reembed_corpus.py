@@ -0,0 +1,104 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.embedding_versions import backend_for, create_version_index, missing_chunks, reembed_chunk_batch
+from documents.models import EmbeddingVersion
+from documents.tasks import reembed_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        "Tạo (hoặc tiếp tục) version embedding mới và encode lại toàn bộ chunk từ nội dung đã lưu, "
+        "song song qua queue 'embed'. Chạy lại được: chunk đã có vector của version sẽ bị bỏ qua. "
+        "Xong thì version ở trạng thái 'ready', chuyển sang bằng activate_embedding_version."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Tên version, ví dụ 'v2-bge-m3'")
+        parser.add_argument('--model', help='Tên model (bắt buộc khi tạo version mới)')
+        parser.add_argument('--backend', default='', help='Backend embedding, mặc định theo EMBEDDING_BACKEND')
+        parser.add_argument('--batch-size', type=int, default=256, help='Số chunk mỗi task')
+        parser.add_argument('--parallel', type=int, default=8, help='Số task chạy đồng thời tối đa')
+        parser.add_argument('--inline', action='store_true',
+                            help='Encode ngay trong process này thay vì gửi task cho worker embed')
+
+    def handle(self, *args, **options):
+        version = self._get_or_create_version(options)
+        if version.status == 'retired':
+            raise CommandError(f"Version {version.name} is retired.")
+
+        pending = missing_chunks(version)
+        total = pending.count()
+        self.stdout.write(f"{total} chunks to embed for version {version.name}.")
+
+        start = time.perf_counter()
+        done = self._run(version, pending, options)
+        self.stdout.write(f"Embedded {done} chunks in {time.perf_counter() - start:.1f}s.")
+
+        remaining = missing_chunks(version).count()
+        if remaining:
+            raise CommandError(f"{remaining} chunks still missing vectors; run the command again to resume.")
+
+        create_version_index(version)
+        if version.status == 'backfilling':
+            version.status = 'ready'
+            version.save(update_fields=['status'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Version {version.name} is {version.status}. Switch with: activate_embedding_version {version.name}"
+        ))
+
+    def _get_or_create_version(self, options):
+        version = EmbeddingVersion.objects.filter(name=options['name']).first()
+        if version is not None:
+            return version
+        if not options['model']:
+            raise CommandError("--model is required to create a new version.")
+        version = EmbeddingVersion(name=options['name'], model_name=options['model'], backend=options['backend'])
+        backend = backend_for(version)
+        if not backend:
+            raise CommandError(f"Could not load embedding model {options['model']}.")
+        version.dimensions = backend.dimensions
+        # Tạo version trước khi backfill: từ đây ingestion dual-write chunk mới cho version này
+        version.save()
+        return version
+
+    def _batches(self, pending, batch_size):
+        # Keyset pagination theo id, không dùng OFFSET trên bảng lớn
+        last_id = None
+        while True:
+            queryset = pending.order_by('id')
+            if last_id is not None:
+                queryset = queryset.filter(id__gt=last_id)
+            ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return
+            last_id = ids[-1]
+            yield [str(chunk_id) for chunk_id in ids]
+
+    def _run(self, version, pending, options):
+        done = 0
+        if options['inline']:
+            for ids in self._batches(pending, options['batch_size']):
+                done += reembed_chunk_batch(version, ids)
+                self.stdout.write(f"Embedded {done} chunks...")
+            return done
+
+        in_flight = []
+        for ids in self._batches(pending, options['batch_size']):
+            in_flight.append(reembed_chunks.delay(version.id, ids))
+            while len(in_flight) >= options['parallel']:
+                done += self._collect(in_flight)
+        while in_flight:
+            done += self._collect(in_flight)
+        return done
+
+    def _collect(self, in_flight):
+        # Chờ task cũ nhất để giới hạn số batch đang nằm trong queue
+        result = in_flight.pop(0)
+        count = result.get(propagate=False) or 0
+        if result.failed():
+            self.stderr.write(f"Batch task {result.id} failed: {result.result}")
+            count = 0
+        self.stdout.write(f"Batch {result.id}: {count} chunks.")
+        return count
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.embedding_server import EmbeddingServer, MicroBatcher
+from documents.embeddings import load_backend
+
+
+class Command(BaseCommand):
+    help = "Chạy embedding server dùng chung một model cho cả node, gom request thành micro-batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=8500)
+        parser.add_argument('--backend', default=None, help="Mặc định: settings.EMBEDDING_SERVER_BACKEND")
+        parser.add_argument('--max-batch', type=int, default=None)
+        parser.add_argument('--max-wait-ms', type=float, default=None)
+
+    def handle(self, *args, **options):
+        backend_name = options['backend'] or settings.EMBEDDING_SERVER_BACKEND
+        try:
+            backend = load_backend(backend_name, settings.EMBEDDING_MODEL_NAME)
+        except Exception as e:
+            raise CommandError(f"Could not load embedding backend '{backend_name}': {e}")
+
+        max_batch = options['max_batch'] or settings.EMBEDDING_SERVER_MAX_BATCH
+        max_wait_ms = options['max_wait_ms'] if options['max_wait_ms'] is not None else settings.EMBEDDING_SERVER_MAX_WAIT_MS
+        batcher = MicroBatcher(backend, max_batch=max_batch, max_wait=max_wait_ms / 1000.0)
+        server = EmbeddingServer((options['host'], options['port']), batcher,
+                                 request_timeout=settings.EMBEDDING_SERVER_TIMEOUT)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Embedding server ({backend_name}, {settings.EMBEDDING_MODEL_NAME}) listening on "
+            f"{options['host']}:{options['port']} (max_batch={max_batch}, max_wait={max_wait_ms}ms)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
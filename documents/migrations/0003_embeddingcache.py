@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:26
+
+import django.utils.timezone
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_alter_documentchunk_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=100)),
+                ('text_hash', models.CharField(max_length=40)),
+                ('embedding', pgvector.django.vector.VectorField()),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model_name', 'text_hash'), name='uniq_embedding_cache_key')],
+            },
+        ),
+    ]
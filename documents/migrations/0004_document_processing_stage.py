@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_embeddingcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='processing_stage',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:35
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import pgvector.django.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # HNSW index được tạo CONCURRENTLY để không khoá ghi bảng chunk trong lúc build
+    atomic = False
+
+    dependencies = [
+        ('documents', '0004_document_processing_stage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='tags',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), blank=True, default=list, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='document_user_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags'], name='document_tags_gin'),
+        ),
+        AddIndexConcurrently(
+            model_name='documentchunk',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='documentchunk_embedding_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
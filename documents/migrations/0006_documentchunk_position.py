@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:37
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('documents', '0005_document_tags_and_vector_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='char_end',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='char_start',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='chunk_index',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='documentchunk',
+            index=models.Index(fields=['document', 'chunk_index'], name='documentchunk_doc_index'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+
+def backfill_chunk_user(apps, schema_editor):
+    # Theo từng batch tài liệu; migration không atomic nên mỗi batch commit riêng
+    Document = apps.get_model('documents', 'Document')
+    DocumentChunk = apps.get_model('documents', 'DocumentChunk')
+    last_id = None
+    while True:
+        documents = Document.objects.order_by('id')
+        if last_id is not None:
+            documents = documents.filter(id__gt=last_id)
+        batch = list(documents.values_list('id', 'user_id')[:500])
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        by_user = {}
+        for document_id, user_id in batch:
+            by_user.setdefault(user_id, []).append(document_id)
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for user_id, document_ids in by_user.items():
+                DocumentChunk.objects.filter(document_id__in=document_ids, user__isnull=True).update(user_id=user_id)
+
+
+class Migration(migrations.Migration):
+    # Không chạy trong một transaction: UPDATE backfill để lại trigger FK đang chờ (deferred),
+    # khi đó ALTER ... SET NOT NULL trong cùng transaction lỗi "pending trigger events".
+    # Mỗi bước (thêm cột, backfill theo batch, NOT NULL) commit riêng.
+    atomic = False
+
+    dependencies = [
+        ('documents', '0006_documentchunk_position'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentchunk',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='document_chunks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_chunk_user, migrations.RunPython.noop, atomic=False),
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_chunks', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
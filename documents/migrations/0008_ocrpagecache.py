@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_documentchunk_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcrPageCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image_hash', models.CharField(max_length=40)),
+                ('language', models.CharField(max_length=50)),
+                ('text', models.TextField(blank=True)),
+                ('seconds', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('image_hash', 'language'), name='uniq_ocr_page_cache_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:48
+
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('documents', '0008_ocrpagecache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='centroid',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=384, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='document',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['centroid'], m=16, name='document_centroid_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:50
+
+import django.db.models.deletion
+import pgvector.django.vector
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_inline_version(apps, schema_editor):
+    # Các vector hiện có trong DocumentChunk.embedding là version đầu tiên, đang active
+    EmbeddingVersion = apps.get_model('documents', 'EmbeddingVersion')
+    EmbeddingVersion.objects.get_or_create(
+        name='v1',
+        defaults={
+            'model_name': settings.EMBEDDING_MODEL_NAME,
+            'dimensions': 384,
+            'inline': True,
+            'status': 'active',
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_document_centroid'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('model_name', models.CharField(max_length=100)),
+                ('backend', models.CharField(blank=True, max_length=50)),
+                ('dimensions', models.PositiveIntegerField()),
+                ('inline', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('backfilling', 'Backfilling'), ('ready', 'Ready'), ('active', 'Active'), ('retired', 'Retired')], default='backfilling', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('status',), name='single_active_embedding_version')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentChunkEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('embedding', pgvector.django.vector.VectorField()),
+                ('chunk', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='version_embeddings', to='documents.documentchunk')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='documents.document')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunk_embeddings', to='documents.embeddingversion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('version', 'chunk'), name='uniq_chunk_embedding_version')],
+            },
+        ),
+        migrations.RunPython(create_inline_version, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 import uuid
 from django.db import models
 from django.conf import settings
-from pgvector.django import VectorField
+from django.utils import timezone
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from pgvector.django import HnswIndex, VectorField
 
 # Create your models here.
 class Document(models.Model):
@@ -20,8 +23,27 @@ class Document(models.Model):
     mime_type = models.CharField(max_length=100)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     processing_error = models.TextField(blank=True, null=True)
+    # Stage cuối cùng của pipeline đã xong (extracted/chunked/persisted), dùng để resume khi retry
+    processing_stage = models.CharField(max_length=20, blank=True, default='')
+    tags = ArrayField(models.CharField(max_length=50), default=list, blank=True)
+    # Trung bình các vector chunk (đã chuẩn hoá), dùng để chọn tài liệu trước khi tìm chunk
+    centroid = VectorField(dimensions=384, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Lọc tài liệu theo user + trạng thái + khoảng thời gian khi chat
+            models.Index(fields=['user', 'status', 'created_at'], name='document_user_status_created'),
+            GinIndex(fields=['tags'], name='document_tags_gin'),
+            HnswIndex(
+                name='document_centroid_hnsw',
+                fields=['centroid'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
     
     def __str__(self):
         return f"{self.file_name} ({self.status}) by {self.user.username}"
@@ -29,10 +51,116 @@ class Document(models.Model):
 class DocumentChunk(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     document = models.ForeignKey(Document, related_name='chunks', on_delete=models.CASCADE)
+    # Chủ sở hữu (trùng document.user), là khoá partition khi bảng chunk được partition theo user
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='document_chunks', on_delete=models.CASCADE)
     content = models.TextField()
     embedding = VectorField(dimensions=384, null=True, blank=True) 
     page_number = models.IntegerField(null=True, blank=True)
+    # Thứ tự chunk trong tài liệu và vị trí ký tự trong văn bản đã trích xuất,
+    # dùng để lấy các chunk lân cận khi trả lời
+    chunk_index = models.IntegerField(null=True, blank=True)
+    char_start = models.IntegerField(null=True, blank=True)
+    char_end = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['document', 'chunk_index'], name='documentchunk_doc_index'),
+            HnswIndex(
+                name='documentchunk_embedding_hnsw',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
     
     def __str__(self):
-        return f"Chunk {self.id} for document {self.document.file_name}"
\ No newline at end of file
+        return f"Chunk {self.id} for document {self.document.file_name}"
+
+class EmbeddingCache(models.Model):
+    """Cache embedding theo (model, SHA-1 của chunk đã chuẩn hoá) để không encode lại nội dung lặp."""
+    model_name = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=40)
+    embedding = VectorField()
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_name', 'text_hash'], name='uniq_embedding_cache_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name}:{self.text_hash}"
+
+
+class OcrPageCache(models.Model):
+    """Kết quả OCR theo SHA-1 của ảnh trang đã render, để xử lý lại tài liệu không phải OCR lại."""
+    image_hash = models.CharField(max_length=40)
+    language = models.CharField(max_length=50)
+    text = models.TextField(blank=True)
+    seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['image_hash', 'language'], name='uniq_ocr_page_cache_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.language}:{self.image_hash}"
+
+
+class EmbeddingVersion(models.Model):
+    """
+    Một không gian embedding (model + backend). Version 'inline' dùng cột DocumentChunk.embedding
+    và backend cấu hình trong settings; các version khác lưu vector trong DocumentChunkEmbedding
+    để có thể backfill model mới song song rồi chuyển retrieval sang nguyên tử.
+    """
+    STATUS_CHOICES = [
+        ('backfilling', 'Backfilling'),
+        ('ready', 'Ready'),
+        ('active', 'Active'),
+        ('retired', 'Retired'),
+    ]
+
+    name = models.CharField(max_length=50, unique=True)
+    model_name = models.CharField(max_length=100)
+    # Trống = backend theo settings.EMBEDDING_BACKEND
+    backend = models.CharField(max_length=50, blank=True)
+    dimensions = models.PositiveIntegerField()
+    inline = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='backfilling')
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['status'], condition=models.Q(status='active'), name='single_active_embedding_version',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.model_name}, {self.status})"
+
+
+class DocumentChunkEmbedding(models.Model):
+    """Vector của một chunk trong một EmbeddingVersion không phải inline."""
+    # Không tạo FK constraint: bảng chunk có thể đã được partition (khoá chính gồm cả user_id)
+    chunk = models.ForeignKey(DocumentChunk, related_name='version_embeddings', on_delete=models.CASCADE, db_constraint=False)
+    version = models.ForeignKey(EmbeddingVersion, related_name='chunk_embeddings', on_delete=models.CASCADE)
+    # Sao chép từ chunk để lọc theo phạm vi tài liệu mà không cần join
+    document = models.ForeignKey(Document, related_name='+', on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    # Không cố định số chiều; HNSW index riêng cho từng version (xem embedding_versions.create_version_index)
+    embedding = VectorField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['version', 'chunk'], name='uniq_chunk_embedding_version'),
+        ]
+
+    def __str__(self):
+        return f"Embedding of chunk {self.chunk_id} ({self.version_id})"
@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from core.metrics import record_ocr_page
+from .models import OcrPageCache
+
+logger = logging.getLogger(__name__)
+
+_tesseract_path = None
+
+
+def ocr_available():
+    """OCR chỉ chạy khi OCR_ENABLED và có binary tesseract trên máy."""
+    global _tesseract_path
+    if not settings.OCR_ENABLED:
+        return False
+    if _tesseract_path is None:
+        _tesseract_path = shutil.which(settings.OCR_TESSERACT_CMD) or ''
+        if not _tesseract_path:
+            logger.warning(f"OCR disabled: '{settings.OCR_TESSERACT_CMD}' not found on PATH.")
+    return bool(_tesseract_path)
+
+
+def page_needs_ocr(page, text):
+    """Trang gần như không có text nhưng có ảnh (trang scan)."""
+    return len(text.strip()) < settings.OCR_MIN_TEXT_CHARS and bool(page.get_images(full=False))
+
+
+def render_page(page, dpi):
+    """Render trang thành PNG grayscale; tesseract không cần màu và ảnh nhỏ hơn 3 lần."""
+    import fitz
+    return page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes('png')
+
+
+def run_tesseract(image, language, dpi):
+    """
+    Gọi tesseract qua subprocess (stdin -> stdout). Mỗi lần gọi là một process riêng
+    nên chạy song song bằng thread là đủ; OMP_THREAD_LIMIT=1 để các process không tranh CPU.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [_tesseract_path or settings.OCR_TESSERACT_CMD, 'stdin', 'stdout', '-l', language, '--dpi', str(dpi)],
+        input=image,
+        capture_output=True,
+        timeout=settings.OCR_PAGE_TIMEOUT,
+        env={**os.environ, 'OMP_THREAD_LIMIT': '1'},
+        check=True,
+    )
+    return result.stdout.decode('utf-8', errors='replace'), time.perf_counter() - start
+
+
+def _cached_texts(hashes, language):
+    return dict(
+        OcrPageCache.objects.filter(image_hash__in=hashes, language=language)
+        .values_list('image_hash', 'text')
+    )
+
+
+def ocr_pages(pages, dpi=None, language=None, workers=None):
+    """
+    OCR các trang (index, fitz.Page) song song, trả về {index: text}.
+    Trang được render tuần tự (PyMuPDF không thread-safe) và đưa vào pool ngay,
+    số ảnh đang chờ bị giới hạn để PDF scan dài không chiếm quá nhiều RAM.
+    Trang đã có trong OcrPageCache (cùng ảnh, cùng ngôn ngữ) không OCR lại.
+    """
+    dpi = dpi or settings.OCR_DPI
+    language = language or settings.OCR_LANGUAGES
+    workers = workers or settings.OCR_WORKERS
+
+    results = {}
+    total_seconds = 0.0
+    new_entries = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr') as executor:
+        in_flight = {}
+
+        def collect(done):
+            nonlocal total_seconds
+            for future in done:
+                index, image_hash = in_flight.pop(future)
+                try:
+                    text, seconds = future.result()
+                except Exception as e:
+                    logger.warning(f"OCR failed for page {index + 1}: {e}")
+                    record_ocr_page('failed')
+                    continue
+                results[index] = text
+                total_seconds += seconds
+                record_ocr_page('ocr', seconds)
+                new_entries.append(OcrPageCache(image_hash=image_hash, language=language, text=text, seconds=seconds))
+
+        # Tra cache theo từng nhóm trang để không phải render toàn bộ tài liệu trước
+        group_size = workers * 4
+        for start in range(0, len(pages), group_size):
+            rendered = []
+            for index, page in pages[start:start + group_size]:
+                image = render_page(page, dpi)
+                rendered.append((index, image, hashlib.sha1(image).hexdigest()))
+            cached = _cached_texts([h for _, _, h in rendered], language)
+
+            for index, image, image_hash in rendered:
+                if image_hash in cached:
+                    results[index] = cached[image_hash]
+                    record_ocr_page('cache_hit')
+                    continue
+                if len(in_flight) >= workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(run_tesseract, image, language, dpi)] = (index, image_hash)
+            del rendered
+
+        collect(wait(in_flight).done)
+
+    if new_entries:
+        OcrPageCache.objects.bulk_create(new_entries, ignore_conflicts=True)
+    logger.info(
+        f"OCR processed {len(pages)} pages ({len(new_entries)} new, "
+        f"{len(pages) - len(new_entries)} cached/failed) in {total_seconds:.1f}s of tesseract time"
+    )
+    return results
@@ -4,13 +4,13 @@ from .models import Document
 class DocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
-        fields = ['id', 'file_name', 'file_size', 'mime_type', 'status', 'created_at']
+        fields = ['id', 'file_name', 'file_size', 'mime_type', 'status', 'tags', 'created_at']
         read_only_fields = fields
         
 class DocumentUploadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Document
-        fields = ['file']
+        fields = ['file', 'tags']
 
     def validate_file(self, value):
         # Kiểm tra định dạng file (ví dụ: pdf, docx, txt)
@@ -1,162 +1,441 @@
 import logging
-import io
-import fitz  # PyMuPDF
-import docx
-from celery import shared_task
+import re
+import time
+import numpy as np
+from celery import Task, chain, chord, shared_task
 from django.db import transaction
 from datetime import timedelta
 from django.utils import timezone
-from .models import Document, DocumentChunk
-from sentence_transformers import SentenceTransformer
+from . import checkpoints
+from .bulk_insert import bulk_insert_chunks
+from .models import Document, DocumentChunk, DocumentChunkEmbedding
+from .embeddings import get_embedding_backend
+from .embedding_versions import backend_for, write_versions
+from .embedding_cache import CacheStats, cache_enabled, encode_with_cache, prune_cache
+from .docx_extract import iter_docx_blocks
+from .ocr import ocr_available, ocr_pages, page_needs_ocr
+from core.metrics import stage, record_document, record_chunks, record_embedding_batch, record_embedding_cache
+from core.db_router import mark_recent_write
 
 # Khởi tạo logger
 logger = logging.getLogger(__name__)
 
-try:
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    logger.info("SentenceTransformer model 'all-MiniLM-L6-v2' loaded successfully.")
-except Exception as e:
-    logger.error(f"Failed to load SentenceTransformer model: {e}")
-    embedding_model = None
+# Số chunk encode trong một lần gọi model
+EMBEDDING_BATCH_SIZE = 64
+
+WORD_RE = re.compile(r'\S+')
     
     
-def extract_text_from_pdf(file_bytes):
-    """Trích xuất văn bản từ file PDF."""
-    text = ""
+def extract_text_from_pdf(file_bytes, ocr=True):
+    """
+    Trích xuất văn bản từ file PDF. Trang scan (không có text) được OCR bằng
+    Tesseract nếu có, các trang còn lại dùng text layer như cũ.
+    """
+    import fitz  # PyMuPDF: chỉ worker ingest cần, không import khi web/beat nạp module task
     with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-        for page in doc:
-            text += page.get_text()
-    return text
+        page_texts = []
+        scanned_pages = []
+        for index, page in enumerate(doc):
+            page_text = page.get_text()
+            page_texts.append(page_text)
+            if ocr and page_needs_ocr(page, page_text):
+                scanned_pages.append((index, page))
+
+        if scanned_pages and ocr_available():
+            logger.info(f"Running OCR on {len(scanned_pages)}/{len(page_texts)} pages without a text layer.")
+            with stage('ingestion', 'ocr'):
+                for index, page_text in ocr_pages(scanned_pages).items():
+                    page_texts[index] = page_text
+    return "".join(page_texts)
 
 def extract_text_from_docx(file_bytes):
-    """Trích xuất văn bản từ file DOCX."""
-    text = ""
-    doc = docx.Document(io.BytesIO(file_bytes))
-    for para in doc.paragraphs:
-        text += para.text + "\n"
-    return text
+    """
+    Trích xuất văn bản từ file DOCX bằng cách đọc luồng XML (gồm cả bảng, header/footer),
+    mỗi khối một dòng kèm nhãn cấu trúc (# heading, | dòng bảng |, - mục list).
+    """
+    return "\n".join(block.render() for block in iter_docx_blocks(file_bytes)) + "\n"
 
 
-def chunk_text(text, chunk_size=500, chunk_overlap=50):
-    """Chia văn bản thành các đoạn nhỏ (chunks)."""
-    # Một phương pháp chia đơn giản, có thể cải tiến sau
-    words = text.split()
+def chunk_text_with_offsets(text, chunk_size=500, chunk_overlap=50):
+    """
+    Chia văn bản thành các chunk theo số từ, kèm vị trí ký tự trong văn bản gốc.
+    Trả về list dict {'content', 'char_start', 'char_end'} theo thứ tự chunk_index.
+    """
+    spans = [m.span() for m in WORD_RE.finditer(text)]
     chunks = []
-    for i in range(0, len(words), chunk_size - chunk_overlap):
-        chunk = " ".join(words[i:i + chunk_size])
-        chunks.append(chunk)
+    for i in range(0, len(spans), chunk_size - chunk_overlap):
+        window = spans[i:i + chunk_size]
+        chunks.append({
+            'content': " ".join(text[start:end] for start, end in window),
+            'char_start': window[0][0],
+            'char_end': window[-1][1],
+        })
     return chunks
 
 
-@shared_task(name="process_document")
-def process_document(document_id):
+def chunk_text(text, chunk_size=500, chunk_overlap=50):
+    """Chia văn bản thành các đoạn nhỏ (chunks)."""
+    return [c['content'] for c in chunk_text_with_offsets(text, chunk_size, chunk_overlap)]
+
+
+def embed_chunks(text_chunks, batch_size=EMBEDDING_BATCH_SIZE, backend=None):
     """
-    Task xử lý tài liệu: Tải file, trích xuất text, chia chunks, tạo embedding và lưu vào DB.
+    Tạo embeddings theo từng batch. Mỗi batch được tra trong EmbeddingCache
+    trước, model chỉ chạy trên các chunk chưa có trong cache.
+    Trả về (embeddings, CacheStats).
     """
-    if not embedding_model:
-        logger.error("Embedding model is not available. Aborting task.")
-        # Cập nhật trạng thái lỗi cho document
-        Document.objects.filter(id=document_id).update(
-            status='failed',
-            processing_error="Embedding model could not be loaded."
-        )
-        return
+    backend = backend or get_embedding_backend()
 
-    try:
-        document = Document.objects.get(id=document_id)
-    except Document.DoesNotExist:
-        logger.error(f"Document with id {document_id} not found.")
+    def encode_batch(batch):
+        start = time.perf_counter()
+        vectors = backend.encode(batch)
+        record_embedding_batch(time.perf_counter() - start, len(batch))
+        return vectors
+
+    stats = CacheStats()
+    batches = []
+    for i in range(0, len(text_chunks), batch_size):
+        batch = text_chunks[i:i + batch_size]
+        if cache_enabled():
+            vectors, _ = encode_with_cache(batch, encode_batch, backend.cache_key, stats)
+        else:
+            vectors = encode_batch(batch)
+            stats.misses += len(batch)
+        batches.append(vectors)
+    if not batches:
+        return np.empty((0, backend.dimensions), dtype=np.float32), stats
+    return np.vstack(batches), stats
+
+
+def document_centroid(embeddings):
+    """Vector đại diện tài liệu: trung bình các vector chunk đã chuẩn hoá, rồi chuẩn hoá lại."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if not len(embeddings):
+        return None
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    mean = (embeddings / np.maximum(norms, 1e-12)).mean(axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm > 0 else None
+
+
+class DocumentPipelineTask(Task):
+    """Base task cho các stage: khi hết lượt retry thì đánh dấu tài liệu 'failed'."""
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        mark_document_failed(kwargs.get('document_id'), exc)
+
+
+# acks_late + prefetch 1 (xem settings) để task CPU dài không bị mất khi worker chết;
+# lỗi dữ liệu (ValueError) không retry, lỗi tạm thời thì retry với backoff.
+PIPELINE_TASK_OPTIONS = dict(
+    bind=True,
+    base=DocumentPipelineTask,
+    acks_late=True,
+    autoretry_for=(Exception,),
+    dont_autoretry_for=(ValueError,),
+    retry_backoff=10,
+    retry_backoff_max=600,
+    retry_jitter=True,
+    max_retries=3,
+)
+
+
+def mark_document_failed(document_id, error):
+    if document_id is None:
         return
+    logger.error(f"Error processing document {document_id}: {error}")
+    # Giữ lại checkpoints để lần chạy lại tiếp tục từ stage cuối cùng đã xong
+    Document.objects.filter(id=document_id).update(status='failed', processing_error=str(error))
+    record_document('failed')
 
-    logger.info(f"Starting processing for document: {document.file_name} (ID: {document_id})")
 
-    try:
-        # Cập nhật trạng thái sang 'processing'
-        document.status = 'processing'
-        document.save()
+def _set_stage(document_id, processing_stage):
+    Document.objects.filter(id=document_id).update(processing_stage=processing_stage)
+
 
-        # Tải nội dung file từ MinIO
+def extract_text(mime_type, file_content):
+    """Trích xuất văn bản theo mime type."""
+    if mime_type == 'application/pdf':
+        return extract_text_from_pdf(file_content)
+    if mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
+        return extract_text_from_docx(file_content)
+    if mime_type == 'text/plain':
+        return file_content.decode('utf-8')
+    raise ValueError(f"Unsupported mime type: {mime_type}")
+
+
+def run_extract_stage(document):
+    """Stage 1: tải file từ MinIO và trích xuất văn bản."""
+    if checkpoints.has_text(document.id):
+        logger.info(f"Resuming document {document.id}: text already extracted.")
+        return
+
+    with stage('ingestion', 'download'):
         file_content = document.file.read()
 
-        # 1. Trích xuất văn bản (Text Extraction)
-        text = ""
-        if document.mime_type == 'application/pdf':
-            text = extract_text_from_pdf(file_content)
-        elif document.mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            text = extract_text_from_docx(file_content)
-        elif document.mime_type == 'text/plain':
-            text = file_content.decode('utf-8')
-        else:
-            raise ValueError(f"Unsupported mime type: {document.mime_type}")
-
-        if not text.strip():
-            raise ValueError("No text could be extracted from the document.")
-
-        # 2. Chia thành các đoạn nhỏ (Chunking)
-        text_chunks = chunk_text(text)
-        logger.info(f"Document chunked into {len(text_chunks)} pieces.")
-
-        # 3. Tạo Embeddings
-        embeddings = embedding_model.encode(text_chunks, show_progress_bar=False)
-
-        # 4. Lưu Chunks và Embeddings vào DB
-        # Sử dụng transaction để đảm bảo toàn vẹn dữ liệu
-        with transaction.atomic():
-            # Xóa các chunk cũ nếu có (trường hợp re-process)
-            DocumentChunk.objects.filter(document=document).delete()
-            
-            chunks_to_create = []
-            for i, chunk_content in enumerate(text_chunks):
-                chunk_embedding = embeddings[i]
-                chunks_to_create.append(
-                    DocumentChunk(
-                        document=document,
-                        content=chunk_content,
-                        embedding=chunk_embedding
-                    )
-                )
-            
-            DocumentChunk.objects.bulk_create(chunks_to_create, batch_size=500)
-            logger.info(f"Successfully created {len(chunks_to_create)} chunks for document {document.id}")
+    with stage('ingestion', 'extract'):
+        text = extract_text(document.mime_type, file_content)
+
+    if not text.strip():
+        raise ValueError("No text could be extracted from the document.")
+
+    checkpoints.save_text(document.id, text)
+    _set_stage(document.id, 'extracted')
+
+
+def run_chunk_stage(document_id):
+    """Stage 2: chia văn bản thành chunks, lưu theo từng batch embedding."""
+    if checkpoints.has_chunks(document_id):
+        logger.info(f"Resuming document {document_id}: chunks already stored.")
+        return checkpoints.load_chunk_manifest(document_id)
+
+    text = checkpoints.load_text(document_id)
+    with stage('ingestion', 'chunk'):
+        text_chunks = chunk_text_with_offsets(text)
+    logger.info(f"Document chunked into {len(text_chunks)} pieces.")
+
+    manifest = checkpoints.save_chunks(document_id, text_chunks, EMBEDDING_BATCH_SIZE)
+    _set_stage(document_id, 'chunked')
+    return manifest
+
+
+def run_embed_batch(document_id, batch_index, backend=None):
+    """
+    Stage 3 (fan-out): tạo embeddings cho một batch chunks. Khi đang migrate sang
+    model mới (reembed_corpus), batch cũng được encode cho các version đó (dual-write)
+    để chunk mới không bị thiếu vector sau cutover.
+    """
+    pending_versions = [
+        version for version in write_versions()
+        if not checkpoints.has_embedding_batch(document_id, batch_index, version.pk)
+    ]
+    resumed = checkpoints.has_embedding_batch(document_id, batch_index)
+    if resumed and not pending_versions:
+        return {'batch': batch_index, 'hits': 0, 'misses': 0, 'resumed': True}
+
+    text_chunks = [c['content'] for c in checkpoints.load_chunk_batch(document_id, batch_index)]
+    result = {'batch': batch_index, 'hits': 0, 'misses': 0, 'resumed': resumed}
+    if not resumed:
+        backend = backend or get_embedding_backend()
+        if not backend:
+            raise RuntimeError("Embedding model could not be loaded.")
+        with stage('ingestion', 'embed'):
+            embeddings, cache_stats = embed_chunks(text_chunks, backend=backend)
+        checkpoints.save_embedding_batch(document_id, batch_index, embeddings)
+        result.update(hits=cache_stats.hits, misses=cache_stats.misses)
+
+    for version in pending_versions:
+        with stage('ingestion', 'embed'):
+            embeddings, _ = embed_chunks(text_chunks, backend=backend_for(version))
+        checkpoints.save_embedding_batch(document_id, batch_index, embeddings, version.pk)
+    return result
+
+
+def _version_embeddings(document, manifest, chunk_ids):
+    """Dòng DocumentChunkEmbedding cho các version đang nhận dual-write (có đủ checkpoint)."""
+    rows = []
+    for version in write_versions():
+        batches = range(manifest['batches'])
+        if not all(checkpoints.has_embedding_batch(document.id, i, version.pk) for i in batches):
+            # Version tạo ra giữa chừng: reembed_corpus sẽ bổ sung các chunk này
+            continue
+        embeddings = np.vstack([checkpoints.load_embedding_batch(document.id, i, version.pk) for i in batches])
+        rows.extend(
+            DocumentChunkEmbedding(
+                chunk_id=chunk_id, document_id=document.id, user_id=document.user_id,
+                version=version, embedding=embeddings[i],
+            )
+            for i, chunk_id in enumerate(chunk_ids)
+        )
+    return rows
+
+
+def run_persist_stage(document, batch_results):
+    """Stage 4: ghi toàn bộ chunks + embeddings vào DB trong một transaction."""
+    manifest = checkpoints.load_chunk_manifest(document.id)
+    text_chunks = checkpoints.load_chunks(document.id)
+    embeddings = np.vstack([
+        checkpoints.load_embedding_batch(document.id, i) for i in range(manifest['batches'])
+    ])
+
+    hits = sum(r['hits'] for r in batch_results)
+    misses = sum(r['misses'] for r in batch_results)
+    record_embedding_cache(hits, misses)
+    if hits + misses:
+        logger.info(
+            f"Embedding cache hit ratio for document {document.id}: "
+            f"{hits / (hits + misses):.1%} ({hits}/{hits + misses})"
+        )
+
+    # Sử dụng transaction để đảm bảo toàn vẹn dữ liệu
+    with stage('ingestion', 'db_write'), transaction.atomic():
+        # Xóa các chunk cũ nếu có (trường hợp re-process)
+        DocumentChunk.objects.filter(user_id=document.user_id, document=document).delete()
+
+        # COPY BINARY trực tiếp từ buffer embedding trên PostgreSQL, bulk_create trên backend khác
+        chunk_ids = bulk_insert_chunks(document, text_chunks, embeddings)
+        DocumentChunkEmbedding.objects.bulk_create(_version_embeddings(document, manifest, chunk_ids), batch_size=500)
+        created = len(chunk_ids)
+        logger.info(f"Successfully created {created} chunks for document {document.id}")
 
         # Cập nhật trạng thái 'completed'
         document.status = 'completed'
+        document.processing_stage = 'persisted'
         document.processing_error = None
-        document.save()
-        logger.info(f"Successfully processed document: {document.file_name}")
+        document.centroid = document_centroid(embeddings)
+        document.save(update_fields=['status', 'processing_stage', 'processing_error', 'centroid', 'updated_at'])
+
+    # Chunk mới có thể chưa kịp replicate: chat của user đọc từ primary một lúc
+    mark_recent_write(document.user_id)
+    record_document('completed')
+    record_chunks(created)
+    checkpoints.clear(document.id)
+    logger.info(f"Successfully processed document: {document.file_name}")
+
+
+def _get_document(document_id):
+    try:
+        return Document.objects.get(id=document_id)
+    except Document.DoesNotExist:
+        logger.error(f"Document with id {document_id} not found.")
+        return None
+
+
+@shared_task(name="process_document")
+def process_document(document_id):
+    """
+    Task điều phối: extract -> chunk -> embed (chord theo batch) -> persist.
+    Mỗi stage là một task riêng, có retry và checkpoint trong object storage.
+    """
+    document_id = str(document_id)
+    if not Document.objects.filter(id=document_id).update(status='processing', processing_error=None):
+        logger.error(f"Document with id {document_id} not found.")
+        return
+
+    logger.info(f"Starting processing pipeline for document {document_id}")
+    chain(
+        extract_document_text.si(document_id=document_id),
+        chunk_document.si(document_id=document_id),
+        embed_document.si(document_id=document_id),
+    ).apply_async()
+
+
+@shared_task(name="documents.tasks.extract_document_text", **PIPELINE_TASK_OPTIONS)
+def extract_document_text(self, document_id):
+    document = _get_document(document_id)
+    if document is None:
+        # Tài liệu đã bị xoá: dừng chain, không chạy tiếp chunk/embed trên checkpoint không tồn tại
+        self.request.chain = None
+        return
+    run_extract_stage(document)
+
+
+@shared_task(name="documents.tasks.chunk_document", **PIPELINE_TASK_OPTIONS)
+def chunk_document(self, document_id):
+    run_chunk_stage(document_id)
+
 
+@shared_task(name="documents.tasks.embed_document", **PIPELINE_TASK_OPTIONS)
+def embed_document(self, document_id):
+    """Fan-out: mỗi batch chunks một task embed, gom lại bằng chord rồi persist."""
+    manifest = checkpoints.load_chunk_manifest(document_id)
+    header = [
+        embed_chunk_batch.si(document_id=document_id, batch_index=i)
+        for i in range(manifest['batches'])
+    ]
+    return self.replace(chord(header, persist_document_chunks.s(document_id=document_id)))
+
+
+@shared_task(name="documents.tasks.embed_chunk_batch", **PIPELINE_TASK_OPTIONS)
+def embed_chunk_batch(self, document_id, batch_index):
+    return run_embed_batch(document_id, batch_index)
+
+
+@shared_task(name="documents.tasks.persist_document_chunks", **PIPELINE_TASK_OPTIONS)
+def persist_document_chunks(self, batch_results, document_id):
+    document = _get_document(document_id)
+    if document:
+        run_persist_stage(document, batch_results)
+
+
+def process_document_inline(document_id, backend=None):
+    """Chạy toàn bộ pipeline tuần tự trong process hiện tại (benchmark, debug)."""
+    document = _get_document(document_id)
+    if not document:
+        return
+    document.status = 'processing'
+    document.save(update_fields=['status', 'updated_at'])
+    try:
+        run_extract_stage(document)
+        manifest = run_chunk_stage(document.id)
+        results = [run_embed_batch(document.id, i, backend) for i in range(manifest['batches'])]
+        run_persist_stage(document, results)
     except Exception as e:
         logger.error(f"Error processing document {document.id}: {e}", exc_info=True)
-        # Cập nhật trạng thái 'failed' và lưu lỗi
-        document.status = 'failed'
-        document.processing_error = str(e)
-        document.save()
+        mark_document_failed(document.id, e)
         
         
 @shared_task(name="documents.tasks.cleanup_old_failed_documents")
-def cleanup_old_failed_documents(days_old = 30):
+def cleanup_old_failed_documents(days_old=30):
+    """Xoá tài liệu lỗi quá days_old ngày cùng chunk, file và checkpoint (theo batch, xem maintenance.purge_documents)."""
+    from .maintenance import purge_documents
     logger.info(f"Starting cleanup task for failed documents older than {days_old} days.")
-    
+
     time_threshold = timezone.now() - timedelta(days=days_old)
-    old_failed_docs = Document.objects.filter(
-        status='failed',
-        updated_at__lt=time_threshold
-    )
-    count = old_failed_docs.count()
-    
-    if count > 0:
-        for doc in old_failed_docs:
-            try:
-                doc.file.delete(save=False)
-                logger.info(f"Deleted file {doc.file_name} from storage.")
-            except Exception as e:
-                logger.error(f"Could not delete file for document {doc.id}: {e}")
-
-        # Xóa bản ghi trong database
-        old_failed_docs.delete()
-        logger.info(f"Successfully cleaned up {count} old failed document records.")
-    else:
-        logger.info("No old failed documents to clean up.")
-    
-    logger.info(f"Cleaned up {count} old failed documents.")
-    return f"Cleaned up {count} documents."
\ No newline at end of file
+    old_failed_docs = Document.objects.filter(status='failed', updated_at__lt=time_threshold)
+    documents, chunks, files = purge_documents(old_failed_docs)
+
+    logger.info(f"Cleaned up {documents} old failed documents ({chunks} chunks, {files} files).")
+    return f"Cleaned up {documents} documents."
+
+
+@shared_task(name="documents.tasks.reconcile_storage")
+def reconcile_storage(dry_run=False):
+    """Xoá file và checkpoint trong bucket không còn Document tương ứng."""
+    from .maintenance import reconcile_storage_orphans
+    files, checkpoint_prefixes = reconcile_storage_orphans(dry_run=dry_run)
+    return f"Removed {files} orphaned files and {checkpoint_prefixes} checkpoint prefixes."
+
+
+@shared_task(name="documents.tasks.vacuum_vector_tables")
+def vacuum_vector_tables():
+    from .maintenance import vacuum_vector_tables as vacuum
+    tables = vacuum()
+    return f"Vacuumed {len(tables)} tables."
+
+
+@shared_task(name="documents.tasks.sample_vector_recall")
+def sample_vector_recall():
+    """Đo recall của HNSW index; index bị giảm chất lượng được đánh dấu để reindex."""
+    from .maintenance import sample_vector_recall as sample
+    return {label: recall for label, recall in sample().items() if recall is not None}
+
+
+@shared_task(name="documents.tasks.reindex_vector_indexes")
+def reindex_vector_indexes(force=False):
+    from .maintenance import reindex_vector_indexes as reindex
+    indexes = reindex(force=force)
+    return f"Rebuilt {len(indexes)} HNSW indexes."
+
+
+@shared_task(name="documents.tasks.prune_embedding_cache")
+def prune_embedding_cache(max_entries=None):
+    """Giới hạn kích thước EmbeddingCache, xoá các entry lâu không dùng nhất."""
+    from django.conf import settings
+    if max_entries is None:
+        max_entries = settings.EMBEDDING_CACHE_MAX_ENTRIES
+    deleted = prune_cache(max_entries)
+    return f"Pruned {deleted} embedding cache entries."
+
+
+@shared_task(name="documents.tasks.reembed_chunks", bind=True, acks_late=True, autoretry_for=(Exception,),
+             retry_backoff=10, retry_backoff_max=600, max_retries=3)
+def reembed_chunks(self, version_id, chunk_ids):
+    """Encode một batch chunk đã lưu cho version embedding mới (do reembed_corpus phân phối)."""
+    from .embedding_versions import reembed_chunk_batch
+    from .models import EmbeddingVersion
+
+    version = EmbeddingVersion.objects.filter(id=version_id).exclude(status='retired').first()
+    if version is None:
+        return 0
+    return reembed_chunk_batch(version, chunk_ids)
@@ -1,3 +1,345 @@
-from django.test import TestCase
+import importlib.util
+import io
+import os
+import re
+import struct
+import subprocess
+import sys
+import unittest
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from . import bulk_insert, checkpoints, tasks
+from .docx_extract import iter_docx_blocks
+from .embedding_server import MicroBatcher
+from .embeddings import OnnxBackend, SentenceTransformerBackend
+
+PARITY_SENTENCES = [
+    "Điều 12: Nhân viên có quyền đơn phương chấm dứt hợp đồng với điều kiện báo trước 30 ngày.",
+    "The supplier shall deliver the goods within fourteen days of the purchase order.",
+    "Quarterly revenue grew 12% compared with the same period last year.",
+    "Bảo mật thông tin khách hàng là nghĩa vụ của tất cả các bên.",
+    "short",
+]
+
+# Những gì web và beat import khi khởi động: URLconf (kéo theo view, service, module task) và module task
+STARTUP_CODE = (
+    "import django; django.setup(); import core.urls; "
+    "from core.celery import app; app.loader.import_default_modules()"
+)
+# Chỉ worker cần; phải được import trong hàm dùng chúng
+HEAVY_MODULES = (
+    'torch', 'sentence_transformers', 'transformers', 'onnxruntime', 'fitz', 'pymupdf', 'docx', 'openai',
+    'drf_yasg.views',
+)
+# Giới hạn thời gian import (giây); phụ thuộc tốc độ máy nên chỉ kiểm tra khi được đặt
+STARTUP_IMPORT_BUDGET = os.environ.get('STARTUP_IMPORT_BUDGET')
+IMPORTTIME_RE = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)')
+IN_MEMORY_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@unittest.skipUnless(importlib.util.find_spec('onnxruntime'), "onnxruntime is not installed")
+class OnnxBackendParityTests(SimpleTestCase):
+    """ONNX int8 phải cho embedding gần như trùng với PyTorch fp32."""
+    model_name = 'all-MiniLM-L6-v2'
+    min_cosine = 0.98
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            cls.reference = SentenceTransformerBackend(cls.model_name)
+            cls.onnx = OnnxBackend(cls.model_name)
+        except Exception as e:  # không tải được model (ví dụ môi trường offline)
+            raise unittest.SkipTest(f"Embedding model unavailable: {e}")
+
+    def test_cosine_agreement(self):
+        expected = self.reference.encode(PARITY_SENTENCES)
+        actual = self.onnx.encode(PARITY_SENTENCES)
+        self.assertEqual(actual.shape, expected.shape)
+        cosine = (expected * actual).sum(axis=1)
+        self.assertGreaterEqual(cosine.min(), self.min_cosine, f"cosine per sentence: {np.round(cosine, 4)}")
+
+    def test_ranking_preserved(self):
+        query = "thời hạn báo trước khi nghỉ việc"
+        corpus_ref = self.reference.encode(PARITY_SENTENCES)
+        corpus_onnx = self.onnx.encode(PARITY_SENTENCES)
+        top_ref = np.argmax(corpus_ref @ self.reference.encode_query(query))
+        top_onnx = np.argmax(corpus_onnx @ self.onnx.encode_query(query))
+        self.assertEqual(top_ref, top_onnx)
+
+
+class StartupImportTests(SimpleTestCase):
+    """Khởi động web/beat (đo bằng python -X importtime) không được kéo theo stack ML."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_CODE],
+            cwd=settings.BASE_DIR, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'core.settings'},
+            capture_output=True, text=True, timeout=300,
+        )
+        if result.returncode != 0:
+            raise AssertionError(f"Startup import failed:\n{result.stderr[-2000:]}")
+        cls.modules = {}
+        cls.total = 0
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                cumulative, indent, name = int(match.group(1)), match.group(2), match.group(3)
+                cls.modules[name] = cumulative
+                if len(indent) == 1:
+                    cls.total += cumulative / 1e6
+
+    def test_heavy_modules_not_imported(self):
+        imported = [name for name in HEAVY_MODULES if name in self.modules]
+        self.assertEqual(imported, [], f"Imported at startup: {imported}")
+
+    @unittest.skipUnless(STARTUP_IMPORT_BUDGET, "STARTUP_IMPORT_BUDGET is not set")
+    def test_import_time_budget(self):
+        slowest = sorted(self.modules.items(), key=lambda item: item[1], reverse=True)[:10]
+        self.assertLessEqual(
+            self.total, float(STARTUP_IMPORT_BUDGET),
+            f"Startup imports took {self.total:.2f}s; slowest (cumulative us): {slowest}",
+        )
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+@mock.patch.object(tasks, '_set_stage')
+@mock.patch.object(tasks, 'write_versions', return_value=[])
+class PipelineResumeTests(SimpleTestCase):
+    """Retry tiếp tục từ checkpoint của stage cuối cùng đã xong, không làm lại từ đầu."""
+    document_id = 'c0ffee00-0000-0000-0000-000000000001'
+
+    def setUp(self):
+        self.addCleanup(checkpoints.clear, self.document_id)
+
+    def test_extract_skipped_when_text_saved(self, write_versions, set_stage):
+        checkpoints.save_text(self.document_id, 'đã trích xuất')
+        document = SimpleNamespace(id=self.document_id, file=mock.Mock(), mime_type='text/plain')
+        tasks.run_extract_stage(document)
+        document.file.read.assert_not_called()
+        set_stage.assert_not_called()
+
+    def test_chunk_stage_uses_text_checkpoint(self, write_versions, set_stage):
+        checkpoints.save_text(self.document_id, ' '.join(f'w{i}' for i in range(1000)))
+        manifest = tasks.run_chunk_stage(self.document_id)
+        self.assertEqual(manifest['count'], 3)
+        set_stage.assert_called_once_with(self.document_id, 'chunked')
+
+        # Lần chạy lại đọc manifest đã lưu, không chunk lại
+        with mock.patch.object(tasks, 'chunk_text_with_offsets') as chunk:
+            self.assertEqual(tasks.run_chunk_stage(self.document_id), manifest)
+        chunk.assert_not_called()
+
+    def test_embed_batch_resumed(self, write_versions, set_stage):
+        checkpoints.save_chunks(self.document_id, [{'content': 'a'}, {'content': 'b'}], batch_size=1)
+        checkpoints.save_embedding_batch(self.document_id, 0, np.ones((1, 4)))
+        backend = mock.Mock(dimensions=4)
+        backend.encode.return_value = np.zeros((1, 4), dtype=np.float32)
+
+        with mock.patch.object(tasks, 'cache_enabled', return_value=False):
+            first = tasks.run_embed_batch(self.document_id, 0, backend)
+            second = tasks.run_embed_batch(self.document_id, 1, backend)
+
+        self.assertTrue(first['resumed'])
+        self.assertFalse(second['resumed'])
+        backend.encode.assert_called_once_with(['b'])
+        np.testing.assert_array_equal(checkpoints.load_embedding_batch(self.document_id, 0), np.ones((1, 4)))
+
+
+class PipelineFailureTests(SimpleTestCase):
+    def test_on_failure_marks_document_failed(self):
+        with mock.patch.object(tasks.Document, 'objects') as objects, mock.patch.object(tasks, 'record_document'):
+            tasks.chunk_document.on_failure(ValueError('hỏng'), 'task-id', (), {'document_id': 'doc-1'}, None)
+        objects.filter.assert_called_once_with(id='doc-1')
+        objects.filter.return_value.update.assert_called_once_with(status='failed', processing_error='hỏng')
+
+    def test_missing_document_stops_chain(self):
+        task = tasks.extract_document_text
+        task.push_request(chain=[{'task': 'documents.tasks.chunk_document'}])
+        self.addCleanup(task.pop_request)
+        with mock.patch.object(tasks, '_get_document', return_value=None), \
+                mock.patch.object(tasks, 'run_extract_stage') as extract:
+            task.run(document_id='doc-1')
+        extract.assert_not_called()
+        self.assertIsNone(task.request.chain)
+
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+DOCX_STYLES = f"""<w:styles xmlns:w="{W_NS}">
+<w:style w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>
+<w:style w:styleId="Sub"><w:name w:val="Subsection"/><w:pPr><w:outlineLvl w:val="1"/></w:pPr></w:style>
+<w:style w:styleId="Bullet"><w:name w:val="List Bullet"/><w:pPr><w:numPr/></w:pPr></w:style>
+</w:styles>"""
+
+
+def _p(text, style=None):
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{properties}<w:r><w:t>{text}</w:t></w:r></w:p>'
+
+
+def _table(*rows):
+    return '<w:tbl>' + ''.join(
+        '<w:tr>' + ''.join(f'<w:tc>{cell}</w:tc>' for cell in row) + '</w:tr>' for row in rows
+    ) + '</w:tbl>'
+
+
+def _docx(body, headers=(), footers=()):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('word/document.xml', f'<w:document xmlns:w="{W_NS}"><w:body>{body}</w:body></w:document>')
+        archive.writestr('word/styles.xml', DOCX_STYLES)
+        for i, text in enumerate(headers, 1):
+            archive.writestr(f'word/header{i}.xml', f'<w:hdr xmlns:w="{W_NS}">{_p(text)}</w:hdr>')
+        for i, text in enumerate(footers, 1):
+            archive.writestr(f'word/footer{i}.xml', f'<w:ftr xmlns:w="{W_NS}">{_p(text)}</w:ftr>')
+    return buffer.getvalue()
+
+
+def _blocks(file_bytes):
+    return [(block.kind, block.text, block.level) for block in iter_docx_blocks(file_bytes)]
+
+
+class DocxExtractTests(SimpleTestCase):
+    def test_headings_and_lists(self):
+        body = _p('Hợp đồng', 'Heading1') + _p('Điều khoản', 'Sub') + _p('Mục một', 'Bullet') + _p('Nội dung') + _p('')
+        self.assertEqual(_blocks(_docx(body)), [
+            ('heading', 'Hợp đồng', 1),
+            ('heading', 'Điều khoản', 2),
+            ('list_item', 'Mục một', 0),
+            ('paragraph', 'Nội dung', 0),
+        ])
+
+    def test_table_rows_in_document_order(self):
+        body = _p('Trước') + _table([_p('Tên'), _p('Giá')], [_p('Bút') + _p('xanh'), '']) + _p('Sau')
+        self.assertEqual(_blocks(_docx(body)), [
+            ('paragraph', 'Trước', 0),
+            ('table_row', 'Tên | Giá', 0),
+            ('table_row', 'Bút xanh | ', 0),
+            ('paragraph', 'Sau', 0),
+        ])
+
+    def test_nested_table_merged_into_cell(self):
+        inner = _table([_p('a'), _p('b')], [_p('c'), _p('d')])
+        body = _table([_p('Ngoài') + inner, _p('Phải')])
+        self.assertEqual(_blocks(_docx(body)), [('table_row', 'Ngoài a | b c | d | Phải', 0)])
+
+    def test_header_footer_deduplicated(self):
+        file_bytes = _docx(_p('Thân'), headers=('Công ty A', 'Công ty A', 'Trang đầu'), footers=('Mật', 'Mật'))
+        self.assertEqual(_blocks(file_bytes), [
+            ('header', 'Công ty A', 0),
+            ('header', 'Trang đầu', 0),
+            ('paragraph', 'Thân', 0),
+            ('footer', 'Mật', 0),
+        ])
+        self.assertEqual(tasks.extract_text_from_docx(file_bytes), "[Header] Công ty A\n[Header] Trang đầu\nThân\n[Footer] Mật\n")
+
+    def test_invalid_docx(self):
+        with self.assertRaises(ValueError):
+            list(iter_docx_blocks(b'not a zip'))
+
+
+def _decode_copy_rows(data):
+    """Đọc lại các dòng COPY BINARY theo thứ tự COPY_COLUMNS (giống phía PostgreSQL)."""
+    rows = []
+    offset = 0
+    while offset < len(data):
+        (fields,) = struct.unpack_from('>h', data, offset)
+        offset += 2
+        values = []
+        for _ in range(fields):
+            (length,) = struct.unpack_from('>i', data, offset)
+            offset += 4
+            if length == -1:
+                values.append(None)
+                continue
+            values.append(data[offset:offset + length])
+            offset += length
+        chunk_id, document_id, user_id, vector, chunk_index, char_start, char_end, created_at, content = values
+        dimensions, _ = struct.unpack_from('>hh', vector)
+        rows.append({
+            'id': uuid.UUID(bytes=chunk_id),
+            'document_id': uuid.UUID(bytes=document_id),
+            'user_id': int.from_bytes(user_id, 'big', signed=True),
+            'embedding': np.frombuffer(vector, dtype='>f4', offset=4, count=dimensions),
+            'positions': tuple(None if v is None else struct.unpack('>i', v)[0] for v in (chunk_index, char_start, char_end)),
+            'created_at': bulk_insert.POSTGRES_EPOCH + timedelta(microseconds=struct.unpack('>q', created_at)[0]),
+            'content': content.decode('utf-8'),
+        })
+    return rows
+
+
+class CopyEncodingTests(SimpleTestCase):
+    def test_round_trip(self):
+        document = SimpleNamespace(id=uuid.uuid4(), user_id=42)
+        chunks = [
+            {'content': 'Điều 1. Phạm vi', 'chunk_index': 0, 'char_start': 0, 'char_end': 15},
+            # Chunk cũ khôi phục từ snapshot: chưa có vị trí ký tự
+            {'content': 'chunk cũ', 'chunk_index': 1},
+            {'content': '', 'chunk_index': 2, 'char_start': 15, 'char_end': 15},
+        ]
+        embeddings = np.arange(3 * 5, dtype=np.float32).reshape(3, 5) / 7
+        ids = [uuid.uuid4() for _ in chunks]
+        created_at = datetime(2026, 3, 1, 8, 30, 15, 123456, tzinfo=dt_timezone.utc)
+
+        with mock.patch.object(bulk_insert, 'ROWS_PER_WRITE', 2):
+            blocks = bulk_insert.encode_copy_rows(document, chunks, embeddings, created_at=created_at, ids=ids)
+        self.assertEqual(len(blocks), 2)
+
+        rows = _decode_copy_rows(b''.join(blocks))
+        self.assertEqual([row['id'] for row in rows], ids)
+        self.assertEqual({(row['document_id'], row['user_id'], row['created_at']) for row in rows},
+                         {(document.id, 42, created_at)})
+        self.assertEqual([row['positions'] for row in rows], [(0, 0, 15), (1, None, None), (2, 15, 15)])
+        self.assertEqual([row['content'] for row in rows], [chunk['content'] for chunk in chunks])
+        np.testing.assert_array_equal(np.vstack([row['embedding'] for row in rows]), embeddings)
+
+    def test_chunk_index_defaults_to_order(self):
+        self.assertEqual(bulk_insert.chunk_positions([{'content': 'a'}, {'content': 'b', 'char_start': 3}]),
+                         [(0, None, None), (1, 3, None)])
+
+
+class _FlakyBackend:
+    """Backend giả: lỗi cả batch nếu có văn bản 'boom' (vd. input model không xử lý được)."""
+    dimensions = 2
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts):
+        self.calls.append(list(texts))
+        if 'boom' in texts:
+            raise RuntimeError('cannot encode boom')
+        return np.array([[len(text), 1] for text in texts], dtype=np.float32)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = _FlakyBackend()
+        self.batcher = MicroBatcher(self.backend, max_batch=64, max_wait=0.2)
+
+    def test_invalid_input_rejected_before_batching(self):
+        for texts in ('abc', ['ok', 3], None):
+            with self.subTest(texts=texts), self.assertRaises(ValueError):
+                self.batcher.encode(texts, timeout=1)
+        self.assertEqual(self.backend.calls, [])
+
+    def test_failed_batch_only_fails_bad_request(self):
+        futures = [self.batcher.submit(texts) for texts in (['a'], ['boom'], ['ccc', 'dd'])]
+        np.testing.assert_array_equal(futures[0].result(timeout=5), [[1, 1]])
+        with self.assertRaises(RuntimeError):
+            futures[1].result(timeout=5)
+        np.testing.assert_array_equal(futures[2].result(timeout=5), [[3, 1], [2, 1]])
+        self.assertEqual(self.backend.calls[0], ['a', 'boom', 'ccc', 'dd'])
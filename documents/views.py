@@ -6,14 +6,22 @@ from rest_framework import permissions
 from rest_framework.response import Response
 from rest_framework import status
 from .tasks import process_document
+from . import checkpoints
 from .permissions import IsOwner
+from django.conf import settings
+from core.admission import check_queue_capacity
+from core.db_router import mark_recent_write, read_replica
+from core.throttling import UploadThrottle
 
 class DocumentUploadView(generics.CreateAPIView):
     queryset = Document.objects.all()
     serializer_class = DocumentUploadSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [UploadThrottle]
     
     def perform_create(self, serializer):
+        # Queue ingest quá dài thì từ chối sớm (503 + Retry-After) trước khi lưu file
+        check_queue_capacity('ingest', settings.INGEST_MAX_QUEUE_DEPTH)
         file_obj = self.request.data.get('file')
         document = serializer.save(
             user =self.request.user,
@@ -23,6 +31,7 @@ class DocumentUploadView(generics.CreateAPIView):
         )
         
         process_document.delay(document.id)
+        mark_recent_write(self.request.user.pk)
         
         return Response(
             {
@@ -38,6 +47,10 @@ class DocumentListView(generics.ListAPIView):
 
     def get_queryset(self):
         return Document.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def list(self, request, *args, **kwargs):
+        with read_replica(request.user):
+            return super().list(request, *args, **kwargs)
     
 class DocumentDeleteView(generics.DestroyAPIView):
     queryset = Document.objects.all()
@@ -49,9 +62,11 @@ class DocumentDeleteView(generics.DestroyAPIView):
 
     def perform_destroy(self, instance):
         DocumentChunk.objects.filter(document=instance).delete()
+        checkpoints.clear(instance.id)
         
         try:
             instance.file.delete(save=False)
         except Exception as e:
             print(f"Error deleting file from MinIO for document {instance.id}: {e}")
-        super().perform_destroy(instance)
\ No newline at end of file
+        super().perform_destroy(instance)
+        mark_recent_write(self.request.user.pk)
\ No newline at end of file
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class VersionedRefreshToken(RefreshToken):
+    """Refresh token mang token_version của user; access token sinh ra từ nó copy claim này."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication lấy user từ cache dùng chung (Redis) thay vì truy vấn bảng user ở mọi request.
+    Token chỉ hợp lệ khi token_version trong token khớp với user; đổi mật khẩu tăng
+    token_version nên mọi token cũ bị từ chối. Cache bị xoá khi user được lưu (users/signals.py).
+    AUTH_USER_CACHE_SECONDS = 0 (mặc định khi không có CACHE_URL) thì luôn đọc user từ DB.
+    """
+
+    def get_user(self, validated_token):
+        timeout = settings.AUTH_USER_CACHE_SECONDS
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        key = user_cache_key(user_id)
+        user = cache.get(key) if timeout > 0 and user_id is not None else None
+        if user is None:
+            user = super().get_user(validated_token)
+            if timeout > 0:
+                cache.set(key, user, timeout=timeout)
+        elif api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+        # Token phát hành trước khi có claim này được coi là version 0
+        if validated_token.get(TOKEN_VERSION_CLAIM, 0) != user.token_version:
+            raise AuthenticationFailed("Token has been revoked.", code="token_revoked")
+        return user
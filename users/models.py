@@ -5,6 +5,17 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     bio = models.TextField(blank=True, null=True)
     birth_date = models.DateField(blank=True, null=True)
+    # Tăng khi đổi mật khẩu để thu hồi mọi JWT đã phát hành (users/authentication.py)
+    token_version = models.PositiveIntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+        # set_password giữ mật khẩu mới trong _password tới khi lưu; rehash khi nâng cấp
+        # hasher lúc đăng nhập thì không (Django xoá _password trước), nên không thu hồi token
+        if self._password is not None:
+            self.token_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'token_version'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.username
\ No newline at end of file
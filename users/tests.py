@@ -1,3 +1,76 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import models
+from django.test import SimpleTestCase, override_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import TOKEN_VERSION_CLAIM, CachedJWTAuthentication, VersionedRefreshToken, user_cache_key
+from .models import User
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'users-tests'}}
+
+
+def _access_token(user):
+    return CachedJWTAuthentication().get_validated_token(str(VersionedRefreshToken.for_user(user).access_token))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, AUTH_USER_CACHE_SECONDS=60)
+class CachedJWTAuthenticationTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User(id=7, username='alice', email='alice@example.com', password='!')
+        self.auth = CachedJWTAuthentication()
+        # Không có DB: user "trong bảng" là self.user
+        patcher = mock.patch('rest_framework_simplejwt.authentication.JWTAuthentication.get_user',
+                             side_effect=lambda token: self.user)
+        self.db_get_user = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_password_change_revokes_old_tokens(self):
+        old_token = _access_token(self.user)
+        self.assertEqual(self.auth.get_user(old_token), self.user)
+
+        with mock.patch.object(models.Model, 'save'):
+            self.user.set_password('a new password')
+            self.user.save(update_fields=['password'])
+        self.assertEqual(self.user.token_version, 1)
+        # signals.py xoá cache khi user được lưu; Model.save bị mock nên xoá trực tiếp
+        cache.delete(user_cache_key(self.user.pk))
+
+        with self.assertRaises(AuthenticationFailed) as raised:
+            self.auth.get_user(old_token)
+        self.assertEqual(raised.exception.detail['code'], 'token_revoked')
+        self.assertEqual(self.auth.get_user(_access_token(self.user)), self.user)
+
+    def test_save_without_password_change_keeps_tokens(self):
+        with mock.patch.object(models.Model, 'save'):
+            self.user.bio = 'hello'
+            self.user.save(update_fields=['bio'])
+        self.assertEqual(self.user.token_version, 0)
+
+    def test_token_without_version_claim_accepted(self):
+        token = AccessToken.for_user(self.user)
+        self.assertNotIn(TOKEN_VERSION_CLAIM, token.payload)
+        self.assertEqual(self.auth.get_user(self.auth.get_validated_token(str(token))), self.user)
+
+    def test_inactive_cached_user_rejected(self):
+        token = _access_token(self.user)
+        self.auth.get_user(token)
+        cached = cache.get(user_cache_key(self.user.pk))
+        cached.is_active = False
+        cache.set(user_cache_key(self.user.pk), cached)
+
+        with self.assertRaises(AuthenticationFailed) as raised:
+            self.auth.get_user(token)
+        self.assertEqual(raised.exception.detail['code'], 'user_inactive')
+        self.assertEqual(self.db_get_user.call_count, 1)
+
+    @override_settings(AUTH_USER_CACHE_SECONDS=0)
+    def test_no_cache_without_shared_cache(self):
+        token = _access_token(self.user)
+        self.auth.get_user(token)
+        self.auth.get_user(token)
+        self.assertEqual(self.db_get_user.call_count, 2)
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))